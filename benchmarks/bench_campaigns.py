@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the ScheduleMailing envelopes of a campaign run.
+
+Serializes one envelope per segment with large shared substitutions and
+suppression lists, the way schedule_mailing builds them and the way
+silverpy.campaigns.CampaignScheduler renders them, with the shared parts
+serialized once and a few substitutions overridden per segment.
+
+Usage: python benchmarks/bench_campaigns.py [segments] [substitutions]
+"""
+
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from silverpy.api import API
+from silverpy.campaigns import CampaignScheduler
+
+_timer = getattr(time, 'perf_counter', time.time)
+
+
+def run(segments, size):
+    api = API('bench', 'bench', 'http://localhost/')
+    substitutions = dict(
+        ('SUB_%d' % i, 'value %d & <more>' % i) for i in range(size))
+    supression_list = list(range(1000, 1000 + size))
+    overrides = [
+        {'mailing_name': 'Campaign %d' % i,
+         'substitutions': {'SEGMENT': str(i), 'SUB_0': 'segment %d' % i}}
+        for i in range(segments)]
+
+    started = _timer()
+    for i, override in enumerate(overrides):
+        merged = dict(substitutions, **override['substitutions'])
+        api._prepare_request(api._tree('ScheduleMailing', (
+            api._schedule_mailing_parts(
+                7, i, override['mailing_name'], substitutions=merged,
+                supression_list=supression_list))), auth=False)
+    built = _timer() - started
+
+    started = _timer()
+    campaign = CampaignScheduler(
+        api, 7, 'Campaign', substitutions=substitutions,
+        supression_list=supression_list)
+    for i, override in enumerate(overrides):
+        campaign.render(i, override)
+    rendered = _timer() - started
+
+    print('%d segments, %d substitutions and suppression lists' % (
+        segments, size))
+    print('%-16s %12s %14s' % ('', 'total (ms)', 'segments/s'))
+    for name, elapsed in (('schedule_mailing', built),
+                          ('campaign', rendered)):
+        print('%-16s %12.1f %14.0f' % (
+            name, elapsed * 1e3, segments / elapsed))
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 500,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 200)
@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmark of AddRecipient envelopes rendered from a columnar batch.
+
+Renders one envelope per row of a generated frame, first converting
+every row to a dict of columns as add_recipient takes them, then through
+silverpy.columnar.ColumnBatch, as bulk_add_recipient_columns does.
+Network and threads are left out.
+
+The frame is a pandas DataFrame if pandas is installed, a dict of lists
+otherwise, or as chosen by the second argument: pandas, arrow, numpy or
+dict.
+
+Usage: python benchmarks/bench_columnar.py [rows] [source]
+"""
+
+import datetime
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from silverpy.columnar import ColumnBatch
+from silverpy.templates import ADD_RECIPIENT, Serialized
+
+
+def columns(rows):
+    """A dict of lists of contact data."""
+    start = datetime.datetime(2020, 1, 1)
+
+    return {
+        'EMAIL': ['contact%d@example.com' % i for i in range(rows)],
+        'First Name': ['First %d' % (i % 1000) for i in range(rows)],
+        'Last Name': ['Last & Co %d' % (i % 5000) for i in range(rows)],
+        'City': ['Z\xfcrich' if i % 7 == 0 else 'Lisbon'
+                 for i in range(rows)] if sys.version_info[0] > 2 else
+                ['Lisbon'] * rows,
+        'Customer Id': list(range(rows)),
+        'Score': [i / 8.0 for i in range(rows)],
+        'Joined': [start + datetime.timedelta(minutes=i)
+                   for i in range(rows)],
+    }
+
+
+def frame(rows, source):
+    data = columns(rows)
+
+    if source == 'pandas':
+        import pandas
+        return pandas.DataFrame(data)
+
+    if source == 'arrow':
+        import pyarrow
+        return pyarrow.table(data)
+
+    if source == 'numpy':
+        import numpy
+        return numpy.rec.fromarrays(
+            [numpy.array(data[name]) for name in data],
+            names=[name.replace(' ', '_') for name in data])
+
+    return data
+
+
+def dict_rows(data, source):
+    """Rows as add_recipient takes them, one dict each."""
+    if source == 'pandas':
+        return data.to_dict('records')
+
+    if source == 'arrow':
+        return data.to_pylist()
+
+    if source == 'numpy':
+        names = data.dtype.names
+        return (dict(zip(names, row)) for row in data.tolist())
+
+    names = list(data)
+    return (dict(zip(names, row)) for row in zip(*[data[n] for n in names]))
+
+
+def per_row(data, source):
+    values = {'list_id': 1, 'created_from': 2, 'update_if_found': True}
+    size = 0
+
+    for row in dict_rows(data, source):
+        values['columns'] = row
+        size += len(ADD_RECIPIENT.render(values))
+
+    return size
+
+
+def columnar(data, source):
+    render = ADD_RECIPIENT.partial(
+        {'list_id': 1, 'created_from': 2, 'update_if_found': True},
+        ('columns',))
+    row = {}
+    size = 0
+
+    for email, fragment in ColumnBatch(data, '%m/%d/%Y %H:%M:%S').rows():
+        row['columns'] = Serialized(fragment)
+        size += len(render(row))
+
+    return size
+
+
+def default_source():
+    try:
+        import pandas  # noqa
+    except ImportError:
+        return 'dict'
+
+    return 'pandas'
+
+
+def run(rows, source):
+    data = frame(rows, source)
+
+    print('%d rows from %s' % (rows, source))
+    print('%-10s %10s %12s %12s' % ('path', 'seconds', 'rows/s', 'MB'))
+
+    for name, render in (('per row', per_row), ('columnar', columnar)):
+        started = time.time()
+        size = render(data, source)
+        elapsed = time.time() - started
+
+        print('%-10s %10.2f %12.0f %12.1f' % (
+            name, elapsed, rows / elapsed, size / 1e6))
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000,
+        sys.argv[2] if len(sys.argv) > 2 else default_source())
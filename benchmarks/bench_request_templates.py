@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Microbenchmark for request serialization.
+
+Compares building an lxml tree and serializing it with etree.tostring(),
+as the BaseAPI builders do, with rendering the same request from the
+precompiled templates in silverpy.templates. Outputs are checked to be
+byte-identical first.
+
+Usage: python benchmarks/bench_request_templates.py [iterations]
+"""
+
+import os
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from lxml import etree
+
+from silverpy.api import API
+from silverpy.templates import ADD_RECIPIENT, OPT_OUT_RECIPIENT
+
+
+COLUMNS = {
+    'EMAIL': 'someone@example.com',
+    'First Name': 'Some',
+    'Last Name': 'One & Co',
+    'City': 'Zürich' if sys.version_info[0] > 2 else 'Zurich',
+    'Customer Id': 123456,
+}
+
+
+def cases(api):
+    """(name, lxml builder, template renderer) of every case."""
+    return (
+        ('AddRecipient', lambda: etree.tostring(api._build_add_recipient(
+            1, 2, COLUMNS, update_if_found=True,
+            sync_fields={'EMAIL': 'someone@example.com'})),
+         lambda: ADD_RECIPIENT.render({
+             'list_id': 1, 'created_from': 2, 'columns': COLUMNS,
+             'update_if_found': True,
+             'sync_fields': {'EMAIL': 'someone@example.com'}})),
+        ('AddRecipient (email only)', lambda: etree.tostring(
+            api._build_add_recipient(1, 2, {'EMAIL': 'someone@example.com'})),
+         lambda: ADD_RECIPIENT.render({
+             'list_id': 1, 'created_from': 2,
+             'columns': {'EMAIL': 'someone@example.com'}})),
+        ('OptOutRecipient', lambda: etree.tostring(
+            api._build_opt_out_recipient(1, 'someone@example.com')),
+         lambda: OPT_OUT_RECIPIENT.render({
+             'list_id': 1, 'email': 'someone@example.com'})),
+    )
+
+
+def run(number):
+    api = API('bench', 'bench', 'http://localhost/')
+
+    print('%-26s %12s %15s %8s' % (
+        'request', 'lxml (us)', 'template (us)', 'speedup'))
+
+    for name, build, render in cases(api):
+        assert build() == render(), name
+
+        tree = timeit.timeit(build, number=number)
+        template = timeit.timeit(render, number=number)
+
+        print('%-26s %12.2f %15.2f %7.1fx' % (
+            name,
+            tree / number * 1e6,
+            template / number * 1e6,
+            tree / template,
+        ))
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
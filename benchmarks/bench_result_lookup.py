@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Microbenchmark for response field lookups.
+
+Compares string XPath expressions, compiled again by lxml on every call,
+with the XPaths precompiled by the lxml backend of silverpy.backends.
+
+Usage: python benchmarks/bench_result_lookup.py [iterations]
+"""
+
+import os
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(ROOT, 'silverpy', 'tests')
+sys.path.append(ROOT)
+
+from lxml import etree
+
+from silverpy.api import API, RESULT_FIELDS, RESULT_RECORDS
+from silverpy.backends import get_backend
+
+
+FIXTURE_FILES = (
+    'test_response.xml',
+    'test_error_response.xml',
+    'test_login_response.xml',
+)
+
+PAYLOAD_TAGS = ('RecipientId', 'MAILING_ID', 'CONTACT_LIST_ID', 'SESSIONID')
+
+BACKEND = get_backend('lxml')
+PAYLOAD_XPATH = BACKEND.payload_xpath(
+    tuple(RESULT_FIELDS), tuple(RESULT_RECORDS))
+
+
+def lookup_strings(root):
+    """Field lookups the way they were done before the registry."""
+    root.xpath('Body/RESULT/SUCCESS/text()')
+    root.xpath('Body/Fault/detail/error/errorid')
+    root.xpath('Body/Fault/FaultString')
+    for tag in PAYLOAD_TAGS:
+        root.xpath('Body/RESULT/%s//text()' % tag)
+
+
+def lookup_compiled(root):
+    """The same lookups through the precompiled XPaths."""
+    BACKEND.success_xpath(root)
+    BACKEND.fault_code_xpath(root)
+    BACKEND.fault_message_xpath(root)
+    PAYLOAD_XPATH(root)
+
+
+def run(number):
+    api = API('bench', 'bench', 'http://localhost/')
+
+    print('%-26s %14s %14s %8s' % (
+        'fixture', 'strings (us)', 'compiled (us)', 'saving'))
+
+    for name in FIXTURE_FILES:
+        with open(os.path.join(FIXTURES, name), 'rb') as f:
+            content = f.read()
+        root = etree.fromstring(content)
+
+        strings = timeit.timeit(lambda: lookup_strings(root), number=number)
+        compiled = timeit.timeit(lambda: lookup_compiled(root), number=number)
+
+        print('%-26s %14.2f %14.2f %7.0f%%' % (
+            name,
+            strings / number * 1e6,
+            compiled / number * 1e6,
+            (1 - compiled / strings) * 100,
+        ))
+
+        decode = timeit.timeit(
+            lambda: api._parse_result(content), number=number)
+        print('%-26s %14s %14.2f' % (
+            '  _parse_result', '', decode / number * 1e6))
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the XML backends of silverpy.backends.
+
+Measures, in fresh interpreters, the time and memory of importing
+silverpy and of loading each backend, then the per-call cost of building
+and serializing an AddRecipient envelope and of decoding a response.
+
+Usage: python benchmarks/bench_xml_backends.py [iterations]
+"""
+
+import os
+import subprocess
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURES = os.path.join(ROOT, 'silverpy', 'tests')
+sys.path.append(ROOT)
+
+from silverpy.api import API
+from silverpy.backends import BACKENDS
+
+# Run by a fresh interpreter: prints the milliseconds spent importing
+# silverpy, then loading the backend, and the peak RSS in KiB.
+PROBE = '''
+import resource, sys, time
+sys.path.insert(0, %r)
+started = time.time()
+import silverpy.api
+imported = time.time()
+silverpy.api.API('a', 'b', 'c', xml_backend=%r)._xml
+loaded = time.time()
+print('%%f %%f %%d' %% ((imported - started) * 1e3, (loaded - imported) * 1e3,
+                      resource.getrusage(resource.RUSAGE_SELF).ru_maxrss))
+'''
+
+COLUMNS = dict(('COLUMN_%d' % i, 'value %d & <more>' % i) for i in range(20))
+
+
+def probe(name, runs=5):
+    samples = []
+    for _ in range(runs):
+        output = subprocess.check_output(
+            [sys.executable, '-c', PROBE % (ROOT, name)])
+        samples.append([float(value) for value in output.split()])
+
+    return [min(column) for column in zip(*samples)]
+
+
+def run(number):
+    with open(os.path.join(FIXTURES, 'test_response.xml'), 'rb') as f:
+        content = f.read()
+
+    print('%-8s %12s %12s %10s %12s %12s' % (
+        'backend', 'import (ms)', 'load (ms)', 'RSS (KiB)', 'build (us)',
+        'parse (us)'))
+
+    for name in BACKENDS:
+        imported, loaded, rss = probe(name)
+        api = API('bench', 'bench', 'http://localhost/', xml_backend=name)
+
+        build = timeit.timeit(lambda: api._prepare_request(
+            api._build_add_recipient(1, 2, COLUMNS, update_if_found=True),
+            auth=False), number=number)
+        parse = timeit.timeit(
+            lambda: api._parse_result(content), number=number)
+
+        print('%-8s %12.1f %12.1f %10d %12.2f %12.2f' % (
+            name, imported, loaded, rss, build / number * 1e6,
+            parse / number * 1e6))
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
@@ -16,7 +16,15 @@ setup(
     author_email='nicholas@alienretro.com',
     packages=['silverpy'],
     test_suite='tests',
-    install_requires=['requests', 'lxml'],
+    install_requires=[
+        'requests',
+        'lxml',
+        'futures; python_version < "3.2"',
+    ],
+    extras_require={
+        'async': ['aiohttp'],
+        'columnar': ['pandas', 'pyarrow'],
+    },
     requires=['requests', 'lxml'],
     include_package_data = True,
     zip_safe=False,
@@ -31,6 +39,7 @@ setup(
         'Programming Language :: Python :: 2.7',
         'Programming Language :: Python :: 3',
         'Programming Language :: Python :: 3.3',
+        'Programming Language :: Python :: 3.5',
         'Topic :: Software Development :: Libraries :: Python Modules',
     ],
 )
\ No newline at end of file
@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+import sys
+
+from .api import (
+    API,
+    BulkItem,
+    Result,
+    SilverpopError,
+    CONTACT_CREATED_FROM_DB,
+    CONTACT_CREATED_MANUALLY,
+    CONTACT_CREATED_OPTED_IN,
+    CONTACT_CREATED_FROM_TRACKING_DB,
+)
+
+if sys.version_info >= (3, 5):
+    from .aio import AsyncAPI
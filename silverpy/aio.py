@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: aio
+    :synopsis: asyncio interface to Silverpop Engage API.
+
+Requires Python 3.5+ and, unless a session is given, aiohttp.
+"""
+
+import importlib.util
+import logging
+
+from .api import BaseAPI
+
+log = logging.getLogger(__name__)
+
+
+class AsyncAPI(BaseAPI):
+    """asyncio counterpart of API. Every public method is a coroutine
+    taking the same arguments and returning the same values as its
+    API equivalent.
+
+    Usage:
+    from silverpy.aio import AsyncAPI
+
+    api = AsyncAPI('user', 'passwd', 'silverpop_url')
+    await api.login()
+    await api.add_recipient(...)
+    await api.logout()
+    await api.close()
+    """
+    def __init__(self, username, password, url, session=None,
+                 xml_backend=None):
+        """
+        :params session: Optional aiohttp.ClientSession (or compatible
+                         object) to send requests through. If not given,
+                         one is created on first use and closed by close().
+        :params xml_backend: See API.
+        """
+        super(AsyncAPI, self).__init__(username, password, url, xml_backend)
+
+        # aiohttp itself is imported with the first session
+        if session is None and importlib.util.find_spec('aiohttp') is None:
+            raise ImportError(
+                'AsyncAPI needs aiohttp installed or a session argument.')
+
+        self._s = session
+        self._owns_session = session is None
+
+    async def _request(self, data, auth=True):
+        """Execute a request with the given data.
+
+        :param data: The data to be sent in the request.
+        :param auth: If True, will check for a estabilished session.
+        :returns: The response body as bytes.
+        """
+        url, headers, data = self._prepare_request(data, auth)
+
+        if self._s is None:
+            import aiohttp
+
+            self._s = aiohttp.ClientSession()
+
+        async with self._s.post(url, headers=headers, data=data) as response:
+            response.raise_for_status()
+            return await response.read()
+
+    async def close(self):
+        """Closes the HTTP session if it was created by this object."""
+        if self._owns_session and self._s is not None:
+            await self._s.close()
+            self._s = None
+
+    async def login(self):
+        """Log in to Silverpop API. See API.login."""
+        content = await self._request(self._build_login(), auth=False)
+
+        return self._login_result(self._parse_result(content))
+
+    async def logout(self):
+        """Log off the Silverpop API. See API.logout."""
+        content = await self._request(self._build_logout())
+
+        return self._logout_result(self._parse_result(content))
+
+    async def add_recipient(self, list_id, created_from, columns=None,
+                            **kwargs):
+        """Add and opt-in a contact to a database. See API.add_recipient."""
+        root = self._build_add_recipient(
+            list_id, created_from, columns, **kwargs)
+        result = self._parse_result(await self._request(root))
+
+        return (result.success, result.recipient_id, result.error)
+
+    async def remove_recipient(self, list_id, email, columns=None):
+        """Remove a contact of a specified database.
+        See API.remove_recipient.
+        """
+        root = self._build_remove_recipient(list_id, email, columns)
+        result = self._parse_result(await self._request(root))
+
+        return (result.success, result.error)
+
+    async def opt_out_recipient(self, list_id, email='', columns=None,
+                                mailing_id=None, recipient_id=None,
+                                job_id=None):
+        """Opt-out a contact. See API.opt_out_recipient."""
+        root = self._build_opt_out_recipient(
+            list_id, email, columns, mailing_id, recipient_id, job_id)
+        result = self._parse_result(await self._request(root))
+
+        return (result.success, result.error)
+
+    async def create_contact_list(self, database_id, contact_list_name,
+                                  visibility=0):
+        """Creates a new contact list in Silverpop.
+        See API.create_contact_list.
+        """
+        root = self._build_create_contact_list(
+            database_id, contact_list_name, visibility)
+        result = self._parse_result(await self._request(root))
+
+        return (result.success, result.contact_list_id, result.error)
+
+    async def add_contact_to_contact_list(self, contact_list_id,
+                                          contact_id='', columns=None):
+        """Adds one new contact to a Contact List.
+        See API.add_contact_to_contact_list.
+        """
+        root = self._build_add_contact_to_contact_list(
+            contact_list_id, contact_id, columns)
+        result = self._parse_result(await self._request(root))
+
+        return (result.success, result.error)
+
+    async def send_mailing(self, mailing_id, recipient_email, columns=None):
+        """Sends mailing to the specified ID. See API.send_mailing."""
+        root = self._build_send_mailing(mailing_id, recipient_email, columns)
+        result = self._parse_result(await self._request(root))
+
+        return (result.success, result.error)
+
+    async def schedule_mailing(self, template_id, list_id, mailing_name,
+                               visibility=1, substitutions=None,
+                               scheduled=None, **kwargs):
+        """Sends a template-based mailing to a specific database or query.
+        See API.schedule_mailing.
+        """
+        root = self._build_schedule_mailing(
+            template_id, list_id, mailing_name, visibility, substitutions,
+            scheduled, **kwargs)
+        result = self._parse_result(await self._request(root))
+
+        if result.error:
+            self._error(result.error)
+
+        return (result.success, result.mailing_id)
@@ -7,11 +7,23 @@
 .. moduleauthor:: Nicholas Santos <nicholas@alienretro.com>
 """
 
+import collections
+import functools
 import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent import futures
 from datetime import datetime
 
-import requests
-from lxml import etree
+from . import backends, columnar, imports, templates
+from .cache import column_email
+from .instrumentation import now_ns
+from .metadata import Metadata
+from .sessions import SessionPool
+from .transport import HTTPTransport
 
 
 CONTACT_CREATED_FROM_DB = 0
@@ -19,33 +31,216 @@ CONTACT_CREATED_MANUALLY = 1
 CONTACT_CREATED_OPTED_IN = 2
 CONTACT_CREATED_FROM_TRACKING_DB = 3
 
+JOB_WAITING = 'WAITING'
+JOB_RUNNING = 'RUNNING'
+JOB_COMPLETE = 'COMPLETE'
+JOB_ERROR = 'ERROR'
+JOB_CANCELED = 'CANCELED'
+
+JOB_FINISHED = (JOB_COMPLETE, JOB_ERROR, JOB_CANCELED)
+
+# errorid Engage returns when a jsessionid has expired or is invalid.
+SESSION_EXPIRED_ERRORS = ('145',)
+
 log = logging.getLogger(__name__)
 
+try:
+    string_types = basestring
+    _BaseError = StandardError
+except NameError:  # Python 3
+    string_types = str
+    _BaseError = Exception
+
+# Payload fields Engage may return inside <RESULT>, mapped to the
+# attribute name they are exposed as on Result objects.
+RESULT_FIELDS = {
+    'RecipientId': 'recipient_id',
+    'MAILING_ID': 'mailing_id',
+    'CONTACT_LIST_ID': 'contact_list_id',
+    'SESSIONID': 'session_id',
+    'JOB_ID': 'job_id',
+    'JOB_STATUS': 'job_status',
+    'FILE_PATH': 'file_path',
+}
+
+# Repeated records inside <RESULT>, exposed on Result objects as lists
+# of dicts mapping each child tag to its text.
+RESULT_RECORDS = {
+    'LIST': 'lists',
+    'MAILING_TEMPLATE': 'templates',
+}
+
+# Payload tags as handed to the decode method of XML backends.
+_FIELD_TAGS = tuple(RESULT_FIELDS)
+_RECORD_TAGS = tuple(RESULT_RECORDS)
+
 
 def pretty_print(doc):
     """Pretty prints the XML object"""
+    from lxml import etree
+
     print(etree.tostring(doc, pretty_print=True))
 
 
-class API(object):
-    """This class manages the access to Silverpop Engage API.
+class SilverpopError(_BaseError):
+    """Raised when Engage reports a fault or no session is established."""
 
-    Usage is as simple as:
-    from silverpy import Api
 
-    api = API('user', 'passwd', 'silverpop_url')
-    api.login()
-    api.add_recipient(...)
-    api.logout()
+class Result(object):
+    """Outcome of a single Engage call, decoded from the response once.
+
+    Payload fields and records missing from the response are None.
+    """
+    __slots__ = (
+        'success',
+        'fault_code',
+        'fault_message',
+    ) + tuple(RESULT_FIELDS.values()) + tuple(RESULT_RECORDS.values())
+
+    def __init__(self, success, fault_code=None, fault_message=None,
+                 **fields):
+        self.success = success
+        self.fault_code = fault_code
+        self.fault_message = fault_message
+
+        for attr in self.__slots__[3:]:
+            setattr(self, attr, fields.pop(attr, None))
+
+        if fields:
+            raise TypeError('Unknown result fields: %s' % ', '.join(fields))
+
+    @property
+    def error(self):
+        """Tuple (error_code, error_message) or None if successful."""
+        if self.success:
+            return None
+
+        return (self.fault_code, self.fault_message)
+
+    @property
+    def session_expired(self):
+        """True if the call failed because the session is no longer valid."""
+        return not self.success and self.fault_code in SESSION_EXPIRED_ERRORS
+
+    def __repr__(self):
+        return '<Result success=%r error=%r>' % (self.success, self.error)
+
+
+class BulkItem(object):
+    """Outcome of one entry of a bulk operation.
+
+    :ivar index: Position of the entry in the input iterable.
+    :ivar spec: The entry itself, as given by the caller.
+    :ivar success: Boolean indicating whether the call succeeded.
+    :ivar value: Whatever the single-item method returned, or None
+                 if it raised.
+    :ivar error: The error tuple returned by Engage, the exception raised
+                 by the call, or None.
+    """
+    __slots__ = ('index', 'spec', 'success', 'value', 'error')
+
+    def __init__(self, index, spec, success, value=None, error=None):
+        self.index = index
+        self.spec = spec
+        self.success = success
+        self.value = value
+        self.error = error
+
+    def __repr__(self):
+        return '<BulkItem index=%d success=%r error=%r>' % (
+            self.index, self.success, self.error)
+
+
+# Element whose children are generated when it is built or streamed.
+# children is a callable returning the parts, see BaseAPI._tree.
+_Container = collections.namedtuple('_Container', 'tag children')
+
+
+class _ChunkBuffer(object):
+    """File-like sink collecting what etree.xmlfile writes."""
+    def __init__(self):
+        self._chunks = []
+        self.size = 0
+
+    def write(self, data):
+        self._chunks.append(data)
+        self.size += len(data)
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        self.size = 0
+        return data
+
+
+class StreamingEnvelope(object):
+    """Request body serialized while it is being sent.
+
+    Iterating yields the envelope in chunks of about chunk_size bytes,
+    byte-identical to etree.tostring() of the equivalent tree, which is
+    never built. It can be iterated more than once, e.g. when a request
+    is retried.
+    """
+    def __init__(self, action, parts, chunk_size=16384):
+        self.action = action
+        self._parts = parts
+        self.chunk_size = chunk_size
+
+    def __iter__(self):
+        from lxml import etree
+
+        buf = _ChunkBuffer()
+
+        with etree.xmlfile(buf, buffered=False) as xf:
+            with xf.element('Envelope'):
+                with xf.element('Body'):
+                    with xf.element(self.action):
+                        for chunk in self._write(xf, buf, self._parts):
+                            yield chunk
+
+        yield buf.drain()
+
+    def _write(self, xf, buf, parts):
+        for part in parts:
+            if isinstance(part, _Container):
+                with xf.element(part.tag):
+                    for chunk in self._write(xf, buf, part.children()):
+                        yield chunk
+            elif callable(part):
+                for chunk in self._write(xf, buf, part()):
+                    yield chunk
+            else:
+                xf.write(part)
+
+            if buf.size >= self.chunk_size:
+                yield buf.drain()
+
+
+class BaseAPI(object):
+    """Transport independent part of the Engage clients: building request
+    envelopes and decoding responses. See API and AsyncAPI.
+
+    Envelopes are built and responses decoded by the xml_backend, a name
+    of silverpy.backends.BACKENDS, loaded on first use.
     """
-    def __init__(self, username, password, url):
+    def __init__(self, username, password, url, xml_backend=None):
         self._username = username
         self._password = password
         self._url = url
+        self._xml_backend = xml_backend
+        self._backend = None
 
         self._sessionId = None
 
-        self._s = requests.session()
+    @property
+    def _xml(self):
+        """The XML backend, see silverpy.backends."""
+        backend = self._backend
+
+        if backend is None:
+            backend = self._backend = backends.get_backend(self._xml_backend)
+
+        return backend
 
     def _envelope(self, action):
         """Generates the needed envelope XML for every request.
@@ -61,69 +256,111 @@ class API(object):
         :returns: Tuple (root, action_node)
         """
 
-        root = etree.Element('Envelope')
-        body = etree.SubElement(root, 'Body')
+        xml = self._xml
+        root = xml.Element('Envelope')
+        body = xml.SubElement(root, 'Body')
 
-        action_node = etree.SubElement(body, action)
+        action_node = xml.SubElement(body, action)
 
         return (root, action_node)
 
     def _check_session(self):
         """Check if user it's already logged in."""
         if not self._sessionId:
-            raise StandardError("Authentication is required, please login.")
+            raise SilverpopError("Authentication is required, please login.")
 
         return True
 
     def _parse_from_string(self, response_text):
         """It simply parses the XML from a string."""
-        return etree.fromstring(response_text)
+        return self._xml.fromstring(response_text)
 
     def _create_child_element(self, parent, tag, dict_columns):
         """Given a parent, it will create a sub-tag with
         dict_columns as name/value.
         """
-        if not isinstance(parent, etree._Element):
+        if not self._xml.iselement(parent):
             raise TypeError('parent must be a etree._Element type object.')
 
-        if not isinstance(tag, basestring):
+        if not isinstance(tag, string_types):
             raise TypeError('tag must be a string.')
 
         if not isinstance(dict_columns, dict):
             raise TypeError('dict_columns must be a dictionary.')
 
-        for key in dict_columns.iterkeys():
-            child = etree.SubElement(parent, tag)
+        parent.extend(self._child_elements(tag, dict_columns))
+
+    def _child_elements(self, tag, dict_columns):
+        """Generates a detached tag element with NAME and VALUE children
+        for every item of dict_columns.
+        """
+        for key in dict_columns:
+            child = self._xml.Element(tag)
             self._insert_text_node('NAME', key, child)
             self._insert_text_node('VALUE', str(dict_columns[key]), child)
+            yield child
 
-    def _get_session_id(self, response):
-        """After login, retrieves SESSIONID from XML
-        response and stores it in instance variable _sessionId.
+    def _text_element(self, tag, text):
+        """Detached counterpart of _insert_text_node.
+
+        :returns: The new node.
+        """
+        if not isinstance(tag, string_types):
+            raise TypeError('tag must be a string.')
+
+        if not isinstance(text, string_types):
+            raise TypeError('text must be a string.')
+
+        node = self._xml.Element(tag)
+        node.text = text
+
+        return node
+
+    def _tree(self, action, parts):
+        """Builds a whole envelope from the children of its action node.
+
+        parts is a list of elements, _Container objects and callables
+        returning more parts, so the same list can be streamed instead,
+        see StreamingEnvelope.
+
+        :returns: The envelope root.
         """
-        root = self._parse_from_string(response)
-        s = root.xpath('Body/RESULT/SESSIONID')
+        root, action_node = self._envelope(action)
+        self._append_parts(action_node, parts)
+
+        return root
+
+    def _append_parts(self, parent, parts):
+        for part in parts:
+            if isinstance(part, _Container):
+                self._append_parts(
+                    self._xml.SubElement(parent, part.tag), part.children())
+            elif callable(part):
+                self._append_parts(parent, part())
+            else:
+                parent.append(part)
 
-        if not s:
+    def _get_session_id(self, response):
+        """After login, retrieves SESSIONID from XML response."""
+        session_id = self._parse_result(response).session_id
+
+        if not session_id:
             msg = 'No SESSIONID in the document.'
             log.error(msg)
             raise ValueError(msg)
 
-        return s[0].text
+        return session_id
 
-    def _is_successful(self, response):
-        """Proccess XML response.
+    def _parse_result(self, response):
+        """Decodes an Engage response in a single pass.
 
-        :params response: The XML response
-        :returns: Tuple (bool_success, error_info)
+        :params response: The XML response, preferably the raw bytes.
+        :returns: A Result object.
         """
-        error = None
+        success, payload, fault = self._xml.decode(
+            response, _FIELD_TAGS, _RECORD_TAGS)
 
-        root = self._parse_from_string(response)
-        # Get first element within first element (alwas RESULT)
-        result = root.xpath('Body/RESULT/SUCCESS/text()')
-
-        if not result:
+        if success is None:
             msg = ('Response malformed, '
                    'XPath Expression Body/RESULT/SUCCESS/text() '
                    ' returned nothing')
@@ -132,58 +369,65 @@ class API(object):
 
         # As Silverpop API is rather inconsistent, I need to check whether
         # the result came 'true' or 'success'. Where's the consistency ?
-        success = (
-            True if result[0].lower() == 'true'
-            or result[0].lower() == 'success' else False
-        )
+        success = success.lower() in ('true', 'success')
 
-        if success is False:
-            error_code = root.xpath('Body/Fault/detail/error/errorid')
-            error_message = root.xpath('Body/Fault/FaultString')
-
-            if error_message:
-                error_message = error_message[0].text
+        fields = {}
+        for tag, value in payload:
+            if tag in RESULT_FIELDS:
+                fields[RESULT_FIELDS[tag]] = value
             else:
-                msg = (
-                    'Response malformed, '
-                    'XPath Expression Body/Fault/FaultString returned nothing'
-                )
-                log.error(msg)
-                raise ValueError(msg)
+                fields.setdefault(RESULT_RECORDS[tag], []).append(value)
 
-            if error_code:
-                error_code = error_code[0].text
+        if success:
+            return Result(True, **fields)
 
-            error = (error_code, error_message)
+        if fault is None:
+            msg = (
+                'Response malformed, '
+                'XPath Expression Body/Fault/FaultString returned nothing'
+            )
+            log.error(msg)
+            raise ValueError(msg)
 
-        return (success, error)
+        return Result(False, fault[0], fault[1], **fields)
 
-    def _request(self, data, auth=True):
-        """Execute a request with the given data.
+    def _is_successful(self, response):
+        """Proccess XML response.
 
-        :param data: The data to be sent in the request.
+        :params response: The XML response
+        :returns: Tuple (bool_success, error_info)
+        """
+        result = self._parse_result(response)
+        return (result.success, result.error)
+
+    def _prepare_request(self, data, auth=True, session_id=None):
+        """Serializes an envelope and works out where to post it.
+
+        :param data: The envelope root, or a StreamingEnvelope or
+                     RenderedEnvelope which are passed on as the body.
         :param auth: If True, will check for a estabilished session.
-        :returns: Response object.
+        :param session_id: Session to use instead of the one from login.
+        :returns: Tuple (url, headers, body)
         """
         url = self._url
-        data = etree.tostring(data)
 
-        if auth:
+        if self._xml.iselement(data):
+            data = self._xml.tostring(data)
+
+        if auth and session_id is None:
             self._check_session()
+            session_id = self._sessionId
 
         headers = {
             'Content-Type': 'text/xml;charset=UTF-8',
         }
 
-        if auth and self._sessionId:
+        if auth and session_id:
             # API docs states that jsessionid must be appended
             # after a semicolon not a question mark
-            url = '%s;jsessionid=%s' % (url, self._sessionId)
-
-        response = self._s.post(url, headers=headers, data=data)
-        response.raise_for_status()
+            url = '%s;jsessionid=%s' % (url, session_id)
 
-        return response
+        return (url, headers, data)
 
     def _insert_text_node(self, tag, text, target):
         """Inserts a tag and a text node within it on the target.
@@ -194,16 +438,16 @@ class API(object):
         :returns: The node itself.
         """
 
-        if not isinstance(tag, basestring):
+        if not isinstance(tag, string_types):
             raise TypeError('tag must be a string.')
 
-        if not isinstance(text, basestring):
+        if not isinstance(text, string_types):
             raise TypeError('text must be a string.')
 
-        if not isinstance(target, etree._Element):
+        if not self._xml.iselement(target):
             raise TypeError('target must be a etree._Element type object.')
 
-        new_node = etree.SubElement(target, tag)
+        new_node = self._xml.SubElement(target, tag)
         new_node.text = text
 
         return new_node
@@ -211,56 +455,63 @@ class API(object):
     def _error(self, error):
         msg = 'Error code %s: %s' % (error[0], error[1])
         log.error(msg)
-        raise StandardError(msg)
-
-    def login(self):
-        """Log in to Silverpop API.
-
-        :returns: Boolean indicating whether successful or not.
-        """
+        raise SilverpopError(msg)
 
-        root, action_node = self._envelope('Login')
-        self._insert_text_node('USERNAME', self._username, action_node)
-        self._insert_text_node('PASSWORD', self._password, action_node)
+    def _session_from_result(self, result):
+        """Extracts the session id of a decoded Login response."""
+        if result.error:
+            self._error(result.error)
 
-        response = self._request(root, auth=False)
+        if not result.session_id:
+            msg = 'No SESSIONID in the document.'
+            log.error(msg)
+            raise ValueError(msg)
 
-        response = response.text
-        success, error = self._is_successful(response)
+        return result.session_id
 
-        if error:
-            self._error(error)
+    def _login_result(self, result):
+        """Stores the session of a decoded Login response.
 
-        if success:
-            self._sessionId = self._get_session_id(response)
+        :returns: Boolean indicating whether successful or not.
+        """
+        self._sessionId = self._session_from_result(result)
 
-        return success
+        return result.success
 
-    def logout(self):
-        """Log off the Silverpop API"""
-        root, action_node = self._envelope('Logout')
+    def _logout_result(self, result):
+        """Forgets the session after a decoded Logout response."""
+        if result.success:
+            self._sessionId = None
 
-        response = self._request(root)
-        success, error = self._is_successful(response.text)
+        return result.success
 
-        if success:
-            self._sessionId = None
+    def _build_login(self):
+        """Builds the Login envelope, see API.login."""
+        root, action_node = self._envelope('Login')
+        self._insert_text_node('USERNAME', self._username, action_node)
+        self._insert_text_node('PASSWORD', self._password, action_node)
 
-        return success
+        return root
 
-    def add_recipient(self, list_id, created_from, columns=None, **kwargs):
-        """Add and opt-in a contact to a database.
+    def _build_logout(self):
+        """Builds the Logout envelope, see API.logout."""
+        root, action_node = self._envelope('Logout')
 
-        :params list_id: The database ID on Silverpop.
-        :params created_from: One of the CREATED_FROM_* constants.
-        :params columns: A dict containing COLUMN data (including email).
-        :returns: A tuple (bool_success, recipient_id, error_tuple).
+        return root
 
-        """
+    def _build_add_recipient(self, list_id, created_from, columns=None,
+                             **kwargs):
+        """Builds the AddRecipient envelope, see API.add_recipient."""
+        return self._tree('AddRecipient', self._add_recipient_parts(
+            list_id, created_from, columns, **kwargs))
 
-        root, action_node = self._envelope('AddRecipient')
-        self._insert_text_node('LIST_ID', str(list_id), action_node)
-        self._insert_text_node('CREATED_FROM', str(created_from), action_node)
+    def _add_recipient_parts(self, list_id, created_from, columns=None,
+                             **kwargs):
+        """Children of the AddRecipient node, see _tree."""
+        parts = [
+            self._text_element('LIST_ID', str(list_id)),
+            self._text_element('CREATED_FROM', str(created_from)),
+        ]
 
         # Simple params that only need a boolean flag
         optional_params_bools = (
@@ -271,46 +522,40 @@ class API(object):
 
         for param in optional_params_bools:
             if param in kwargs and kwargs.get(param) is True:
-                self._insert_text_node(param.upper(), 'true', action_node)
+                parts.append(self._text_element(param.upper(), 'true'))
 
         if 'visitor_key' in kwargs:
-            self._insert_text_node(
-                'VISITOR_KEY', kwargs['visitor_key'], action_node)
+            parts.append(
+                self._text_element('VISITOR_KEY', kwargs['visitor_key']))
 
         if 'sync_fields' in kwargs:
-            if not isinstance(kwargs['sync_fields'], dict):
+            sync_fields = kwargs['sync_fields']
+            if not isinstance(sync_fields, dict):
                 raise TypeError('A dict is expected in sync_fields.')
 
-            sync_root = etree.SubElement(action_node, 'SYNC_FIELDS')
-
-            self._create_child_element(
-                sync_root,
-                'SYNC_FIELD',
-                kwargs['sync_fields']
-            )
+            parts.append(_Container('SYNC_FIELDS', lambda: (
+                self._child_elements('SYNC_FIELD', sync_fields))))
 
         if columns:
-            self._create_child_element(action_node, 'COLUMN', columns)
-
-        response = self._request(root)
-        success, error = self._is_successful(response.text)
-
-        response_tree = self._parse_from_string(response.text)
-        recipient_id = response_tree.xpath('Body/RESULT/RecipientId//text()')
+            if not isinstance(columns, dict):
+                raise TypeError('dict_columns must be a dictionary.')
 
-        if recipient_id:
-            recipient_id = recipient_id[0]
+            parts.append(lambda: self._child_elements('COLUMN', columns))
 
-        return (success, recipient_id, error)
+        return parts
 
-    def remove_recipient(self, list_id, email, columns=None):
-        """Remove a contact of a specified database.
-
-        :params list_id: The database ID on Silverpop.
-        :params email: The recipient email.
-        :returns: Tuple (bool_success, error_tuple)
+    def _build_select_recipient_data(self, list_id, email):
+        """Builds the SelectRecipientData envelope,
+        see API.get_recipient_id.
         """
+        root, action_node = self._envelope('SelectRecipientData')
+        self._insert_text_node('LIST_ID', str(list_id), action_node)
+        self._insert_text_node('EMAIL', email, action_node)
 
+        return root
+
+    def _build_remove_recipient(self, list_id, email, columns=None):
+        """Builds the RemoveRecipient envelope, see API.remove_recipient."""
         root, action_node = self._envelope('RemoveRecipient')
         self._insert_text_node('LIST_ID', str(list_id), action_node)
         self._insert_text_node('EMAIL', email, action_node)
@@ -318,26 +563,12 @@ class API(object):
         if columns:
             self._create_child_element(action_node, 'COLUMN', columns)
 
-        response = self._request(root)
-        success, error = self._is_successful(response.text)
-
-        return (success, error)
-
-    def opt_out_recipient(self, list_id, email='', columns=None,
-                          mailing_id=None, recipient_id=None, job_id=None):
-        """Opt-out a contact. The last three parameters is for Opt-out
-        at mailing level.
-
-        :params list_id: Identifies the ID of the database
-                         from which to opt out the contact.
+        return root
 
-        :params email: The contact email address to opt out.
-        :params columns: Optional dict defining optional <COLUMN> tags.
-        :params mailing_id: Supply this if you don't supply an email.
-        :params recipient_id: Supply this if you don't supply an email.
-        :params job_id_id: Supply this if you don't supply an email.
-        :returns: Tuple (bool_success, error_tuple)
-        """
+    def _build_opt_out_recipient(self, list_id, email='', columns=None,
+                                 mailing_id=None, recipient_id=None,
+                                 job_id=None):
+        """Builds the OptOutRecipient envelope, see API.opt_out_recipient."""
         root, action_node = self._envelope('OptOutRecipient')
 
         self._insert_text_node('LIST_ID', str(list_id), action_node)
@@ -373,23 +604,11 @@ class API(object):
         if columns:
             self._create_child_element(action_node, 'COLUMN', columns)
 
-        response = self._request(root)
-        success, error = self._is_successful(response.text)
-
-        return (success, error)
-
-    def create_contact_list(self, database_id, contact_list_name,
-                            visibility=0):
-        """Creates a new contact list in Silverpop.
+        return root
 
-        :params database_id: The Id of the database the new Contact List
-                             will be associated with.
-        :params contact_list_name: The name of the Contact List to be created.
-        :params visibility: Defines the visibility of the Contact List being
-                            created.
-                            0 - Private, 1 - Shared
-        :returns: A tuple (bool_success, contact_list_id, error_info)
-        """
+    def _build_create_contact_list(self, database_id, contact_list_name,
+                                   visibility=0):
+        """Builds the CreateContactList envelope, see API.create_contact_list."""
         root, action_node = self._envelope('CreateContactList')
 
         self._insert_text_node('DATABASE_ID', str(database_id), action_node)
@@ -400,35 +619,12 @@ class API(object):
         )
         self._insert_text_node('VISIBILITY', str(visibility), action_node)
 
-        response = self._request(root)
-        success, error = self._is_successful(response.text)
-        contact_list_id = None
-
-        if success:
-            response_tree = self._parse_from_string(response.text)
-            contact_list_id = response_tree.xpath(
-                'Body/RESULT/CONTACT_LIST_ID//text()'
-            )
-            if contact_list_id:
-                contact_list_id = contact_list_id[0]
-
-        return (success, contact_list_id, error)
-
-    def add_contact_to_contact_list(self, contact_list_id, contact_id='',
-                                    columns=None):
-        """This interface adds one new contact to a Contact List. If you want
-        to add a contact using its email, you must pass it as an 'email' key
-        in columns param.
+        return root
 
-        :params contact_list_id: The ID of the Contact List to which
-                                 you are adding the contact.
-        :params contact_id: The ID of the contact being added to the Contact
-                            List. Either a CONTACT_ID or COLUMN elements must
-                            be provided. If CONTACT_ID is provided, any COLUMN
-                            elements will be ignored.
-        :params colums: A dictionary is expected here to feed the COLUMN
-                        fields.
-        :returns: A tuple (bool_success, error_info)
+    def _build_add_contact_to_contact_list(self, contact_list_id,
+                                           contact_id='', columns=None):
+        """Builds the AddContactToContactList envelope,
+        see API.add_contact_to_contact_list.
         """
         root, action_node = self._envelope('AddContactToContactList')
 
@@ -444,21 +640,10 @@ class API(object):
         if not contact_id and columns:
             self._create_child_element(action_node, 'COLUMN', columns)
 
-        response = self._request(root)
-        success, error = self._is_successful(response.text)
-
-        return (success, error)
-
-    def send_mailing(self, mailing_id, recipient_email, columns=None):
-        """Sends mailing to the specified ID.
-
-        :params mailing_id: Identifies the mailing Engage will send.
-        :params recipient_email: Identifies the targeted
-                                 contact's email address.
+        return root
 
-        :params: columns: Optional dict defining optional <COLUMN> tags.
-        :returns: Tuple (bool_success, error_tuple)
-        """
+    def _build_send_mailing(self, mailing_id, recipient_email, columns=None):
+        """Builds the SendMailing envelope, see API.send_mailing."""
         root, action_node = self._envelope('SendMailing')
 
         self._insert_text_node('MailingId', str(mailing_id), action_node)
@@ -467,41 +652,26 @@ class API(object):
         if columns:
             self._create_child_element(action_node, 'COLUMN', columns)
 
-        response = self._request(root)
-        success, error = self._is_successful(response.text)
-
-        return (success, error)
-
-    def schedule_mailing(self, template_id, list_id, mailing_name,
-                         visibility=1, substitutions=None,
-                         scheduled=None, **kwargs):
-        """Sends a template-based mailing to a specific database or query.
-
-        :params template_id: ID of template upon which to base the mailing.
-        :params list_id: ID of database, query, or contact list
-                         to send the template-based mailing.
-
-        :params mailing_name: Name to assign to the generated mailing.
-        :params visibility: Where to save. Values are
-                            0 - Private folder, 1 - Shared folder.
-
-        :params substitutions: A dict defining template substitution
-                               names and values.
-
-        :params scheduled: Datetime obj specifying the date and time
-                           the mailing will be scheduled.
-
-        :params kwargs: Optional parameters. Check API documentation
-                        for more info.
-
-        :returns: Tuple (bool_success, mailing_id)
-        """
-        root, action_node = self._envelope('ScheduleMailing')
-
-        self._insert_text_node('TEMPLATE_ID', str(template_id), action_node)
-        self._insert_text_node('LIST_ID', str(list_id), action_node)
-        self._insert_text_node('MAILING_NAME', mailing_name, action_node)
-        self._insert_text_node('VISIBILITY', str(visibility), action_node)
+        return root
+
+    def _build_schedule_mailing(self, template_id, list_id, mailing_name,
+                                visibility=1, substitutions=None,
+                                scheduled=None, **kwargs):
+        """Builds the ScheduleMailing envelope, see API.schedule_mailing."""
+        return self._tree('ScheduleMailing', self._schedule_mailing_parts(
+            template_id, list_id, mailing_name, visibility, substitutions,
+            scheduled, **kwargs))
+
+    def _schedule_mailing_parts(self, template_id, list_id, mailing_name,
+                                visibility=1, substitutions=None,
+                                scheduled=None, **kwargs):
+        """Children of the ScheduleMailing node, see _tree."""
+        parts = [
+            self._text_element('TEMPLATE_ID', str(template_id)),
+            self._text_element('LIST_ID', str(list_id)),
+            self._text_element('MAILING_NAME', mailing_name),
+            self._text_element('VISIBILITY', str(visibility)),
+        ]
 
         # Simple params that only need a boolean flag
         optional_params_bools = (
@@ -514,7 +684,7 @@ class API(object):
 
         for param in optional_params_bools:
             if param in kwargs and kwargs.get(param) is True:
-                self._insert_text_node(param.upper(), 'true', action_node)
+                parts.append(self._text_element(param.upper(), 'true'))
 
         # Simple params that its key/value it's all that is needed
         optional_params = (
@@ -527,11 +697,7 @@ class API(object):
 
         for param in optional_params:
             if param in kwargs and kwargs.get(param):
-                self._insert_text_node(
-                    param.upper(),
-                    kwargs[param],
-                    action_node
-                )
+                parts.append(self._text_element(param.upper(), kwargs[param]))
 
         if 'send_time_optimization' in kwargs:
             sto = kwargs['send_time_optimization']
@@ -540,16 +706,16 @@ class API(object):
                     'send_time_optimization must be '
                     'NONE, SEND_24HRS or SEND_WEEK'
                 )
-            self._insert_text_node('SEND_TIME_OPTIMIZATION', sto, action_node)
+            parts.append(self._text_element('SEND_TIME_OPTIMIZATION', sto))
 
         if 'supression_list' in kwargs:
             sl = kwargs['supression_list']
             if not isinstance(sl, list):
                 raise TypeError('supression_list must be a list')
-            sl_node = etree.SubElement(action_node, 'SUPRESSION_LISTS')
 
-            for elt in sl:
-                self._insert_text_node('SUPRESSION_LIST_ID', str(elt), sl_node)
+            parts.append(_Container('SUPRESSION_LISTS', lambda: (
+                self._text_element('SUPRESSION_LIST_ID', str(elt))
+                for elt in sl)))
 
         # If present, will schedule mailing. If not, will be sent immediatelly.
         if scheduled:
@@ -557,28 +723,1282 @@ class API(object):
                 raise TypeError('scheduled param must be a datetime object.')
 
             scheduled = scheduled.strftime('%m-%d-%Y %H:%M:%S %p')
-            self._insert_text_node('SCHEDULED', scheduled, action_node)
+            parts.append(self._text_element('SCHEDULED', scheduled))
 
         # This is used to perform template substitution like %%CustomerID%%
         if substitutions:
             if not isinstance(substitutions, dict):
                 raise TypeError('substitutions param must be a dict!')
 
-            subs_node = etree.SubElement(action_node, 'SUBSTITUTIONS')
-            self._create_child_element(
-                subs_node, 'SUBSTITUTION', substitutions
-            )
+            parts.append(_Container('SUBSTITUTIONS', lambda: (
+                self._child_elements('SUBSTITUTION', substitutions))))
 
-        response = self._request(root)
-        success, error = self._is_successful(response.text)
+        return parts
 
-        if error:
-            self._error(error)
+    def _build_import_list(self, map_file, source_file, email=None,
+                           file_encoding=None):
+        """Builds the ImportList envelope, see API.import_list."""
+        root, action_node = self._envelope('ImportList')
+
+        self._insert_text_node('MAP_FILE', map_file, action_node)
+        self._insert_text_node('SOURCE_FILE', source_file, action_node)
+
+        if email:
+            self._insert_text_node('EMAIL', email, action_node)
+
+        if file_encoding:
+            self._insert_text_node(
+                'FILE_ENCODING', file_encoding, action_node)
+
+        return root
 
-        response_tree = self._parse_from_string(response.text)
-        mailing_id = response_tree.xpath('Body/RESULT/MAILING_ID//text()')
+    def _build_export_list(self, list_id, export_type='ALL',
+                           export_format='CSV', columns=None,
+                           date_start=None, date_end=None,
+                           file_encoding='utf-8'):
+        """Builds the ExportList envelope, see API.export_list."""
+        if export_type not in ('ALL', 'OPT_IN', 'OPT_OUT', 'UNDELIVERABLE'):
+            raise ValueError(
+                'export_type must be ALL, OPT_IN, OPT_OUT or UNDELIVERABLE')
 
-        if mailing_id:
-            mailing_id = mailing_id[0]
+        root, action_node = self._envelope('ExportList')
+
+        self._insert_text_node('LIST_ID', str(list_id), action_node)
+        self._insert_text_node('EXPORT_TYPE', export_type, action_node)
+        self._insert_text_node('EXPORT_FORMAT', export_format, action_node)
+        self._insert_text_node('FILE_ENCODING', file_encoding, action_node)
+
+        for tag, date in (('DATE_START', date_start),
+                          ('DATE_END', date_end)):
+            if date:
+                if not isinstance(date, datetime):
+                    raise TypeError('%s must be a datetime object.' % (
+                        tag.lower()))
+
+                self._insert_text_node(
+                    tag, date.strftime('%m/%d/%Y %H:%M:%S'), action_node)
+
+        if columns:
+            columns_node = self._xml.SubElement(
+                action_node, 'EXPORT_COLUMNS')
+            for column in columns:
+                self._insert_text_node('COLUMN', column, columns_node)
+
+        return root
+
+    def _build_get_job_status(self, job_id):
+        """Builds the GetJobStatus envelope, see API.get_job_status."""
+        root, action_node = self._envelope('GetJobStatus')
+        self._insert_text_node('JOB_ID', str(job_id), action_node)
+
+        return root
+
+    def _build_get_lists(self, visibility, list_type):
+        """Builds the GetLists envelope, see API.get_lists."""
+        root, action_node = self._envelope('GetLists')
+        self._insert_text_node('VISIBILITY', str(visibility), action_node)
+        self._insert_text_node('LIST_TYPE', str(list_type), action_node)
+
+        return root
+
+    def _build_get_mailing_templates(self, visibility):
+        """Builds the GetMailingTemplates envelope,
+        see API.get_mailing_templates.
+        """
+        root, action_node = self._envelope('GetMailingTemplates')
+        self._insert_text_node('VISIBILITY', str(visibility), action_node)
+
+        return root
+
+
+def _action(root):
+    """:returns: The action of an envelope root, StreamingEnvelope or
+                 RenderedEnvelope.
+    """
+    action = getattr(root, 'action', None)
+
+    if action is None:
+        return root[0][0].tag
+
+    return action
+
+
+def _instrumented(method):
+    """Marks when an API method was entered, so the CallEvent of its
+    call includes building the envelope. The mark is cleared when the
+    method returns or raises without calling Engage.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        instrumentation = self._instrumentation
+        if instrumentation is None:
+            return method(self, *args, **kwargs)
+
+        instrumentation.enter()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            instrumentation.leave()
+
+    return wrapper
+
+
+class API(BaseAPI):
+    """This class manages the access to Silverpop Engage API.
+
+    Usage is as simple as:
+    from silverpy import Api
+
+    api = API('user', 'passwd', 'silverpop_url')
+    api.login()
+    api.add_recipient(...)
+    api.logout()
+
+    With sessions > 1, up to that many Engage sessions are logged in and
+    each concurrent request leases its own one.
+
+    Requests go through transport, by default an HTTPTransport built from
+    transport_options (pool_connections, pool_maxsize, timeout, keep_alive
+    and max_retries, see silverpy.transport.HTTPTransport).
+
+    A silverpy.scheduler.Scheduler can be given to rate limit and retry
+    every authenticated call. A silverpy.breakers.Guard wraps every
+    attempt with a circuit breaker and a bulkhead per action.
+
+    With a silverpy.cache.RecipientCache, the recipient IDs returned by
+    add_recipient are kept to answer get_recipient_id.
+
+    Names of databases, contact lists and mailing templates are resolved
+    through metadata, a silverpy.metadata.Metadata created on first use.
+
+    AddRecipient and ScheduleMailing requests with at least stream_threshold
+    columns, sync fields, substitutions or suppression lists are serialized
+    while being sent, with chunked transfer encoding, instead of being
+    built in memory first. None disables streaming. Smaller AddRecipient
+    and OptOutRecipient requests are serialized from precompiled
+    templates, see silverpy.templates.
+
+    A silverpy.instrumentation.Instrumentation receives the timing of
+    every call, phase by phase.
+
+    xml_backend names the silverpy.backends backend building envelopes
+    and decoding responses: lxml, etree or string.
+
+    With a silverpy.sessionstore.SessionStore, the session is shared
+    with every client of the store, in any process: login() adopts the
+    saved one and logout() leaves it logged in for the others. With
+    heartbeat, a session nobody used for that many seconds is kept alive
+    with a GetJobStatus call. It should be longer than the touch_interval
+    of the store.
+
+    A silverpy.capture.Capture records every request, for replaying.
+    """
+    def __init__(self, username, password, url, sessions=1, transport=None,
+                 scheduler=None, stream_threshold=None, cache=None,
+                 instrumentation=None, xml_backend=None,
+                 session_store=None, heartbeat=None, capture=None,
+                 guard=None, **transport_options):
+        super(API, self).__init__(username, password, url, xml_backend)
+
+        if transport is None:
+            transport = HTTPTransport(**transport_options)
+        elif transport_options:
+            raise TypeError(
+                'transport options can not be combined with a transport.')
+
+        self._transport = transport
+        self._scheduler = scheduler
+        self._guard = guard
+        self._stream_threshold = stream_threshold
+        self._cache = cache
+        self._instrumentation = instrumentation
+        self._capture = capture
+        self._metadata = None
+        self._login_lock = threading.Lock()
+        self._pool = SessionPool(self, sessions) if sessions > 1 else None
+
+        self._session_store = session_store
+        self._heartbeat = heartbeat
+        self._heartbeat_thread = None
+        self._stopped = threading.Event()
+        if session_store is not None:
+            self._session_key = session_store.key(username, url)
+
+    @property
+    def metadata(self):
+        """The silverpy.metadata.Metadata index of this org."""
+        if self._metadata is None:
+            with self._login_lock:
+                if self._metadata is None:
+                    self._metadata = Metadata(self)
+
+        return self._metadata
+
+    @metadata.setter
+    def metadata(self, metadata):
+        self._metadata = metadata
+
+    def _request(self, data, auth=True, session_id=None):
+        """Execute a request with the given data.
+
+        :param data: The data to be sent in the request.
+        :param auth: If True, will check for a estabilished session.
+        :param session_id: Session to use instead of the one from login.
+        :returns: Response object.
+        """
+        url, headers, data = self._prepare_request(data, auth, session_id)
+
+        return self._post(url, headers, data)
+
+    def _post(self, url, headers, data):
+        """Posts through the transport, recording the request if
+        capturing.
+        """
+        if self._capture is None:
+            return self._transport.post(url, headers, data)
+
+        return self._capture.post(self._transport, url, headers, data)
+
+    def close(self):
+        """Closes the connections kept open by the transport."""
+        if self._metadata is not None:
+            self._metadata.close()
+
+        self._stop_heartbeat()
+        self._transport.close()
+
+    def transact_sender(self, url, **options):
+        """Creates a silverpy.transact.TransactSender posting through the
+        transport of this client.
+
+        :params url: The Transact endpoint of your Engage pod.
+        :params options: See TransactSender.
+        """
+        from .transact import TransactSender
+
+        return TransactSender(url, transport=self._transport, **options)
+
+    def campaign_scheduler(self, template_id, mailing_name, **options):
+        """Creates a silverpy.campaigns.CampaignScheduler scheduling the
+        mailings of a campaign run through this client.
+
+        :params template_id: ID of the template, or its name.
+        :params mailing_name: Name of the mailings, unless overridden.
+        :params options: See CampaignScheduler.
+        """
+        from .campaigns import CampaignScheduler
+
+        return CampaignScheduler(self, template_id, mailing_name, **options)
+
+    def _streams(self, entries):
+        """True if an envelope with that many repeated entries is to be
+        streamed.
+        """
+        return self._stream_threshold is not None \
+            and entries >= self._stream_threshold \
+            and self._xml.streaming
+
+    def _envelope_for(self, action, parts, entries):
+        """Streams the envelope if it has at least stream_threshold
+        repeated entries, builds it in memory otherwise.
+        """
+        if self._streams(entries):
+            return StreamingEnvelope(action, parts)
+
+        return self._tree(action, parts)
+
+    def _call(self, root):
+        """Executes an authenticated request and decodes its response,
+        through the guard and the scheduler if there are.
+
+        :param root: The envelope root, a StreamingEnvelope or
+                     a RenderedEnvelope.
+        :returns: A Result object.
+        """
+        if self._instrumentation is not None:
+            return self._timed_call(root)
+
+        if self._scheduler is None and self._guard is None:
+            return self._attempt(root)
+
+        return self._run(_action(root), root)
+
+    def _run(self, action, root):
+        """_attempt, through the guard and the scheduler if there are.
+
+        The guard applies to every attempt the scheduler makes, so rate
+        limit waits and retry backoffs don't count as latency of the
+        action nor hold its bulkhead.
+        """
+        call = functools.partial(self._attempt, root)
+
+        if self._guard is not None:
+            # Fails fast before waiting for the scheduler
+            self._guard.check(action)
+            call = functools.partial(self._guard.run, action, call)
+
+        if self._scheduler is None:
+            return call()
+
+        return self._scheduler.run(action, call)
+
+    def _timed_call(self, root):
+        """_call, reporting a CallEvent to the instrumentation."""
+        instrumentation = self._instrumentation
+        action = _action(root)
+        event = instrumentation.begin(action)
+
+        try:
+            result = self._run(action, root)
+        except Exception as e:
+            instrumentation.end(event, error=e)
+            raise
+
+        instrumentation.end(event, result)
+
+        return result
+
+    def _send(self, root, session_id=None):
+        """Posts an authenticated request and decodes its response,
+        timing each phase when instrumented.
+
+        :returns: A Result object.
+        """
+        event = None
+        if self._instrumentation is not None:
+            event = self._instrumentation.current()
+
+        if event is None:
+            if session_id is None:
+                response = self._request(root)
+            else:
+                response = self._request(root, session_id=session_id)
+
+            return self._parse_result(response.content)
+
+        return self._timed_send(event, root, True, session_id)
+
+    def _timed_send(self, event, root, auth=True, session_id=None):
+        """Posts a request and decodes its response, adding the time of
+        each phase to event.
+
+        :returns: A Result object.
+        """
+        started = now_ns()
+        url, headers, data = self._prepare_request(root, auth, session_id)
+        data = self._instrumentation.counted(data, event)
+        serialized = now_ns()
+        # Streamed bodies add their serialization while they are sent
+        streamed = event.phases['serialize']
+        response = self._post(url, headers, data)
+        received = now_ns()
+        streamed = event.phases['serialize'] - streamed
+        result = self._parse_result(response.content)
+
+        event.add('serialize', serialized - started)
+        event.add('request', received - serialized - streamed)
+        event.add('parse', now_ns() - received)
+        event.requests += 1
+        event.bytes_received += len(response.content)
+
+        return result
+
+    def _session_call(self, root, auth=True, session_id=None):
+        """Posts a Login or Logout request and decodes its response.
+
+        When instrumented, the request is reported as a call of its own,
+        also when it renews a session in the middle of another call.
+
+        :returns: A Result object.
+        """
+        instrumentation = self._instrumentation
+
+        if instrumentation is None:
+            if session_id is None:
+                response = self._request(root, auth=auth)
+            else:
+                response = self._request(root, session_id=session_id)
+
+            return self._parse_result(response.content)
+
+        event = instrumentation.begin(_action(root))
+
+        try:
+            result = self._timed_send(event, root, auth, session_id)
+        except Exception as e:
+            instrumentation.end(event, error=e)
+            raise
+
+        instrumentation.end(event, result)
+
+        return result
+
+    def _attempt(self, root):
+        """Executes an authenticated request and decodes its response.
+
+        If Engage reports the session as expired, logs in again once and
+        replays the request.
+
+        :param root: The envelope root.
+        :returns: A Result object.
+        """
+        if self._pool is None:
+            store = self._session_store
+            if store is not None and self._sessionId is None:
+                with self._login_lock:
+                    if self._sessionId is None:
+                        self.login()
+
+            session_id = self._sessionId
+            result = self._send(root)
+
+            if result.session_expired:
+                log.warning('Engage session expired, logging in again.')
+
+                with self._login_lock:
+                    # Another thread may have renewed it in the meantime
+                    if self._sessionId == session_id:
+                        self._relogin(session_id)
+
+                session_id = self._sessionId
+                result = self._send(root)
+
+            if store is not None and not result.session_expired:
+                store.touch(self._session_key, session_id)
+
+            return result
+
+        self._check_session()
+        session_id = self._pool.acquire()
+
+        try:
+            result = self._send(root, session_id)
+
+            if result.session_expired:
+                log.warning('Engage session expired, logging in again.')
+                session_id = self._renew_pooled(session_id)
+                result = self._send(root, session_id)
+        finally:
+            self._pool.release(session_id)
+
+        store = self._session_store
+        if store is not None and not result.session_expired \
+                and session_id == self._sessionId:
+            store.touch(self._session_key, session_id)
+
+        return result
+
+    def _new_session(self):
+        """Logs in a new Engage session without storing it.
+
+        :returns: The session id.
+        """
+        return self._session_from_result(
+            self._session_call(self._build_login(), auth=False))
+
+    def _end_session(self, session_id):
+        """Logs out the given Engage session."""
+        return self._session_call(
+            self._build_logout(), session_id=session_id).success
+
+    def _relogin(self, stale):
+        """Replaces an expired session, through the session store if
+        there is one.
+        """
+        if self._session_store is None:
+            self.login()
+            return
+
+        self._sessionId = self._session_store.renew(
+            self._session_key, stale, self._new_session)
+
+    def _renew_pooled(self, stale):
+        """Replaces an expired leased session. With a session store, the
+        pool adopts the saved session, which only one process renews,
+        unless the pool already holds it.
+
+        :returns: The id of the new session, leased to the caller.
+        """
+        store = self._session_store
+        if store is None:
+            return self._pool.renew(stale)
+
+        with self._login_lock:
+            saved = store.get(self._session_key)
+            shared = None if saved is None else saved[0]
+
+            if shared is None or shared == stale or shared not in self._pool:
+                self._sessionId = self._pool.renew(stale, lambda: store.renew(
+                    self._session_key, stale, self._new_session))
+                return self._sessionId
+
+        # The shared session is leased already, an own one replaces it
+        return self._pool.renew(stale)
+
+    def _login_shared(self):
+        """login() with a session store: adopts the saved session, which
+        the first call checks, or logs in and saves a new one.
+        """
+        store = self._session_store
+        saved = store.get(self._session_key)
+
+        if saved is not None:
+            self._sessionId = saved[0]
+        else:
+            self._sessionId = store.renew(
+                self._session_key, None, self._new_session)
+
+        if self._pool is not None:
+            self._pool.add(self._sessionId)
+
+        if self._heartbeat and self._heartbeat_thread is None:
+            self._stopped.clear()
+            self._heartbeat_thread = threading.Thread(
+                target=self._beat, name='silverpy-heartbeat')
+            self._heartbeat_thread.daemon = True
+            self._heartbeat_thread.start()
+
+        return True
+
+    def _beat(self):
+        """Keeps the shared session alive while nobody uses it."""
+        store = self._session_store
+
+        while not self._stopped.wait(self._heartbeat):
+            saved = store.get(self._session_key)
+
+            if saved is not None:
+                session_id, last_used = saved
+                if session_id != self._sessionId:
+                    # Renewed by another process
+                    self._sessionId = session_id
+
+                if last_used + self._heartbeat > store.clock():
+                    continue
+
+            try:
+                if self._pool is None:
+                    self._call(self._build_get_job_status(0))
+                    continue
+
+                # Not any idle pooled session, the shared one
+                session_id = self._sessionId
+                result = self._send(self._build_get_job_status(0), session_id)
+                if not result.session_expired:
+                    store.touch(self._session_key, session_id)
+            except Exception as e:
+                log.warning('Engage session heartbeat failed: %s', e)
+
+    def _stop_heartbeat(self):
+        self._stopped.set()
+
+        if self._heartbeat_thread is not None:
+            self._heartbeat_thread.join()
+            self._heartbeat_thread = None
+
+    def login(self):
+        """Log in to Silverpop API.
+
+        :returns: Boolean indicating whether successful or not.
+        """
+        if self._session_store is not None:
+            return self._login_shared()
+
+        success = self._login_result(
+            self._session_call(self._build_login(), auth=False))
+
+        if self._pool is not None:
+            self._pool.add(self._sessionId)
+
+        return success
+
+    def logout(self):
+        """Log off the Silverpop API. Every pooled session is logged out.
+
+        The session of a session store is only forgotten, as other
+        processes may still use it.
+        """
+        if self._pool is not None:
+            self._check_session()
+
+            if self._session_store is not None:
+                self._pool.close(keep=(self._sessionId,))
+                self._stop_heartbeat()
+            else:
+                self._pool.close()
+
+            self._sessionId = None
+
+            return True
+
+        if self._session_store is not None:
+            self._check_session()
+            self._stop_heartbeat()
+            self._sessionId = None
+
+            return True
+
+        return self._logout_result(self._session_call(self._build_logout()))
+
+    @_instrumented
+    def add_recipient(self, list_id, created_from, columns=None, **kwargs):
+        """Add and opt-in a contact to a database.
+
+        :params list_id: The database ID on Silverpop.
+        :params created_from: One of the CREATED_FROM_* constants.
+        :params columns: A dict containing COLUMN data (including email).
+        :returns: A tuple (bool_success, recipient_id, error_tuple).
+
+        """
+        entries = len(columns or ()) + len(kwargs.get('sync_fields') or ())
+
+        if self._streams(entries):
+            parts = self._add_recipient_parts(
+                list_id, created_from, columns, **kwargs)
+            envelope = StreamingEnvelope('AddRecipient', parts)
+        else:
+            values = dict(kwargs, list_id=list_id, created_from=created_from,
+                          columns=columns)
+            envelope = templates.ADD_RECIPIENT.render(values)
+
+        result = self._call(envelope)
+
+        if self._cache is not None and result.recipient_id:
+            email = column_email(columns) \
+                or column_email(kwargs.get('sync_fields'))
+            if email:
+                self._cache.set(list_id, email, result.recipient_id)
+
+        return (result.success, result.recipient_id, result.error)
+
+    @_instrumented
+    def get_recipient_id(self, list_id, email):
+        """Looks up the RecipientId of a contact, from the cache if
+        there is one.
+
+        :params list_id: The database ID on Silverpop.
+        :params email: The recipient email.
+        :returns: Tuple (bool_success, recipient_id, error_tuple)
+        """
+        if self._cache is not None:
+            recipient_id = self._cache.get(list_id, email)
+            if recipient_id is not None:
+                return (True, recipient_id, None)
+
+        result = self._call(self._build_select_recipient_data(list_id, email))
+
+        if self._cache is not None and result.recipient_id:
+            self._cache.set(list_id, email, result.recipient_id)
+
+        return (result.success, result.recipient_id, result.error)
+
+    @_instrumented
+    def remove_recipient(self, list_id, email, columns=None):
+        """Remove a contact of a specified database.
+
+        :params list_id: The database ID on Silverpop.
+        :params email: The recipient email.
+        :returns: Tuple (bool_success, error_tuple)
+        """
+        if self._cache is not None:
+            self._cache.invalidate(list_id, email)
+
+        root = self._build_remove_recipient(list_id, email, columns)
+        result = self._call(root)
+
+        return (result.success, result.error)
+
+    @_instrumented
+    def opt_out_recipient(self, list_id, email='', columns=None,
+                          mailing_id=None, recipient_id=None, job_id=None):
+        """Opt-out a contact. The last three parameters is for Opt-out
+        at mailing level.
+
+        :params list_id: Identifies the ID of the database
+                         from which to opt out the contact.
+
+        :params email: The contact email address to opt out.
+        :params columns: Optional dict defining optional <COLUMN> tags.
+        :params mailing_id: Supply this if you don't supply an email.
+        :params recipient_id: Supply this if you don't supply an email.
+        :params job_id_id: Supply this if you don't supply an email.
+        :returns: Tuple (bool_success, error_tuple)
+        """
+        values = {'list_id': list_id, 'columns': columns}
+
+        if email:
+            values['email'] = email
+        elif mailing_id and recipient_id and job_id:
+            values['mailing_id'] = mailing_id
+            values['recipient_id'] = recipient_id
+            values['job_id'] = job_id
+        else:
+            raise ValueError(
+                "If you don't supply email, "
+                "you need to supply mailing_id, recipient_id and job_id"
+            )
+
+        if self._cache is not None and email:
+            self._cache.invalidate(list_id, email)
+
+        result = self._call(templates.OPT_OUT_RECIPIENT.render(values))
+
+        return (result.success, result.error)
+
+    @_instrumented
+    def create_contact_list(self, database_id, contact_list_name,
+                            visibility=0, exists_ok=False):
+        """Creates a new contact list in Silverpop.
+
+        :params database_id: The Id of the database the new Contact List
+                             will be associated with.
+        :params contact_list_name: The name of the Contact List to be created.
+        :params visibility: Defines the visibility of the Contact List being
+                            created.
+                            0 - Private, 1 - Shared
+        :params exists_ok: If True, a contact list of that name in that
+                           database, already known to metadata, is
+                           returned instead.
+        :returns: A tuple (bool_success, contact_list_id, error_info)
+        """
+        if exists_ok:
+            return self.metadata.get_or_create_contact_list(
+                database_id, contact_list_name, visibility)
+
+        root = self._build_create_contact_list(
+            database_id, contact_list_name, visibility)
+        result = self._call(root)
+
+        return (result.success, result.contact_list_id, result.error)
+
+    @_instrumented
+    def add_contact_to_contact_list(self, contact_list_id, contact_id='',
+                                    columns=None):
+        """This interface adds one new contact to a Contact List. If you want
+        to add a contact using its email, you must pass it as an 'email' key
+        in columns param.
+
+        :params contact_list_id: The ID of the Contact List to which
+                                 you are adding the contact.
+        :params contact_id: The ID of the contact being added to the Contact
+                            List. Either a CONTACT_ID or COLUMN elements must
+                            be provided. If CONTACT_ID is provided, any COLUMN
+                            elements will be ignored.
+        :params colums: A dictionary is expected here to feed the COLUMN
+                        fields.
+        :returns: A tuple (bool_success, error_info)
+        """
+        root = self._build_add_contact_to_contact_list(
+            contact_list_id, contact_id, columns)
+        result = self._call(root)
+
+        return (result.success, result.error)
+
+    @_instrumented
+    def send_mailing(self, mailing_id, recipient_email, columns=None):
+        """Sends mailing to the specified ID.
+
+        :params mailing_id: Identifies the mailing Engage will send.
+        :params recipient_email: Identifies the targeted
+                                 contact's email address.
+
+        :params: columns: Optional dict defining optional <COLUMN> tags.
+        :returns: Tuple (bool_success, error_tuple)
+        """
+        root = self._build_send_mailing(mailing_id, recipient_email, columns)
+        result = self._call(root)
+
+        return (result.success, result.error)
+
+    @_instrumented
+    def schedule_mailing(self, template_id, list_id, mailing_name,
+                         visibility=1, substitutions=None,
+                         scheduled=None, **kwargs):
+        """Sends a template-based mailing to a specific database or query.
+
+        :params template_id: ID of template upon which to base the mailing,
+                             or its name, resolved through metadata.
+        :params list_id: ID of database, query, or contact list
+                         to send the template-based mailing.
+
+        :params mailing_name: Name to assign to the generated mailing.
+        :params visibility: Where to save. Values are
+                            0 - Private folder, 1 - Shared folder.
+
+        :params substitutions: A dict defining template substitution
+                               names and values.
+
+        :params scheduled: Datetime obj specifying the date and time
+                           the mailing will be scheduled.
+
+        :params kwargs: Optional parameters. Check API documentation
+                        for more info.
+
+        :returns: Tuple (bool_success, mailing_id)
+        """
+        if isinstance(template_id, string_types) \
+                and not template_id.isdigit():
+            template_id = self.metadata.template_id(template_id)
+
+        parts = self._schedule_mailing_parts(
+            template_id, list_id, mailing_name, visibility, substitutions,
+            scheduled, **kwargs)
+        entries = (
+            len(substitutions or ()) + len(kwargs.get('supression_list') or ())
+        )
+        result = self._call(
+            self._envelope_for('ScheduleMailing', parts, entries))
+
+        if result.error:
+            self._error(result.error)
+
+        return (result.success, result.mailing_id)
+
+    @_instrumented
+    def import_list(self, map_file, source_file, email=None,
+                    file_encoding=None):
+        """Starts a job importing contacts from files previously uploaded
+        to the Engage FTP server.
+
+        :params map_file: Name of the mapping file in the upload folder.
+        :params source_file: Name of the CSV file in the upload folder.
+        :params email: Optional address notified when the job finishes.
+        :params file_encoding: Optional encoding of the source file.
+        :returns: Tuple (bool_success, job_id, error_tuple)
+        """
+        root = self._build_import_list(
+            map_file, source_file, email, file_encoding)
+        result = self._call(root)
+
+        return (result.success, result.job_id, result.error)
+
+    @_instrumented
+    def export_list(self, list_id, export_type='ALL', export_format='CSV',
+                    columns=None, date_start=None, date_end=None,
+                    file_encoding='utf-8'):
+        """Starts a job exporting contacts of a database or contact list to
+        the Engage FTP download folder. See silverpy.exports.ExportManager
+        to wait for it and read the rows.
+
+        :params list_id: The database or contact list ID on Silverpop.
+        :params export_type: ALL, OPT_IN, OPT_OUT or UNDELIVERABLE.
+        :params export_format: CSV, TAB or PIPE.
+        :params columns: Optional list of column names to export.
+        :params date_start: Optional datetime, only export contacts
+                            modified after it.
+        :params date_end: Optional datetime, only export contacts
+                          modified before it.
+        :params file_encoding: Encoding of the exported file.
+        :returns: Tuple (bool_success, job_id, file_path, error_tuple)
+        """
+        root = self._build_export_list(
+            list_id, export_type, export_format, columns, date_start,
+            date_end, file_encoding)
+        result = self._call(root)
+
+        return (result.success, result.job_id, result.file_path, result.error)
+
+    @_instrumented
+    def get_job_status(self, job_id):
+        """Checks the status of a background job.
+
+        :params job_id: The job ID returned when the job was started.
+        :returns: Tuple (bool_success, job_status, error_tuple). job_status
+                  is one of the JOB_* constants.
+        """
+        result = self._call(self._build_get_job_status(job_id))
+
+        return (result.success, result.job_status, result.error)
+
+    def wait_for_job(self, job_id, interval=5, timeout=None):
+        """Polls GetJobStatus until the job finishes.
+
+        :params job_id: The job ID returned when the job was started.
+        :params interval: Seconds between polls.
+        :params timeout: Seconds to wait before giving up, None to wait
+                         forever.
+        :returns: The final job status: JOB_COMPLETE, JOB_ERROR or
+                  JOB_CANCELED.
+        """
+        deadline = time.time() + timeout if timeout is not None else None
+
+        while True:
+            success, status, error = self.get_job_status(job_id)
+
+            if error:
+                self._error(error)
+
+            if status in JOB_FINISHED:
+                return status
+
+            if deadline is not None and time.time() + interval > deadline:
+                raise SilverpopError(
+                    'Job %s still %s after %s seconds.' % (
+                        job_id, status, timeout))
+
+            time.sleep(interval)
+
+    @_instrumented
+    def get_lists(self, visibility, list_type):
+        """Lists the databases, queries or contact lists of a folder.
+
+        :params visibility: 0 - Private, 1 - Shared.
+        :params list_type: 0 - Databases, 1 - Queries, 2 - Both,
+                           18 - Contact lists. See GetLists for the rest.
+        :returns: Tuple (bool_success, lists, error_tuple). lists holds a
+                  dict per LIST, mapping each child tag (ID, NAME, TYPE...)
+                  to its text.
+        """
+        result = self._call(self._build_get_lists(visibility, list_type))
+
+        return (result.success, result.lists or [], result.error)
+
+    @_instrumented
+    def get_mailing_templates(self, visibility):
+        """Lists the mailing templates of a folder.
+
+        :params visibility: 0 - Private, 1 - Shared.
+        :returns: Tuple (bool_success, templates, error_tuple). templates
+                  holds a dict per MAILING_TEMPLATE, mapping each child tag
+                  (MAILING_ID, MAILING_NAME, SUBJECT...) to its text.
+        """
+        result = self._call(self._build_get_mailing_templates(visibility))
+
+        return (result.success, result.templates or [], result.error)
+
+    def bulk_import(self, list_id, rows, columns, uploader, sync_fields=None,
+                    action=imports.IMPORT_ADD_AND_UPDATE, email=None,
+                    wait=True, interval=5, timeout=None):
+        """Imports many contacts into a database with a single ImportList
+        job instead of one add_recipient call per contact.
+
+        Rows are streamed into a temporary CSV file, so memory use doesn't
+        depend on their number. The CSV and its mapping file are staged
+        through uploader, an object with an upload(local_path, name) method
+        such as silverpy.imports.FTPUploader.
+
+        :params list_id: The database ID on Silverpop.
+        :params rows: Iterable of dicts (as the columns param of
+                      add_recipient) or of sequences in columns order.
+        :params columns: Column names, in file order.
+        :params uploader: Puts files where Engage can import them from.
+        :params sync_fields: Names of the columns matching existing
+                             contacts.
+        :params action: One of the silverpy.imports.IMPORT_* constants.
+        :params email: Optional address notified when the job finishes.
+        :params wait: If True, polls the job until it finishes.
+        :params interval: Seconds between polls.
+        :params timeout: Seconds to wait for the job, None to wait forever.
+        :returns: Tuple (job_id, job_status). job_status is None if wait
+                  is False.
+        """
+        name = 'silverpy_%s_%s' % (list_id, uuid.uuid4().hex)
+        directory = tempfile.mkdtemp(prefix='silverpy')
+        source_path = os.path.join(directory, name + '.csv')
+        map_path = os.path.join(directory, name + '.xml')
+
+        try:
+            count = imports.write_csv(source_path, rows, columns)
+            imports.write_mapping(
+                map_path, list_id, columns, sync_fields, action, self._xml)
+
+            uploader.upload(source_path, name + '.csv')
+            uploader.upload(map_path, name + '.xml')
+        finally:
+            for path in (source_path, map_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            os.rmdir(directory)
+
+        log.info('Importing %d rows into list %s.', count, list_id)
+
+        success, job_id, error = self.import_list(
+            name + '.xml', name + '.csv', email)
+
+        if error:
+            self._error(error)
+
+        if not wait:
+            return (job_id, None)
+
+        return (job_id, self.wait_for_job(job_id, interval, timeout))
+
+    def _bulk(self, method, specs, workers, max_in_flight, ordered,
+              journal=None, indexed=False):
+        """Runs method once per spec over a thread pool.
+
+        :params method: Bound method to be called for every spec.
+        :params specs: Iterable of dicts (keyword arguments) or
+                       tuples (positional arguments).
+        :params workers: Number of threads.
+        :params max_in_flight: Maximum number of specs submitted but not
+                               yet yielded. Defaults to twice workers.
+        :params ordered: If True, items come back in input order,
+                         otherwise as soon as they complete.
+        :params journal: silverpy.journal.Journal recording every
+                         operation. Specs it holds an outcome for are
+                         skipped, unless indexed is True.
+        :params indexed: If True, specs are (index, spec) tuples.
+        :returns: Generator of BulkItem objects.
+        """
+        if max_in_flight is None:
+            max_in_flight = workers * 2
+
+        if workers < 1 or max_in_flight < 1:
+            raise ValueError('workers and max_in_flight must be positive.')
+
+        finished = set()
+        if journal is not None:
+            finished = journal.begin(method.__name__)
+            if indexed:
+                finished = set()
+            elif finished:
+                log.info('Resuming bulk %s, %d items already finished.',
+                         method.__name__, len(finished))
+
+        def call(index, spec):
+            try:
+                if isinstance(spec, dict):
+                    value = method(**spec)
+                else:
+                    value = method(*spec)
+            except Exception as e:
+                log.error('Bulk %s item %d failed: %s',
+                          method.__name__, index, e)
+                return BulkItem(index, spec, False, error=e)
+
+            # Every single-item method returns the success flag first
+            # and the error tuple last.
+            return BulkItem(index, spec, value[0], value, value[-1])
+
+        def run():
+            executor = futures.ThreadPoolExecutor(max_workers=workers)
+            pending = collections.deque() if ordered else set()
+
+            def finish(item):
+                if journal is not None:
+                    journal.record(item)
+                return item
+
+            def drain(block_until_empty):
+                while pending:
+                    if ordered:
+                        yield finish(pending.popleft().result())
+                    else:
+                        done, not_done = futures.wait(
+                            pending, return_when=futures.FIRST_COMPLETED)
+                        pending.difference_update(done)
+                        for future in done:
+                            yield finish(future.result())
+
+                    if not block_until_empty and len(pending) < max_in_flight:
+                        return
+
+            try:
+                for index, spec in (specs if indexed else enumerate(specs)):
+                    if index in finished:
+                        continue
+
+                    if len(pending) >= max_in_flight:
+                        for item in drain(False):
+                            yield item
+
+                    if journal is not None:
+                        journal.started(index, spec)
+
+                    future = executor.submit(call, index, spec)
+                    if ordered:
+                        pending.append(future)
+                    else:
+                        pending.add(future)
+
+                for item in drain(True):
+                    yield item
+            finally:
+                # Reached early if the caller stops iterating.
+                for future in pending:
+                    future.cancel()
+                executor.shutdown(wait=True)
+
+                if journal is not None:
+                    journal.commit()
+
+        return run()
+
+    def bulk_add_recipients(self, recipients, workers=8, max_in_flight=None,
+                            ordered=True, journal=None):
+        """Concurrent add_recipient over an iterable of recipients.
+
+        A fault or exception on one recipient doesn't stop the others.
+
+        :params recipients: Iterable of add_recipient arguments, either
+                            dicts of keyword arguments or tuples.
+        :params workers: Number of concurrent requests.
+        :params max_in_flight: Maximum number of recipients read ahead of
+                               the consumer. Defaults to twice workers.
+        :params ordered: Yield in input order (True) or as completed.
+        :params journal: silverpy.journal.Journal to record the run in.
+                         Run again with the same recipients and journal,
+                         recipients that already finished are skipped.
+        :returns: Generator of BulkItem objects. For successful items,
+                  value is the (bool_success, recipient_id, error_tuple)
+                  returned by add_recipient.
+        """
+        return self._bulk(self.add_recipient, recipients,
+                          workers, max_in_flight, ordered, journal)
+
+    def bulk_opt_out(self, recipients, workers=8, max_in_flight=None,
+                     ordered=True, journal=None):
+        """Concurrent opt_out_recipient over an iterable of recipients.
+
+        Arguments are the same as bulk_add_recipients.
+
+        :returns: Generator of BulkItem objects.
+        """
+        return self._bulk(self.opt_out_recipient, recipients,
+                          workers, max_in_flight, ordered, journal)
+
+    def bulk_remove(self, recipients, workers=8, max_in_flight=None,
+                    ordered=True, journal=None):
+        """Concurrent remove_recipient over an iterable of recipients.
+
+        Arguments are the same as bulk_add_recipients.
+
+        :returns: Generator of BulkItem objects.
+        """
+        return self._bulk(self.remove_recipient, recipients,
+                          workers, max_in_flight, ordered, journal)
+
+    def _column_rows(self, template, values, batch, with_email,
+                     email_required):
+        """Renders an envelope per row of a batch, see silverpy.columnar.
+
+        :returns: Generator of columnar.Row tuples.
+        """
+        if not isinstance(batch, columnar.ColumnBatch):
+            batch = columnar.ColumnBatch(batch)
+
+        if email_required and batch.email_column is None:
+            raise ValueError('The batch has no email column.')
+
+        list_id = values['list_id']
+        render = template.partial(values, ('email', 'columns'))
+
+        def rows():
+            row = {}
+
+            for email, fragment in batch.rows(with_email):
+                if email_required:
+                    if not email:
+                        yield columnar.Row(None, list_id, None)
+                        continue
+                    row['email'] = email
+
+                row['columns'] = templates.Serialized(fragment)
+                yield columnar.Row(render(row), list_id, email)
+
+        return rows()
+
+    def _call_row(self, envelope, list_id, email):
+        """Sends the envelope of a columnar row.
+
+        :returns: Tuple (bool_success, result).
+        """
+        if envelope is None:
+            raise ValueError('Row has no email.')
+
+        result = self._call(envelope)
+
+        return (result.success, result)
+
+    def _add_recipient_row(self, envelope, list_id, email):
+        """add_recipient of a columnar row."""
+        success, result = self._call_row(envelope, list_id, email)
+
+        if self._cache is not None and result.recipient_id and email:
+            self._cache.set(list_id, email, result.recipient_id)
+
+        return (success, result.recipient_id, result.error)
+
+    def _remove_row(self, envelope, list_id, email):
+        """remove_recipient and opt_out_recipient of a columnar row."""
+        if self._cache is not None and email:
+            self._cache.invalidate(list_id, email)
+
+        success, result = self._call_row(envelope, list_id, email)
+
+        return (success, result.error)
+
+    def bulk_add_recipient_columns(self, list_id, created_from, batch,
+                                   workers=8, max_in_flight=None,
+                                   ordered=True, **kwargs):
+        """Concurrent add_recipient over the rows of a columnar batch.
+
+        Columns are converted and escaped a whole column at a time and
+        every envelope rendered from a template, without a dict per row.
+        Envelopes are never streamed.
+
+        :params list_id: The database ID on Silverpop.
+        :params created_from: One of the CREATED_FROM_* constants.
+        :params batch: A silverpy.columnar.ColumnBatch, or a DataFrame,
+                       pyarrow Table, NumPy structured array or dict of
+                       columns to read with the default options.
+        :params kwargs: Flags shared by every row: send_autoreply,
+                        update_if_found, allow_html.
+        :returns: Generator of BulkItem objects, whose spec is a
+                  silverpy.columnar.Row. For successful items, value is
+                  the (bool_success, recipient_id, error_tuple) returned
+                  by add_recipient.
+        """
+        values = dict(kwargs, list_id=list_id, created_from=created_from)
+        rows = self._column_rows(
+            templates.ADD_RECIPIENT, values, batch, True, False)
+
+        return self._bulk(self._add_recipient_row, rows,
+                          workers, max_in_flight, ordered)
+
+    def bulk_opt_out_columns(self, list_id, batch, workers=8,
+                             max_in_flight=None, ordered=True):
+        """Concurrent opt_out_recipient over the rows of a columnar batch.
+        The email column gives EMAIL, the other columns are sent as
+        COLUMN entries. Rows without an email fail with a ValueError.
+
+        Arguments are the same as bulk_add_recipient_columns.
+
+        :returns: Generator of BulkItem objects.
+        """
+        rows = self._column_rows(templates.OPT_OUT_RECIPIENT,
+                                 {'list_id': list_id}, batch, False, True)
+
+        return self._bulk(self._remove_row, rows,
+                          workers, max_in_flight, ordered)
+
+    def bulk_remove_columns(self, list_id, batch, workers=8,
+                            max_in_flight=None, ordered=True):
+        """Concurrent remove_recipient over the rows of a columnar batch,
+        see bulk_opt_out_columns.
+
+        :returns: Generator of BulkItem objects.
+        """
+        rows = self._column_rows(templates.REMOVE_RECIPIENT,
+                                 {'list_id': list_id}, batch, False, True)
+
+        return self._bulk(self._remove_row, rows,
+                          workers, max_in_flight, ordered)
+
+    def bulk_replay(self, journal, workers=8, max_in_flight=None,
+                    ordered=True):
+        """Sends again only the operations of a journaled bulk run that
+        failed, with the method of the original run.
+
+        :params journal: The silverpy.journal.Journal of the run.
+        :returns: Generator of BulkItem objects, indexed as in the
+                  original run.
+        """
+        if journal.method not in (
+                'add_recipient', 'opt_out_recipient', 'remove_recipient'):
+            raise ValueError('Journal has no bulk job %s.' % journal.job)
 
-        return (success, mailing_id)
+        return self._bulk(getattr(self, journal.method), journal.failed(),
+                          workers, max_in_flight, ordered, journal,
+                          indexed=True)
@@ -0,0 +1,365 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: backends
+    :synopsis: XML backends building request envelopes and decoding
+               responses.
+
+BaseAPI builds envelopes with the element factory of a backend and hands
+it the responses to decode. A backend, and the XML library behind it, is
+only imported when first used:
+
+- lxml: the default. Required to stream envelopes.
+- etree: the standard library xml.etree.ElementTree.
+- string: no library at all. Envelopes are nodes serialized with
+  silverpy.templates.escape, and responses are read by a scanner that
+  only understands the plain markup Engage answers with.
+
+The backend is chosen by name, or by the SILVERPY_XML_BACKEND
+environment variable.
+"""
+
+import os
+import re
+import sys
+import threading
+
+BACKENDS = ('lxml', 'etree', 'string')
+
+# Environment variable naming the backend of clients given none.
+ENV_VAR = 'SILVERPY_XML_BACKEND'
+
+_loaded = {}
+_lock = threading.Lock()
+
+
+def get_backend(name=None):
+    """Loads a backend, once per process.
+
+    :params name: One of BACKENDS. Defaults to SILVERPY_XML_BACKEND, or
+                  lxml if installed and etree otherwise.
+    :returns: The backend.
+    """
+    if name is None:
+        name = os.environ.get(ENV_VAR) or None
+
+    backend = _loaded.get(name)
+    if backend is not None:
+        return backend
+
+    with _lock:
+        if name not in _loaded:
+            _loaded[name] = _load(name)
+
+    return _loaded[name]
+
+
+def _load(name):
+    if name is None:
+        try:
+            return LxmlBackend()
+        except ImportError:
+            return ElementTreeBackend()
+
+    if name == 'lxml':
+        return LxmlBackend()
+
+    if name == 'etree':
+        return ElementTreeBackend()
+
+    if name == 'string':
+        return StringBackend()
+
+    raise ValueError('Unknown XML backend %r, expected one of %s.' % (
+        name, ', '.join(BACKENDS)))
+
+
+class LxmlBackend(object):
+    """lxml trees, and responses decoded with precompiled XPaths."""
+    name = 'lxml'
+    streaming = True
+
+    def __init__(self):
+        from lxml import etree
+
+        self.etree = etree
+        self.Element = etree.Element
+        self.SubElement = etree.SubElement
+        self.iselement = etree.iselement
+        self.fromstring = etree.fromstring
+
+        # root.xpath() with a string expression recompiles it every time
+        self.success_xpath = etree.XPath(
+            'Body/RESULT/SUCCESS/text()', smart_strings=False)
+        self.fault_code_xpath = etree.XPath(
+            'Body/Fault/detail/error/errorid/text()', smart_strings=False)
+        self.fault_message_xpath = etree.XPath('Body/Fault/FaultString')
+        self._payload_xpaths = {}
+
+    def tostring(self, root):
+        return self.etree.tostring(root)
+
+    def payload_xpath(self, fields, records):
+        """Every payload field and record in a single evaluation."""
+        key = (fields, records)
+        xpath = self._payload_xpaths.get(key)
+
+        if xpath is None:
+            xpath = self._payload_xpaths[key] = self.etree.XPath(
+                ' | '.join('Body/RESULT/%s' % tag
+                           for tag in tuple(fields) + tuple(records)))
+
+        return xpath
+
+    def decode(self, content, fields, records):
+        """Reads what BaseAPI._parse_result needs of a response.
+
+        :params fields: Tags of RESULT children whose text is wanted.
+        :params records: Tags of RESULT children read as dicts.
+        :returns: Tuple (success_text, payload, fault). payload is a list
+                  of (tag, text_or_dict) and fault an (errorid,
+                  FaultString) tuple or None without a FaultString.
+        """
+        root = self.etree.fromstring(content)
+        success = self.success_xpath(root)
+
+        payload = []
+        for node in self.payload_xpath(fields, records)(root):
+            if node.tag in fields:
+                payload.append((node.tag, node.text))
+            else:
+                payload.append((node.tag, dict(
+                    (child.tag, child.text) for child in node)))
+
+        fault = None
+        message = self.fault_message_xpath(root)
+        if message:
+            code = self.fault_code_xpath(root)
+            fault = (code[0] if code else None, message[0].text)
+
+        return (success[0] if success else None, payload, fault)
+
+
+class ElementTreeBackend(object):
+    """The standard library ElementTree."""
+    name = 'etree'
+    streaming = False
+
+    def __init__(self):
+        if sys.version_info[0] == 2:
+            import xml.etree.cElementTree as etree
+        else:
+            import xml.etree.ElementTree as etree
+
+        self.etree = etree
+        self.Element = etree.Element
+        self.SubElement = etree.SubElement
+        self.iselement = etree.iselement
+        self.fromstring = etree.fromstring
+
+    def tostring(self, root):
+        return self.etree.tostring(root)
+
+    def decode(self, content, fields, records):
+        """See LxmlBackend.decode."""
+        return _decode(self.etree.fromstring(content), fields, records)
+
+
+def _decode(root, fields, records):
+    """LxmlBackend.decode of a parsed ElementTree or string tree."""
+    success = root.find('Body/RESULT/SUCCESS')
+
+    payload = []
+    result = root.find('Body/RESULT')
+    for node in (result if result is not None else ()):
+        if node.tag in fields:
+            payload.append((node.tag, node.text))
+        elif node.tag in records:
+            payload.append((node.tag, dict(
+                (child.tag, child.text) for child in node)))
+
+    fault = None
+    message = root.find('Body/Fault/FaultString')
+    if message is not None:
+        fault = (root.findtext('Body/Fault/detail/error/errorid'),
+                 message.text)
+
+    return (success.text if success is not None else None, payload, fault)
+
+
+class Node(object):
+    """Element of the string backend, with the subset of the ElementTree
+    interface BaseAPI uses.
+    """
+    __slots__ = ('tag', 'text', '_children')
+
+    def __init__(self, tag):
+        self.tag = tag
+        self.text = None
+        self._children = []
+
+    def append(self, node):
+        self._children.append(node)
+
+    def extend(self, nodes):
+        self._children.extend(nodes)
+
+    def __iter__(self):
+        return iter(self._children)
+
+    def __len__(self):
+        return len(self._children)
+
+    def __getitem__(self, index):
+        return self._children[index]
+
+    def find(self, path):
+        """First node matching a path of child tags, '*' matching any."""
+        nodes = [self]
+
+        for tag in path.split('/'):
+            nodes = [child for node in nodes for child in node
+                     if tag == '*' or child.tag == tag]
+            if not nodes:
+                return None
+
+        return nodes[0]
+
+    def findtext(self, path, default=None):
+        node = self.find(path)
+        if node is None:
+            return default
+
+        return node.text or ''
+
+    def __repr__(self):
+        return '<Node %s>' % self.tag
+
+
+# Markup Engage answers with: tags, CDATA sections, comments, the XML
+# declaration and text. Compiled by the first StringBackend.
+_TOKENS = (
+    r'<(/?)([^\s/>!?]+)[^>]*?(/?)>'
+    r'|<!\[CDATA\[(.*?)\]\]>'
+    r'|<!--.*?-->'
+    r'|<\?.*?\?>'
+    r'|([^<]+)')
+
+_ENTITIES = r'&(#x[0-9a-fA-F]+|#[0-9]+|amp|lt|gt|quot|apos);'
+
+_NAMED = {'amp': u'&', 'lt': u'<', 'gt': u'>', 'quot': u'"', 'apos': u"'"}
+
+try:
+    _chr = unichr
+except NameError:  # Python 3
+    _chr = chr
+
+
+def _entity(match):
+    name = match.group(1)
+
+    if name.startswith('#x'):
+        return _chr(int(name[2:], 16))
+
+    if name.startswith('#'):
+        return _chr(int(name[1:]))
+
+    return _NAMED[name]
+
+
+class StringBackend(object):
+    """Pure python nodes, serialized like lxml serializes the same tree."""
+    name = 'string'
+    streaming = False
+
+    def __init__(self):
+        from .templates import escape
+
+        self._escape = escape
+        self._tokens = re.compile(_TOKENS, re.S)
+        self._entities = re.compile(_ENTITIES)
+
+    def Element(self, tag):
+        return Node(tag)
+
+    def SubElement(self, parent, tag):
+        node = Node(tag)
+        parent.append(node)
+        return node
+
+    def iselement(self, obj):
+        return isinstance(obj, Node)
+
+    def tostring(self, root):
+        chunks = []
+        self._write(root, chunks)
+        return b''.join(chunks)
+
+    def _write(self, node, chunks):
+        tag = node.tag.encode('ascii')
+
+        if node.text is None and not node._children:
+            chunks.append(b'<' + tag + b'/>')
+            return
+
+        chunks.append(b'<' + tag + b'>')
+        if node.text is not None:
+            chunks.append(self._escape(node.text))
+        for child in node._children:
+            self._write(child, chunks)
+        chunks.append(b'</' + tag + b'>')
+
+    def fromstring(self, content):
+        """Parses the plain markup of Engage responses. Attributes,
+        namespaces and DTDs are not supported.
+        """
+        if isinstance(content, bytes):
+            content = content.decode('utf-8')
+
+        root = None
+        stack = []
+
+        for match in self._tokens.finditer(content):
+            closing, tag, empty, cdata, text = match.groups()
+
+            if tag is not None:
+                if closing:
+                    if not stack or stack.pop().tag != tag:
+                        raise ValueError('Mismatched tag </%s>.' % tag)
+                    continue
+
+                node = Node(tag)
+                if stack:
+                    stack[-1].append(node)
+                elif root is None:
+                    root = node
+                else:
+                    raise ValueError('More than one root element.')
+
+                if not empty:
+                    stack.append(node)
+            elif cdata is not None or text is not None:
+                if not stack:
+                    if text is not None and not text.strip():
+                        continue
+                    raise ValueError('Text outside the root element.')
+
+                parent = stack[-1]
+                if parent._children:
+                    # Tail text, which Engage responses only use for
+                    # indentation.
+                    continue
+
+                if text is not None:
+                    text = self._entities.sub(_entity, text)
+                else:
+                    text = cdata
+                parent.text = (parent.text or u'') + text
+
+        if root is None or stack:
+            raise ValueError('Document is empty or truncated.')
+
+        return root
+
+    def decode(self, content, fields, records):
+        """See LxmlBackend.decode."""
+        return _decode(self.fromstring(content), fields, records)
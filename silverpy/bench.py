@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: bench
+    :synopsis: End-to-end throughput benchmarks against a local stand-in.
+
+Runs API methods against a silverpy.standin.StandIn, served from a
+separate process, and reports calls per second, p50 and p99 latency and
+client CPU time per call for every method and execution mode.
+
+Usage: python -m silverpy.bench [--calls N] [--modes serial,threads] ...
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import time
+
+from .api import API, CONTACT_CREATED_MANUALLY
+from .sharding import OPERATIONS, ShardedExecutor
+from .standin import StandIn
+
+_timer = getattr(time, 'perf_counter', time.time)
+
+LIST_ID = 289032
+MAILING_ID = 9700
+
+# Methods in the order they run, so recipients exist once removed.
+METHODS = (
+    'add_recipient',
+    'opt_out_recipient',
+    'create_contact_list',
+    'add_contact_to_contact_list',
+    'send_mailing',
+    'schedule_mailing',
+    'remove_recipient',
+)
+
+MODES = ('serial', 'threads', 'sessions', 'processes')
+
+
+def _email(i):
+    return 'user%d@example.com' % i
+
+
+def specs(method, calls):
+    """:returns: List of positional arguments of calls calls to method."""
+    if method == 'add_recipient':
+        return [(LIST_ID, CONTACT_CREATED_MANUALLY,
+                 {'EMAIL': _email(i), 'Name': 'User %d' % i})
+                for i in range(calls)]
+
+    if method in ('opt_out_recipient', 'remove_recipient'):
+        return [(LIST_ID, _email(i)) for i in range(calls)]
+
+    if method == 'create_contact_list':
+        return [(LIST_ID, 'Contact list %d' % i) for i in range(calls)]
+
+    if method == 'add_contact_to_contact_list':
+        return [(LIST_ID, '', {'EMAIL': _email(i)}) for i in range(calls)]
+
+    if method == 'send_mailing':
+        return [(MAILING_ID, _email(i), {'Name': 'User %d' % i})
+                for i in range(calls)]
+
+    if method == 'schedule_mailing':
+        return [(MAILING_ID, LIST_ID, 'Mailing %d' % i)
+                for i in range(calls)]
+
+    raise ValueError('Unknown method %s.' % method)
+
+
+def _cpu():
+    """CPU seconds of this process and of its waited for children."""
+    times = os.times()
+    return times[0] + times[1] + times[2] + times[3]
+
+
+def _percentile(latencies, q):
+    return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+
+
+def _timed(items, started):
+    """Latency of every BulkItem, from its spec being read to yielded."""
+    latencies = []
+    errors = 0
+
+    for item in items:
+        latencies.append(_timer() - started[item.index])
+        errors += not item.success
+
+    return latencies, errors
+
+
+def _reading(calls, started):
+    for index, spec in enumerate(calls):
+        started[index] = _timer()
+        yield spec
+
+
+def run_serial(url, method, calls, options):
+    api = API('bench', 'bench', url)
+    api.login()
+    call = getattr(api, method)
+    latencies = []
+    errors = 0
+
+    try:
+        cpu = _cpu()
+        begin = _timer()
+
+        for spec in calls:
+            start = _timer()
+            try:
+                errors += not call(*spec)[0]
+            except Exception:
+                errors += 1
+            latencies.append(_timer() - start)
+
+        return latencies, errors, _timer() - begin, _cpu() - cpu
+    finally:
+        api.logout()
+        api.close()
+
+
+def run_bulk(url, method, calls, options, sessions=1):
+    api = API('bench', 'bench', url, sessions=sessions,
+              pool_maxsize=options.concurrency)
+    api.login()
+    started = {}
+
+    try:
+        cpu = _cpu()
+        begin = _timer()
+        items = api._bulk(
+            getattr(api, method), _reading(calls, started),
+            options.concurrency, options.concurrency, False)
+        latencies, errors = _timed(items, started)
+
+        return latencies, errors, _timer() - begin, _cpu() - cpu
+    finally:
+        api.logout()
+        api.close()
+
+
+def run_sessions(url, method, calls, options):
+    return run_bulk(url, method, calls, options, options.concurrency)
+
+
+def run_processes(url, method, calls, options):
+    if method not in OPERATIONS:
+        return None
+
+    started = {}
+    cpu = _cpu()
+    executor = ShardedExecutor(
+        'bench', 'bench', url, processes=options.processes,
+        threads=options.concurrency)
+
+    try:
+        begin = _timer()
+        items = executor.run(
+            method, _reading(calls, started),
+            options.processes * options.concurrency, False)
+        latencies, errors = _timed(items, started)
+        elapsed = _timer() - begin
+    finally:
+        executor.close()
+
+    # Worker CPU is only accounted for once they are joined
+    return latencies, errors, elapsed, _cpu() - cpu
+
+
+RUNNERS = {
+    'serial': run_serial,
+    'threads': run_bulk,
+    'sessions': run_sessions,
+    'processes': run_processes,
+}
+
+
+def _serve(options, conn):
+    standin = StandIn(
+        latency=options.latency / 1000.0, jitter=options.jitter / 1000.0,
+        error_rate=options.error_rate, throttle_rate=options.throttle_rate,
+        seed=0)
+    standin.start()
+    conn.send(standin.url)
+    # Until the benchmark is over
+    conn.recv()
+    standin.stop()
+
+
+def benchmark(options):
+    """Runs every method in every mode of options.
+
+    :returns: List of result dicts.
+    """
+    parent, child = multiprocessing.Pipe()
+    server = multiprocessing.Process(target=_serve, args=(options, child))
+    server.daemon = True
+    server.start()
+    url = parent.recv()
+    results = []
+
+    try:
+        for mode in options.modes:
+            for method in options.methods:
+                outcome = RUNNERS[mode](
+                    url, method, specs(method, options.calls), options)
+                if outcome is None:
+                    continue
+
+                latencies, errors, elapsed, cpu = outcome
+                latencies.sort()
+                calls = len(latencies)
+                results.append({
+                    'method': method,
+                    'mode': mode,
+                    'calls': calls,
+                    'errors': errors,
+                    'calls_per_sec': calls / elapsed,
+                    'p50_ms': _percentile(latencies, 0.5) * 1000,
+                    'p99_ms': _percentile(latencies, 0.99) * 1000,
+                    'cpu_us_per_call': cpu / calls * 1e6,
+                })
+    finally:
+        parent.send(None)
+        server.join()
+
+    return results
+
+
+def report(results, out=sys.stdout):
+    print('%-28s %-9s %7s %7s %10s %9s %9s %12s' % (
+        'method', 'mode', 'calls', 'errors', 'calls/s', 'p50 ms', 'p99 ms',
+        'cpu us/call'), file=out)
+
+    for r in results:
+        print('%-28s %-9s %7d %7d %10.1f %9.2f %9.2f %12.1f' % (
+            r['method'], r['mode'], r['calls'], r['errors'],
+            r['calls_per_sec'], r['p50_ms'], r['p99_ms'],
+            r['cpu_us_per_call']), file=out)
+
+
+def _names(allowed):
+    def parse(value):
+        names = [name for name in value.split(',') if name]
+        unknown = set(names) - set(allowed)
+        if unknown:
+            raise argparse.ArgumentTypeError(
+                'unknown: %s' % ', '.join(sorted(unknown)))
+        return names
+    return parse
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m silverpy.bench',
+        description='Benchmarks silverpy against a local Engage stand-in.')
+    parser.add_argument('--calls', type=int, default=1000,
+                        help='calls per method and mode')
+    parser.add_argument('--concurrency', type=int, default=8,
+                        help='threads, sessions or threads per process')
+    parser.add_argument('--processes', type=int, default=2,
+                        help='worker processes of the processes mode')
+    parser.add_argument('--methods', type=_names(METHODS),
+                        default=list(METHODS))
+    parser.add_argument('--modes', type=_names(MODES), default=list(MODES))
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='stand-in latency, in milliseconds')
+    parser.add_argument('--jitter', type=float, default=0.0,
+                        help='random extra latency, in milliseconds')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='fraction of calls answered with a fault')
+    parser.add_argument('--throttle-rate', type=float, default=None,
+                        help='calls per second before HTTP 429s')
+    parser.add_argument('--json', action='store_true',
+                        help='print results as JSON')
+
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    options = parse_args(argv)
+    results = benchmark(options)
+
+    if options.json:
+        print(json.dumps(results, indent=2, sort_keys=True))
+    else:
+        report(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,400 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: breakers
+    :synopsis: Per-action circuit breakers and bulkheads for API calls.
+
+A Guard sits in API's request path, around every attempt the
+scheduler makes, and keys its state by Engage action. A CircuitBreaker
+fails calls of an action fast once too many of them failed or were
+slow, and lets a few probes through after a while to find out whether
+Engage recovered. A Bulkhead caps the calls of an action in flight, so
+one degraded operation can't tie up the threads and connections every
+other operation needs.
+"""
+
+import collections
+import logging
+import threading
+import time
+
+from .api import SilverpopError
+
+log = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(SilverpopError):
+    """Raised instead of calling an action whose circuit is open."""
+
+
+class BulkheadFullError(SilverpopError):
+    """Raised when an action has all the calls in flight it may have."""
+
+
+class CircuitBreaker(object):
+    """Failure and latency tracking of one action over a sliding window.
+
+    The circuit opens when, over the last window seconds and at least
+    minimum_calls calls, the share of failed calls reaches failure_rate
+    or the share of calls slower than slow_call_threshold seconds reaches
+    slow_call_rate. It stays open for open_for seconds, then half-opens:
+    half_open_probes calls go through, and the circuit closes if they all
+    succeed in time, or opens again on the first that doesn't.
+
+    :params listeners: Callables receiving (name, old_state, new_state)
+                       on every transition.
+    """
+    def __init__(self, name, failure_rate=0.5, slow_call_threshold=None,
+                 slow_call_rate=0.5, minimum_calls=20, window=30.0,
+                 open_for=30.0, half_open_probes=1, listeners=(),
+                 clock=time.time):
+        if not 0 < failure_rate <= 1 or not 0 < slow_call_rate <= 1:
+            raise ValueError('Rates must be between 0 and 1.')
+
+        self.name = name
+        self.failure_rate = failure_rate
+        self.slow_call_threshold = slow_call_threshold
+        self.slow_call_rate = slow_call_rate
+        self.minimum_calls = minimum_calls
+        self.window = window
+        self.open_for = open_for
+        self.half_open_probes = half_open_probes
+        self.listeners = list(listeners)
+        self._clock = clock
+        self._lock = threading.Lock()
+
+        self.state = CLOSED
+        self.opened_at = None
+        self.transitions = collections.Counter()
+        self.rejected = 0
+        # (time, failed, slow) of the calls in the window
+        self._calls = collections.deque()
+        self._failures = 0
+        self._slow = 0
+        self._probes = 0
+        self._probes_passed = 0
+
+    def _transition(self, state):
+        """Changes state, with the lock held. Returns the listener call
+        to make once it's released.
+        """
+        old, self.state = self.state, state
+        self.transitions[(old, state)] += 1
+
+        if state == OPEN:
+            self.opened_at = self._clock()
+            log.warning('Circuit of %s opened.', self.name)
+        else:
+            log.info('Circuit of %s %s.', self.name,
+                     'closed' if state == CLOSED else 'half-opened')
+
+        if state != HALF_OPEN:
+            self._calls.clear()
+            self._failures = self._slow = 0
+
+        self._probes = self._probes_passed = 0
+
+        return (self.name, old, state)
+
+    def _notify(self, transition):
+        if transition is None:
+            return
+
+        for listener in self.listeners:
+            try:
+                listener(*transition)
+            except Exception as e:
+                log.error('Circuit breaker listener failed: %s', e)
+
+    def check(self):
+        """Fails fast without taking the right to make a call.
+
+        :raises: CircuitOpenError if the circuit is open and not due to
+                 half-open yet.
+        """
+        with self._lock:
+            if self.state == OPEN \
+                    and self._clock() - self.opened_at < self.open_for:
+                self.rejected += 1
+                raise CircuitOpenError('Circuit of %s is open.' % self.name)
+
+    def allow(self):
+        """Takes the right to make a call.
+
+        :returns: True if the call is a half-open probe.
+        :raises: CircuitOpenError if the call may not be made.
+        """
+        transition = None
+
+        with self._lock:
+            if self.state == OPEN:
+                if self._clock() - self.opened_at < self.open_for:
+                    self.rejected += 1
+                    raise CircuitOpenError(
+                        'Circuit of %s is open.' % self.name)
+
+                transition = self._transition(HALF_OPEN)
+
+            probe = self.state == HALF_OPEN
+            if probe:
+                if self._probes >= self.half_open_probes:
+                    self.rejected += 1
+                    raise CircuitOpenError(
+                        'Circuit of %s is half-open, probing.' % self.name)
+
+                self._probes += 1
+
+        self._notify(transition)
+
+        return probe
+
+    def record(self, probe, duration, failed):
+        """Accounts for a call allowed by allow().
+
+        :params probe: What allow() returned.
+        :params duration: Seconds the call took.
+        :params failed: True if the call failed.
+        """
+        now = self._clock()
+        slow = self.slow_call_threshold is not None \
+            and duration > self.slow_call_threshold
+        transition = None
+
+        with self._lock:
+            if probe and self.state == HALF_OPEN:
+                if failed or slow:
+                    transition = self._transition(OPEN)
+                else:
+                    self._probes_passed += 1
+                    if self._probes_passed >= self.half_open_probes:
+                        transition = self._transition(CLOSED)
+            elif not probe and self.state == CLOSED:
+                transition = self._add(now, failed, slow)
+
+        self._notify(transition)
+
+    def _add(self, now, failed, slow):
+        calls = self._calls
+        calls.append((now, failed, slow))
+        self._failures += failed
+        self._slow += slow
+
+        while calls and calls[0][0] <= now - self.window:
+            _, old_failed, old_slow = calls.popleft()
+            self._failures -= old_failed
+            self._slow -= old_slow
+
+        total = len(calls)
+        if total < self.minimum_calls:
+            return None
+
+        if self._failures >= self.failure_rate * total \
+                or self._slow >= self.slow_call_rate * total:
+            return self._transition(OPEN)
+
+        return None
+
+    def snapshot(self):
+        """:returns: A dict of the state and window counters."""
+        with self._lock:
+            total = len(self._calls)
+
+            return {
+                'state': self.state,
+                'calls': total,
+                'failures': self._failures,
+                'slow_calls': self._slow,
+                'failure_rate': self._failures / float(total or 1),
+                'slow_call_rate': self._slow / float(total or 1),
+                'opened_at': self.opened_at,
+                'rejected': self.rejected,
+                'transitions': dict(
+                    ('%s->%s' % key, count)
+                    for key, count in self.transitions.items()),
+            }
+
+
+class Bulkhead(object):
+    """Caps the calls of one action in flight.
+
+    :params max_concurrent: Calls allowed in flight at once.
+    :params max_wait: Seconds a call waits for a slot before being
+                      rejected, None to wait as long as it takes.
+    """
+    def __init__(self, name, max_concurrent, max_wait=0.0):
+        if max_concurrent < 1:
+            raise ValueError('max_concurrent must be positive.')
+
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_wait = max_wait
+        self.in_flight = 0
+        self.rejected = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """:raises: BulkheadFullError if no slot freed up in time."""
+        deadline = None
+        if self.max_wait is not None:
+            deadline = time.time() + self.max_wait
+
+        with self._cond:
+            while self.in_flight >= self.max_concurrent:
+                remaining = None
+                if deadline is not None:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        self.rejected += 1
+                        raise BulkheadFullError(
+                            '%s has %d calls in flight.' % (
+                                self.name, self.in_flight))
+
+                self._cond.wait(remaining)
+
+            self.in_flight += 1
+
+    def release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify()
+
+    def snapshot(self):
+        return {
+            'in_flight': self.in_flight,
+            'max_concurrent': self.max_concurrent,
+            'rejected': self.rejected,
+        }
+
+
+class Guard(object):
+    """Runs API calls through the circuit breaker and bulkhead of their
+    action, both created on first use.
+
+    Usage:
+    guard = Guard(slow_call_threshold=10.0, bulkheads={'ScheduleMailing': 2},
+                  default_bulkhead=16)
+    api = API('user', 'passwd', 'silverpop_url', guard=guard)
+    ...
+    export(guard.snapshot())
+
+    Exceptions count as failures, Engage faults only when their errorid
+    is in failure_faults: most faults are about the request, not about
+    Engage's health.
+
+    :params breaker_options: Keyword arguments of the CircuitBreaker of
+                             every action, see CircuitBreaker.
+    :params breakers: Dict of action to CircuitBreaker, for actions
+                      needing other options.
+    :params bulkheads: Dict of action to the calls it may have in
+                       flight.
+    :params default_bulkhead: Calls in flight allowed to any other
+                              action, None for no limit.
+    :params max_wait: Seconds a call waits for a bulkhead slot.
+    :params failure_faults: Engage errorids counted as failures, e.g.
+                            ('50',).
+    :params listeners: Callables receiving (action, old_state, new_state)
+                       on every circuit transition.
+    """
+    def __init__(self, bulkheads=None, default_bulkhead=None, max_wait=0.0,
+                 failure_faults=(), breakers=None, listeners=(),
+                 clock=time.time, **breaker_options):
+        self.bulkhead_limits = dict(bulkheads or {})
+        self.default_bulkhead = default_bulkhead
+        self.max_wait = max_wait
+        self.failure_faults = frozenset(str(code) for code in failure_faults)
+        self.listeners = list(listeners)
+        self.breaker_options = breaker_options
+        self._clock = clock
+        self._breakers = dict(breakers or {})
+        self._bulkheads = {}
+        self._lock = threading.Lock()
+
+        for breaker in self._breakers.values():
+            breaker.listeners.append(self._notify)
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def _notify(self, action, old, new):
+        for listener in self.listeners:
+            listener(action, old, new)
+
+    def breaker(self, action):
+        """:returns: The CircuitBreaker of an action."""
+        breaker = self._breakers.get(action)
+
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.get(action)
+                if breaker is None:
+                    breaker = self._breakers[action] = CircuitBreaker(
+                        action, listeners=[self._notify], clock=self._clock,
+                        **self.breaker_options)
+
+        return breaker
+
+    def bulkhead(self, action):
+        """:returns: The Bulkhead of an action, or None."""
+        bulkhead = self._bulkheads.get(action)
+
+        if bulkhead is None:
+            limit = self.bulkhead_limits.get(action, self.default_bulkhead)
+            if limit is None:
+                return None
+
+            with self._lock:
+                bulkhead = self._bulkheads.setdefault(
+                    action, Bulkhead(action, limit, self.max_wait))
+
+        return bulkhead
+
+    def check(self, action):
+        """:raises: CircuitOpenError if the circuit of action is open."""
+        self.breaker(action).check()
+
+    def run(self, action, call):
+        """Runs call, a function returning a Result.
+
+        :raises: CircuitOpenError or BulkheadFullError instead of calling.
+        """
+        breaker = self.breaker(action)
+        bulkhead = self.bulkhead(action)
+
+        if bulkhead is not None:
+            bulkhead.acquire()
+
+        try:
+            probe = breaker.allow()
+            started = self._clock()
+            failed = True
+
+            try:
+                result = call()
+                failed = not result.success \
+                    and result.fault_code in self.failure_faults
+
+                return result
+            finally:
+                breaker.record(probe, self._clock() - started, failed)
+        finally:
+            if bulkhead is not None:
+                bulkhead.release()
+
+    def snapshot(self):
+        """:returns: A dict per action of its circuit state and counters,
+                     and of its bulkhead if it has one.
+        """
+        with self._lock:
+            actions = set(self._breakers) | set(self._bulkheads)
+
+        snapshot = {}
+        for action in actions:
+            state = self.breaker(action).snapshot()
+            bulkhead = self._bulkheads.get(action)
+            state['bulkhead'] = bulkhead.snapshot() if bulkhead else None
+            snapshot[action] = state
+
+        return snapshot
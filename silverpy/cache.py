@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: cache
+    :synopsis: Recipient ID cache keyed by database and email.
+
+API keeps the RecipientId returned by add_recipient in a RecipientCache
+when given one, forgets it on remove_recipient and opt_out_recipient,
+and answers get_recipient_id from it without calling Engage. A store
+shares the cache between processes.
+"""
+
+import collections
+import logging
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+
+def column_email(columns):
+    """:returns: The EMAIL column of a dict of columns, lower case,
+                 or None.
+    """
+    for name, value in (columns or {}).items():
+        if name.upper() == 'EMAIL' and value:
+            return value.lower()
+
+    return None
+
+
+def _key(list_id, email):
+    return (str(list_id), email.lower())
+
+
+class MappingStore(object):
+    """Store over any dict-like object, e.g. a multiprocessing.Manager
+    dict shared by worker processes.
+    """
+    def __init__(self, mapping):
+        self._mapping = mapping
+
+    def get(self, key):
+        """:returns: Tuple (recipient_id, expires) or None."""
+        return self._mapping.get('%s/%s' % key)
+
+    def set(self, key, recipient_id, expires):
+        self._mapping['%s/%s' % key] = (recipient_id, expires)
+
+    def delete(self, key):
+        self._mapping.pop('%s/%s' % key, None)
+
+
+class SQLiteStore(object):
+    """Store in a local SQLite file, which any number of processes can
+    open at once.
+    """
+    def __init__(self, path, timeout=5.0):
+        import sqlite3
+
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            path, timeout=timeout, isolation_level=None,
+            check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute(
+            'CREATE TABLE IF NOT EXISTS recipients ('
+            'list_id TEXT NOT NULL, email TEXT NOT NULL, '
+            'recipient_id TEXT NOT NULL, expires REAL NOT NULL, '
+            'PRIMARY KEY (list_id, email))')
+
+    def get(self, key):
+        """:returns: Tuple (recipient_id, expires) or None."""
+        with self._lock:
+            row = self._db.execute(
+                'SELECT recipient_id, expires FROM recipients '
+                'WHERE list_id = ? AND email = ?', key).fetchone()
+
+        return tuple(row) if row else None
+
+    def set(self, key, recipient_id, expires):
+        with self._lock:
+            self._db.execute(
+                'INSERT OR REPLACE INTO recipients '
+                '(list_id, email, recipient_id, expires) VALUES (?, ?, ?, ?)',
+                key + (recipient_id, expires))
+
+    def delete(self, key):
+        with self._lock:
+            self._db.execute(
+                'DELETE FROM recipients WHERE list_id = ? AND email = ?', key)
+
+    def close(self):
+        self._db.close()
+
+
+class RecipientCache(object):
+    """Bounded cache of recipient IDs keyed by (list_id, email).
+
+    Entries expire ttl seconds after being stored and the least recently
+    used ones are evicted beyond maxsize. With a store (MappingStore or
+    SQLiteStore), local misses are looked up there and every change is
+    written through, so other processes see it.
+
+    :ivar hits: Lookups answered, locally or by the store.
+    :ivar misses: Lookups that found nothing.
+    """
+    def __init__(self, maxsize=10000, ttl=3600.0, store=None,
+                 clock=time.time):
+        if maxsize < 1:
+            raise ValueError('maxsize must be positive.')
+
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.store = store
+        self._clock = clock
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, list_id, email):
+        """:returns: The cached recipient ID or None."""
+        key = _key(list_id, email)
+        now = self._clock()
+
+        with self._lock:
+            entry = self._entries.pop(key, None)
+
+            if entry is not None and entry[1] > now:
+                # Back to the most recently used end
+                self._entries[key] = entry
+                self.hits += 1
+                return entry[0]
+
+        if self.store is not None:
+            entry = self.store.get(key)
+
+            if entry is not None and entry[1] > now:
+                with self._lock:
+                    self._put(key, entry)
+                    self.hits += 1
+                return entry[0]
+
+        with self._lock:
+            self.misses += 1
+
+        return None
+
+    def set(self, list_id, email, recipient_id):
+        key = _key(list_id, email)
+        entry = (recipient_id, self._clock() + self.ttl)
+
+        with self._lock:
+            self._put(key, entry)
+
+        if self.store is not None:
+            self.store.set(key, *entry)
+
+    def _put(self, key, entry):
+        self._entries.pop(key, None)
+        self._entries[key] = entry
+
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, list_id, email):
+        """Forgets a contact, here and in the store."""
+        key = _key(list_id, email)
+
+        with self._lock:
+            self._entries.pop(key, None)
+
+        if self.store is not None:
+            self.store.delete(key)
+
+    def clear(self):
+        """Empties the local cache. The store is left untouched."""
+        with self._lock:
+            self._entries.clear()
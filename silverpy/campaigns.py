@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: campaigns
+    :synopsis: ScheduleMailing fanned out over the segments of a campaign.
+
+A campaign run schedules one mailing per contact list, from the same
+template and with mostly the same substitutions and suppression lists.
+CampaignScheduler serializes those shared parts once, renders only what
+each segment overrides, and sends the mailings concurrently within a
+rate budget. Faults are reported per segment instead of raised.
+"""
+
+import collections
+import logging
+import time
+from datetime import datetime
+
+from .api import string_types
+from .scheduler import TokenBucket
+from .templates import SCHEDULE_MAILING, Serialized
+
+log = logging.getLogger(__name__)
+
+_SEND_TIME_OPTIMIZATIONS = ('NONE', 'SEND_24HRS', 'SEND_WEEK')
+
+_SUBSTITUTIONS = SCHEDULE_MAILING.fields[-1]
+
+# Optional ScheduleMailing fields only written when truthy, as by
+# schedule_mailing.
+_OPTIONAL = ('subject', 'from_name', 'from_address', 'reply_to',
+             'parent_folder_path', 'scheduled', 'substitutions')
+
+
+class Schedule(collections.namedtuple(
+        'Schedule', 'mailing_ids errors skipped')):
+    """Outcome of CampaignScheduler.schedule.
+
+    :ivar mailing_ids: Dict of list ID to the MAILING_ID of its mailing.
+    :ivar errors: Dict of list ID to the error tuple returned by Engage
+                  or the exception raised.
+    :ivar skipped: List IDs already scheduled by the run, not sent again.
+    """
+    __slots__ = ()
+
+
+def _values(fields):
+    """Validates ScheduleMailing arguments the way schedule_mailing does.
+
+    :returns: Dict of the values to render SCHEDULE_MAILING with.
+    """
+    values = dict(fields)
+
+    for name in _OPTIONAL:
+        if name in values and not values[name]:
+            del values[name]
+
+    sto = values.get('send_time_optimization')
+    if 'send_time_optimization' in values \
+            and sto not in _SEND_TIME_OPTIMIZATIONS:
+        raise ValueError(
+            'send_time_optimization must be NONE, SEND_24HRS or SEND_WEEK')
+
+    if 'supression_list' in values \
+            and not isinstance(values['supression_list'], list):
+        raise TypeError('supression_list must be a list')
+
+    if 'scheduled' in values:
+        if not isinstance(values['scheduled'], datetime):
+            raise TypeError('scheduled param must be a datetime object.')
+        values['scheduled'] = \
+            values['scheduled'].strftime('%m-%d-%Y %H:%M:%S %p')
+
+    if 'substitutions' in values \
+            and not isinstance(values['substitutions'], dict):
+        raise TypeError('substitutions param must be a dict!')
+
+    return values
+
+
+class CampaignScheduler(object):
+    """Schedules a mailing per segment of a campaign run.
+
+    Usage:
+    campaign = api.campaign_scheduler(
+        'Spring sale', 'Spring sale', subject='Spring sale',
+        substitutions=substitutions, supression_list=[123, 456], rate=5)
+    schedule = campaign.schedule([
+        (101, {'mailing_name': 'Spring sale - gold'}),
+        (102, {'mailing_name': 'Spring sale - silver',
+               'substitutions': {'discount': '10%'}}),
+    ])
+
+    Segments are list IDs, or tuples (list_id, overrides) where overrides
+    replace campaign arguments for that segment. Substitutions overrides
+    are merged into the campaign ones, so only the overridden items are
+    serialized again.
+
+    A run schedules a list at most once: segments whose list was already
+    scheduled, by this call or a previous one, are skipped. Failed ones
+    can be given to schedule again.
+
+    Envelopes are rendered from silverpy.templates.SCHEDULE_MAILING and
+    never streamed.
+
+    :params api: A logged-in API instance.
+    :params template_id: ID of the template, or its name, resolved
+                         through metadata.
+    :params mailing_name: Name of the mailings, unless overridden.
+    :params rate: Mailings scheduled per second at most, on top of the
+                  scheduler of the API if it has one. None for no limit.
+    :params burst: Mailings that may be sent at once within rate.
+    :params workers: Number of concurrent requests.
+    :params fields: The other arguments of schedule_mailing shared by
+                    every segment: visibility, substitutions, scheduled,
+                    supression_list, subject...
+    """
+    def __init__(self, api, template_id, mailing_name, rate=None,
+                 burst=None, workers=8, clock=time.time, sleep=time.sleep,
+                 **fields):
+        if isinstance(template_id, string_types) \
+                and not template_id.isdigit():
+            template_id = api.metadata.template_id(template_id)
+
+        self._api = api
+        self.workers = workers
+        self._bucket = None
+        if rate is not None:
+            self._bucket = TokenBucket(rate, burst, clock, sleep)
+
+        fields.setdefault('visibility', 1)
+        self._values = _values(dict(
+            fields, template_id=template_id, mailing_name=mailing_name))
+
+        substitutions = self._values.get('substitutions') or {}
+        self._substitutions = collections.OrderedDict(
+            (key, _SUBSTITUTIONS.item(key, substitutions[key]))
+            for key in substitutions)
+
+        # Renderers by names of the overridden fields
+        self._renderers = {}
+        self.mailing_ids = {}
+
+    def _renderer(self, varying):
+        render = self._renderers.get(varying)
+
+        if render is None:
+            render = self._renderers[varying] = SCHEDULE_MAILING.partial(
+                self._values, varying)
+
+        return render
+
+    def render(self, list_id, overrides=None):
+        """:returns: The ScheduleMailing RenderedEnvelope of a segment.
+
+        Overrides with an empty value, e.g. subject='' or scheduled=None,
+        leave the field out as schedule_mailing does. Empty substitutions
+        overrides change nothing, as they are merged.
+        """
+        overrides = overrides or {}
+        row = _values(overrides)
+        row['list_id'] = list_id
+        # Empty overrides included, so they aren't rendered from the
+        # campaign values
+        varying = set(overrides)
+        varying.add('list_id')
+
+        if 'substitutions' in row:
+            items = self._substitutions.copy()
+            for key, value in row['substitutions'].items():
+                items[key] = _SUBSTITUTIONS.item(key, value)
+            row['substitutions'] = Serialized(b''.join(items.values()))
+        else:
+            varying.discard('substitutions')
+
+        return self._renderer(frozenset(varying))(row)
+
+    def _schedule_segment(self, list_id, overrides=None):
+        """Schedules the mailing of a segment.
+
+        :returns: Tuple (bool_success, mailing_id, error_tuple)
+        """
+        envelope = self.render(list_id, overrides)
+
+        if self._bucket is not None:
+            self._bucket.acquire()
+
+        result = self._api._call(envelope)
+
+        return (result.success, result.mailing_id, result.error)
+
+    def _segments(self, segments, skipped):
+        seen = set(self.mailing_ids)
+
+        for segment in segments:
+            if not isinstance(segment, tuple):
+                segment = (segment,)
+
+            if segment[0] in seen:
+                log.info('List %s already scheduled, skipped.', segment[0])
+                skipped.append(segment[0])
+                continue
+
+            seen.add(segment[0])
+            yield segment
+
+    def schedule(self, segments):
+        """Schedules the mailing of every segment not scheduled yet.
+
+        :params segments: Iterable of list IDs or (list_id, overrides)
+                          tuples.
+        :returns: A Schedule.
+        """
+        skipped = []
+        mailing_ids = {}
+        errors = {}
+
+        items = self._api._bulk(
+            self._schedule_segment, self._segments(segments, skipped),
+            self.workers, None, False)
+
+        for item in items:
+            list_id = item.spec[0]
+
+            if item.success:
+                mailing_ids[list_id] = self.mailing_ids[list_id] = \
+                    item.value[1]
+            else:
+                errors[list_id] = item.error
+
+        return Schedule(mailing_ids, errors, skipped)
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: capture
+    :synopsis: Recording of the Engage traffic of an API client.
+
+An API given a Capture appends one record per request to a gzipped JSON
+lines file: when it was sent, its action, the request and response
+sizes, the HTTP status and the latency, and the envelope itself with
+the Login credentials scrubbed. Session ids are never written.
+Streamed envelopes over max_body bytes are recorded without it.
+
+silverpy.replay plays a capture back against a stand-in.
+"""
+
+import gzip
+import json
+import logging
+import re
+import threading
+import time
+import zlib
+
+log = logging.getLogger(__name__)
+
+_timer = getattr(time, 'perf_counter', time.time)
+
+_ACTION = re.compile(br'<Envelope>\s*<Body>\s*<(\w+)')
+
+_CREDENTIALS = re.compile(
+    br'<(USERNAME|PASSWORD)>.*?</\1>|<(USERNAME|PASSWORD)/>', re.S)
+
+SCRUBBED = b'***'
+
+# Bytes of a streamed envelope kept to read its action from.
+_HEAD_SIZE = 256
+
+
+def scrub(body):
+    """:returns: The envelope with the text of USERNAME and PASSWORD
+                 nodes replaced.
+    """
+    return _CREDENTIALS.sub(
+        lambda match: b'<%s>%s</%s>' % (
+            (match.group(1) or match.group(2)), SCRUBBED,
+            (match.group(1) or match.group(2))),
+        body)
+
+
+def action_of(body):
+    """:returns: The action of a serialized envelope, or None."""
+    match = _ACTION.match(body)
+
+    return match.group(1).decode('ascii') if match else None
+
+
+class _Tee(object):
+    """Iterates a streamed body, counting its bytes and keeping its head.
+
+    :params limit: Size up to which a copy of the chunks is kept, or
+                   None for no copy. chunks is None once exceeded.
+    """
+    def __init__(self, body, limit=None):
+        self._body = body
+        self._limit = limit
+        self.size = 0
+        self.head = b''
+        self.chunks = [] if limit is not None else None
+
+    def __iter__(self):
+        for chunk in self._body:
+            self.size += len(chunk)
+
+            if len(self.head) < _HEAD_SIZE:
+                self.head += chunk[:_HEAD_SIZE - len(self.head)]
+
+            if self.chunks is not None:
+                if self.size > self._limit:
+                    self.chunks = None
+                else:
+                    self.chunks.append(chunk)
+
+            yield chunk
+
+
+class Capture(object):
+    """Records every request posted by the API clients it is given to.
+
+    Usage:
+    with Capture('engage.jsonl.gz') as capture:
+        api = API('user', 'passwd', 'silverpop_url', capture=capture)
+        ...
+
+    A streamed envelope is copied as it is sent, so capturing costs up
+    to max_body bytes of memory per request in flight. Larger ones are
+    recorded without their envelope, and skipped by replays.
+
+    :params path: The gzipped file records are appended to.
+    :params bodies: If False, envelopes are left out, and the capture
+                    can't be replayed. Streamed ones are then only
+                    counted.
+    :params scrubber: Callable applied to every envelope after the
+                      credentials are scrubbed, e.g. to mask emails.
+    :params max_body: Size of the largest streamed envelope recorded.
+    """
+    def __init__(self, path, bodies=True, scrubber=None, clock=time.time,
+                 max_body=8 * 1024 * 1024):
+        self.path = path
+        self.bodies = bodies
+        self.max_body = max_body
+        self.scrubber = scrubber
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._file = gzip.open(path, 'ab')
+        self.records = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def post(self, transport, url, headers, data):
+        """Posts a request through transport and records it.
+
+        :returns: The response.
+        """
+        if not isinstance(data, bytes):
+            data = _Tee(data, self.max_body if self.bodies else None)
+
+        sent_at = self._clock()
+        started = _timer()
+        response = None
+        error = None
+
+        try:
+            response = transport.post(url, headers, data)
+            return response
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            latency = _timer() - started
+
+            try:
+                self._record(data, response, error, sent_at, latency)
+            except Exception as e:
+                log.error('Capture failed: %s', e)
+
+    def _record(self, data, response, error, sent_at, latency):
+        if isinstance(data, bytes):
+            body = head = data
+            size = len(data)
+        else:
+            body = None if data.chunks is None else b''.join(data.chunks)
+            head = data.head
+            size = data.size
+
+        content = getattr(response, 'content', None) or b''
+
+        record = {
+            'ts': sent_at,
+            'action': action_of(head),
+            'sent': size,
+            'received': len(content),
+            'status': getattr(response, 'status_code', None),
+            'latency_ms': latency * 1000,
+        }
+
+        if error is not None:
+            record['error'] = '%s: %s' % (type(error).__name__, error)
+
+        if self.bodies and body is None:
+            record['body_omitted'] = True
+        elif self.bodies:
+            body = scrub(body)
+            if self.scrubber is not None:
+                body = self.scrubber(body)
+            record['body'] = body.decode('utf-8')
+
+        line = (json.dumps(record, sort_keys=True) + '\n').encode('utf-8')
+
+        with self._lock:
+            self._file.write(line)
+            self.records += 1
+
+    def flush(self):
+        with self._lock:
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+def read(path):
+    """:returns: Generator of the records of a capture, in the order
+                 they were written. A capture cut short, by a crash of
+                 the process writing it, is read up to its last
+                 complete record.
+    """
+    with gzip.open(path, 'rb') as f:
+        while True:
+            try:
+                line = f.readline()
+            except (EOFError, IOError, zlib.error) as e:
+                log.warning('Capture %s is truncated: %s', path, e)
+                return
+
+            if not line:
+                return
+
+            if not line.endswith(b'\n'):
+                log.warning('Capture %s ends with a partial record.', path)
+                return
+
+            if line.strip():
+                yield json.loads(line.decode('utf-8'))
@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: columnar
+    :synopsis: Recipients read from columnar batches, for bulk operations.
+
+A ColumnBatch reads recipients column by column from a pandas DataFrame,
+a pyarrow Table or RecordBatch, a NumPy structured array or a dict of
+equal length sequences. Every column is converted to text, its dates
+formatted and its values escaped in one pass, then the COLUMN entries of
+each row are joined into a fragment silverpy.templates writes into the
+envelope as it is. No dict is built per row.
+
+pandas, pyarrow and NumPy are only imported by the batches holding their
+objects.
+"""
+
+import collections
+import datetime
+import itertools
+
+from .templates import escape, escape_column, string_types
+
+try:
+    long
+except NameError:  # Python 3
+    long = int
+
+# Engage's default date format.
+DATE_FORMAT = '%m/%d/%Y'
+
+# A row of a columnar bulk run, as held by BulkItem.spec. envelope is
+# None for rows missing a required email.
+Row = collections.namedtuple('Row', 'envelope list_id email')
+
+
+def _texts(values, date_format):
+    """Text of every value of a column of Python objects, None for
+    missing ones (None, NaN, NaT).
+    """
+    kinds = set(map(type, values))
+
+    # Columns of a single type, without missing values
+    if len(kinds) == 1:
+        kind = kinds.pop()
+
+        if issubclass(kind, string_types):
+            return list(values)
+
+        if kind in (int, long):
+            return list(map(str, values))
+
+        if issubclass(kind, datetime.date):
+            return [value.strftime(date_format) for value in values]
+
+    texts = []
+    append = texts.append
+
+    for value in values:
+        if value is None or value != value:
+            append(None)
+        elif isinstance(value, string_types):
+            append(value)
+        elif isinstance(value, datetime.date):
+            append(value.strftime(date_format))
+        else:
+            append(str(value))
+
+    return texts
+
+
+def _masked(texts, missing):
+    """Sets to None the texts of missing values, a boolean array."""
+    if missing.any():
+        texts = [None if m else text for text, m in zip(texts, missing)]
+
+    return texts
+
+
+class _MappingSource(object):
+    """A dict of column names to sequences."""
+    def __init__(self, data):
+        self.names = list(data)
+        self._data = data
+
+        lengths = set(len(data[name]) for name in self.names)
+        if len(lengths) > 1:
+            raise ValueError('Columns must all have the same length.')
+
+        self.length = lengths.pop() if lengths else 0
+
+    def texts(self, name, start, stop, date_format):
+        return _texts(self._data[name][start:stop], date_format)
+
+
+class _PandasSource(object):
+    """A pandas DataFrame."""
+    def __init__(self, data):
+        from pandas.api.types import is_datetime64_any_dtype
+
+        self._is_datetime = is_datetime64_any_dtype
+        self._data = data
+        self._columns = dict((str(name), name) for name in data.columns)
+        self.names = [str(name) for name in data.columns]
+        self.length = len(data)
+
+    def texts(self, name, start, stop, date_format):
+        series = self._data[self._columns[name]].iloc[start:stop]
+
+        if series.dtype == object:
+            return _texts(series.tolist(), date_format)
+
+        if self._is_datetime(series):
+            texts = series.dt.strftime(date_format)
+        else:
+            texts = series.astype(str)
+
+        return _masked(texts.tolist(), series.isna().to_numpy())
+
+
+class _ArrowSource(object):
+    """A pyarrow Table or RecordBatch."""
+    def __init__(self, data):
+        import pyarrow
+        import pyarrow.compute
+
+        self._pa = pyarrow
+        self._compute = pyarrow.compute
+        self._data = data
+        self.names = list(data.column_names)
+        self.length = data.num_rows
+
+    def texts(self, name, start, stop, date_format):
+        pa, compute = self._pa, self._compute
+        column = self._data.column(self.names.index(name)).slice(
+            start, stop - start)
+        kind = column.type
+
+        if pa.types.is_date(kind):
+            column = compute.cast(column, pa.timestamp('s'))
+            kind = column.type
+
+        if pa.types.is_timestamp(kind):
+            column = compute.strftime(column, format=date_format)
+        elif not (pa.types.is_string(kind) or pa.types.is_large_string(kind)):
+            column = compute.cast(column, pa.string())
+
+        return column.to_pylist()
+
+
+class _NumPySource(object):
+    """A NumPy structured or record array."""
+    def __init__(self, data):
+        import numpy
+
+        self._numpy = numpy
+        self._data = data
+        self.names = list(data.dtype.names)
+        self.length = len(data)
+
+    def texts(self, name, start, stop, date_format):
+        field = self._data[name][start:stop]
+        kind = field.dtype.kind
+
+        if kind == 'M':
+            # datetime objects, None for NaT
+            values = field.astype('datetime64[us]').tolist()
+            return _texts(values, date_format)
+
+        if kind == 'O':
+            return _texts(field.tolist(), date_format)
+
+        if kind == 'S':
+            return [value.decode('utf-8') for value in field.tolist()]
+
+        if kind == 'U':
+            return field.tolist()
+
+        texts = field.astype(str).tolist()
+        if kind in 'fc':
+            texts = _masked(texts, self._numpy.isnan(field))
+
+        return texts
+
+
+def _source(data):
+    module = type(data).__module__ or ''
+
+    if module.startswith('pandas'):
+        return _PandasSource(data)
+
+    if module.startswith('pyarrow'):
+        return _ArrowSource(data)
+
+    if getattr(getattr(data, 'dtype', None), 'names', None):
+        return _NumPySource(data)
+
+    if isinstance(data, dict):
+        return _MappingSource(data)
+
+    raise TypeError(
+        'Expected a DataFrame, a pyarrow Table or RecordBatch, a NumPy '
+        'structured array or a dict of columns, got %s.' % type(data))
+
+
+class ColumnBatch(object):
+    """Recipients held by columns.
+
+    Usage:
+    batch = ColumnBatch(frame, date_format='%Y-%m-%d')
+    for item in api.bulk_add_recipient_columns(list_id, created_from,
+                                               batch):
+        ...
+
+    Missing values (None, NaN, NaT) leave their COLUMN out of the row.
+    Dates are formatted with date_format, strings written as they are
+    and anything else converted to text by its library, or with str()
+    for dicts of sequences.
+
+    :params data: A pandas DataFrame, a pyarrow Table or RecordBatch, a
+                  NumPy structured array, or a dict of column names to
+                  sequences of the same length.
+    :params date_format: strftime format of date and datetime values.
+    :params email_column: Name of the email column, by default the one
+                          named EMAIL in any case.
+    :params chunk_size: Rows converted at a time, bounding the memory
+                        used by the texts and fragments of the columns.
+    """
+    def __init__(self, data, date_format=DATE_FORMAT, email_column=None,
+                 chunk_size=10000):
+        self._source = _source(data)
+        self.names = self._source.names
+        self.date_format = date_format
+        self.chunk_size = chunk_size
+
+        if email_column is None:
+            email_column = next(
+                (name for name in self.names if name.upper() == 'EMAIL'),
+                None)
+        elif email_column not in self.names:
+            raise ValueError('No column %s in the batch.' % email_column)
+
+        self.email_column = email_column
+        self._items = dict(
+            (name, (b'<COLUMN><NAME>' + escape(name) + b'</NAME><VALUE>'))
+            for name in self.names)
+
+    def __len__(self):
+        return self._source.length
+
+    def _fragments(self, name, texts):
+        """COLUMN entry of every row, empty for missing values."""
+        head = self._items[name]
+        tail = b'</VALUE></COLUMN>'
+
+        return [b'' if value is None else head + value + tail
+                for value in escape_column(texts)]
+
+    def rows(self, with_email=True):
+        """Serializes the columns of every row.
+
+        :params with_email: If False, the email column is left out of
+                            the fragments.
+        :returns: Generator of (email, fragment) tuples, the email being
+                  None if the row has none.
+        """
+        source = self._source
+        length = len(self)
+
+        for start in range(0, length, self.chunk_size):
+            stop = min(start + self.chunk_size, length)
+            emails = itertools.repeat(None, stop - start)
+            columns = []
+
+            for name in self.names:
+                texts = source.texts(name, start, stop, self.date_format)
+
+                if name == self.email_column:
+                    emails = texts
+                    if not with_email:
+                        continue
+
+                columns.append(self._fragments(name, texts))
+
+            if columns:
+                fragments = [b''.join(cells) for cells in zip(*columns)]
+            else:
+                fragments = itertools.repeat(b'', stop - start)
+
+            for email, fragment in zip(emails, fragments):
+                yield email, fragment
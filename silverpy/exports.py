@@ -0,0 +1,324 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: exports
+    :synopsis: Background job polling and streamed ExportList results.
+
+ExportList only starts a job; Engage writes the file to the FTP download
+folder once the job completes. JobManager polls any number of jobs from a
+single thread and ExportManager turns finished exports into row iterators
+read straight from the downloaded file.
+"""
+
+import csv
+import heapq
+import io
+import itertools
+import logging
+import os
+import sys
+import threading
+import time
+from concurrent import futures
+
+from .api import JOB_COMPLETE, JOB_FINISHED, SilverpopError
+
+log = logging.getLogger(__name__)
+
+EXPORT_ALL = 'ALL'
+EXPORT_OPT_IN = 'OPT_IN'
+EXPORT_OPT_OUT = 'OPT_OUT'
+EXPORT_UNDELIVERABLE = 'UNDELIVERABLE'
+
+
+class JobManager(object):
+    """Polls GetJobStatus for many background jobs from one thread.
+
+    Each job is polled every interval seconds at first, waiting backoff
+    times longer after every poll up to max_interval.
+
+    :params api: A logged-in API instance.
+    """
+    def __init__(self, api, interval=2.0, max_interval=60.0, backoff=1.5,
+                 clock=time.time):
+        self._api = api
+        self.interval = interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self._clock = clock
+
+        self._heap = []
+        self._counter = itertools.count()
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread = None
+
+    def watch(self, job_id):
+        """Starts polling a job.
+
+        :returns: A concurrent.futures.Future resolving to the final job
+                  status (JOB_COMPLETE, JOB_ERROR or JOB_CANCELED).
+        """
+        future = futures.Future()
+
+        with self._cond:
+            if self._stopped:
+                raise RuntimeError('JobManager is closed.')
+
+            self._push(self._clock(), job_id, self.interval, future)
+
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name='silverpy-jobs')
+                self._thread.daemon = True
+                self._thread.start()
+
+            self._cond.notify()
+
+        return future
+
+    def close(self):
+        """Stops polling. Futures of unfinished jobs are cancelled."""
+        with self._cond:
+            self._stopped = True
+            pending, self._heap = self._heap, []
+            self._cond.notify()
+
+        for _, _, job_id, _, future in pending:
+            future.cancel()
+
+        if self._thread is not None:
+            self._thread.join()
+
+    def _push(self, when, job_id, interval, future):
+        heapq.heappush(
+            self._heap, (when, next(self._counter), job_id, interval, future))
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopped:
+                    if not self._heap:
+                        self._cond.wait()
+                        continue
+
+                    delay = self._heap[0][0] - self._clock()
+                    if delay <= 0:
+                        break
+                    self._cond.wait(delay)
+
+                if self._stopped:
+                    return
+
+                _, _, job_id, interval, future = heapq.heappop(self._heap)
+
+            try:
+                self._poll(job_id, interval, future)
+            except Exception as e:
+                # E.g. the future was cancelled meanwhile, the other jobs
+                # are still polled
+                log.error('Watching job %s failed: %s', job_id, e)
+
+    def _poll(self, job_id, interval, future):
+        if future.cancelled():
+            log.debug('Job %s no longer watched.', job_id)
+            return
+
+        try:
+            success, status, error = self._api.get_job_status(job_id)
+        except Exception as e:
+            # Network trouble, try again later
+            log.warning('Polling job %s failed: %s', job_id, e)
+            status = error = None
+
+        if error:
+            future.set_exception(SilverpopError(
+                'Error code %s: %s' % (error[0], error[1])))
+            return
+
+        if status in JOB_FINISHED:
+            log.debug('Job %s finished: %s', job_id, status)
+            future.set_result(status)
+            return
+
+        interval = min(self.max_interval, interval * self.backoff)
+
+        with self._cond:
+            if not self._stopped:
+                self._push(self._clock() + interval, job_id, interval, future)
+                return
+
+        future.cancel()
+
+
+class LocalDirectoryDownloader(object):
+    """Opens export files from a local directory, e.g. an FTP folder
+    mounted locally, or a scratch directory in tests.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+
+    def open(self, file_path):
+        """:returns: A binary file object."""
+        return open(
+            os.path.join(self.directory, os.path.basename(file_path)), 'rb')
+
+
+class _FTPFile(io.RawIOBase):
+    """Read only file over an FTP data connection."""
+    def __init__(self, ftp, path):
+        self._ftp = ftp
+        self._conn = ftp.transfercmd('RETR %s' % path)
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self._conn.recv(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            try:
+                self._conn.close()
+                self._ftp.voidresp()
+            finally:
+                self._ftp.close()
+
+        super(_FTPFile, self).close()
+
+
+class FTPDownloader(object):
+    """Streams export files from the Engage FTP server, by default over
+    TLS, without storing them locally.
+
+    :params host: The FTP host of your Engage pod.
+    """
+    def __init__(self, host, username, password, tls=True, timeout=60):
+        self.host = host
+        self.username = username
+        self.password = password
+        self.tls = tls
+        self.timeout = timeout
+
+    def open(self, file_path):
+        """:returns: A binary file object."""
+        import ftplib
+
+        ftp_class = ftplib.FTP_TLS if self.tls else ftplib.FTP
+        ftp = ftp_class(self.host, timeout=self.timeout)
+
+        try:
+            ftp.login(self.username, self.password)
+            if self.tls:
+                ftp.prot_p()
+            ftp.voidcmd('TYPE I')
+
+            return io.BufferedReader(_FTPFile(ftp, file_path))
+        except Exception:
+            ftp.close()
+            raise
+
+
+if sys.version_info[0] < 3:
+    def read_rows(f):
+        """Iterates over a CSV file given in binary mode, one dict per
+        row, keyed by the header line.
+        """
+        reader = csv.reader(f)
+        header = [name.decode('utf-8-sig') for name in next(reader)]
+
+        for row in reader:
+            yield dict(zip(header, [value.decode('utf-8') for value in row]))
+else:
+    def read_rows(f):
+        """Iterates over a CSV file given in binary mode, one dict per
+        row, keyed by the header line.
+        """
+        text = io.TextIOWrapper(f, encoding='utf-8-sig', newline='')
+
+        try:
+            for row in csv.DictReader(text):
+                yield row
+        finally:
+            # Closing f is up to the caller
+            text.detach()
+
+
+class Export(object):
+    """Handle of a running export, see ExportManager.export.
+
+    :ivar job_id: The Engage job ID.
+    :ivar file_path: Where Engage writes the file.
+    :ivar future: Resolves to the final job status.
+    """
+    def __init__(self, job_id, file_path, future, downloader):
+        self.job_id = job_id
+        self.file_path = file_path
+        self.future = future
+        self._downloader = downloader
+
+    def done(self):
+        return self.future.done()
+
+    def rows(self, timeout=None):
+        """Waits for the job and streams the exported rows.
+
+        :params timeout: Seconds to wait for the job.
+        :returns: Generator of dicts keyed by column name.
+        """
+        status = self.future.result(timeout)
+
+        if status != JOB_COMPLETE:
+            raise SilverpopError('Export job %s ended with status %s.' % (
+                self.job_id, status))
+
+        f = self._downloader.open(self.file_path)
+        try:
+            for row in read_rows(f):
+                yield row
+        finally:
+            f.close()
+
+
+class ExportManager(object):
+    """Runs any number of ExportList jobs at once.
+
+    Usage:
+    manager = ExportManager(api, FTPDownloader(host, 'user', 'passwd'))
+    export = manager.export(123, columns=['EMAIL'])
+    for row in export.rows():
+        ...
+    manager.close()
+
+    :params api: A logged-in API instance.
+    :params downloader: Object with an open(file_path) method returning a
+                        binary file, e.g. FTPDownloader.
+    :params jobs: JobManager to poll with. One is created if not given.
+    """
+    def __init__(self, api, downloader, jobs=None):
+        self._api = api
+        self._downloader = downloader
+        self._jobs = jobs or JobManager(api)
+
+    def export(self, list_id, export_type=EXPORT_ALL, columns=None,
+               date_start=None, date_end=None):
+        """Starts an export of a database or contact list.
+
+        See API.export_list for the parameters.
+
+        :returns: An Export object.
+        """
+        success, job_id, file_path, error = self._api.export_list(
+            list_id, export_type, columns=columns, date_start=date_start,
+            date_end=date_end)
+
+        if error:
+            raise SilverpopError('Error code %s: %s' % (error[0], error[1]))
+
+        return Export(
+            job_id, file_path, self._jobs.watch(job_id), self._downloader)
+
+    def close(self):
+        """Stops polling jobs."""
+        self._jobs.close()
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: imports
+    :synopsis: Files and uploaders for Engage ImportList jobs.
+
+An ImportList job reads a CSV source file and an XML mapping file from the
+Engage FTP upload folder. The functions here write both files in constant
+memory and the uploaders put them where Engage can read them.
+See API.bulk_import.
+"""
+
+import csv
+import logging
+import os
+import shutil
+import sys
+
+from . import backends
+
+log = logging.getLogger(__name__)
+
+IMPORT_CREATE = 'CREATE'
+IMPORT_ADD_ONLY = 'ADD_ONLY'
+IMPORT_UPDATE_ONLY = 'UPDATE_ONLY'
+IMPORT_ADD_AND_UPDATE = 'ADD_AND_UPDATE'
+IMPORT_OPT_OUT = 'OPT_OUT'
+
+IMPORT_ACTIONS = (
+    IMPORT_CREATE,
+    IMPORT_ADD_ONLY,
+    IMPORT_UPDATE_ONLY,
+    IMPORT_ADD_AND_UPDATE,
+    IMPORT_OPT_OUT,
+)
+
+FILE_TYPE_CSV = 0
+
+if sys.version_info[0] < 3:
+    def _open_csv(path, mode):
+        return open(path, mode + 'b')
+
+    def _cell(value):
+        if value is None:
+            return ''
+
+        if isinstance(value, unicode):  # noqa: F821
+            return value.encode('utf-8')
+
+        return str(value)
+else:
+    def _open_csv(path, mode):
+        return open(path, mode, newline='', encoding='utf-8')
+
+    def _cell(value):
+        return '' if value is None else str(value)
+
+
+def write_csv(path, rows, columns):
+    """Streams rows into a CSV file with a header line.
+
+    :params path: File to be written.
+    :params rows: Iterable of dicts, as the columns param of
+                  API.add_recipient, or of sequences in columns order.
+    :params columns: Column names, in file order.
+    :returns: Number of rows written.
+    """
+    count = 0
+
+    with _open_csv(path, 'w') as f:
+        writer = csv.writer(f)
+        writer.writerow([_cell(name) for name in columns])
+
+        for row in rows:
+            if isinstance(row, dict):
+                row = [row.get(name) for name in columns]
+            elif len(row) != len(columns):
+                raise ValueError(
+                    'Row %d has %d values, expected %d.' % (
+                        count, len(row), len(columns)))
+
+            writer.writerow([_cell(value) for value in row])
+            count += 1
+
+    return count
+
+
+def build_mapping(list_id, columns, sync_fields=None,
+                  action=IMPORT_ADD_AND_UPDATE, backend=None):
+    """Generates the mapping file of an ImportList job.
+
+    :params list_id: The database ID on Silverpop.
+    :params columns: Column names, in CSV file order.
+    :params sync_fields: Names of the columns used to match existing
+                         contacts. A dict, as accepted by
+                         API.add_recipient, is also fine: only its keys
+                         are used.
+    :params action: One of the IMPORT_* constants.
+    :params backend: The silverpy.backends backend building the tree.
+                     Defaults to the default backend.
+    :returns: The LIST_IMPORT root element.
+    """
+    xml = backend or backends.get_backend()
+
+    if action not in IMPORT_ACTIONS:
+        raise ValueError('action must be one of %s' % ', '.join(
+            IMPORT_ACTIONS))
+
+    root = xml.Element('LIST_IMPORT')
+
+    info = xml.SubElement(root, 'LIST_INFO')
+    xml.SubElement(info, 'ACTION').text = action
+    xml.SubElement(info, 'LIST_ID').text = str(list_id)
+    xml.SubElement(info, 'FILE_TYPE').text = str(FILE_TYPE_CSV)
+    xml.SubElement(info, 'HASHEADERS').text = 'true'
+
+    if sync_fields:
+        unknown = [name for name in sync_fields if name not in columns]
+        if unknown:
+            raise ValueError(
+                'Sync fields not in columns: %s' % ', '.join(unknown))
+
+        sync_root = xml.SubElement(root, 'SYNC_FIELDS')
+        for name in sync_fields:
+            sync_field = xml.SubElement(sync_root, 'SYNC_FIELD')
+            xml.SubElement(sync_field, 'NAME').text = name
+
+    mapping = xml.SubElement(root, 'MAPPING')
+    for index, name in enumerate(columns, 1):
+        column = xml.SubElement(mapping, 'COLUMN')
+        xml.SubElement(column, 'INDEX').text = str(index)
+        xml.SubElement(column, 'NAME').text = name
+        xml.SubElement(column, 'INCLUDE').text = 'true'
+
+    return root
+
+
+def write_mapping(path, list_id, columns, sync_fields=None,
+                  action=IMPORT_ADD_AND_UPDATE, backend=None):
+    """Writes the mapping file of an ImportList job to path.
+    See build_mapping.
+    """
+    xml = backend or backends.get_backend()
+    root = build_mapping(list_id, columns, sync_fields, action, xml)
+
+    with open(path, 'wb') as f:
+        f.write(b"<?xml version='1.0' encoding='UTF-8'?>\n")
+        f.write(xml.tostring(root))
+
+
+class LocalDirectoryUploader(object):
+    """Copies files into a local directory, e.g. an FTP folder mounted
+    locally, or a scratch directory in tests.
+    """
+    def __init__(self, directory):
+        self.directory = directory
+
+    def upload(self, local_path, name):
+        """Copies local_path into the directory as name."""
+        shutil.copyfile(local_path, os.path.join(self.directory, name))
+
+
+class FTPUploader(object):
+    """Uploads files to the Engage FTP server, by default over TLS.
+
+    :params host: The FTP host of your Engage pod.
+    :params directory: Folder Engage imports from.
+    """
+    def __init__(self, host, username, password, directory='upload',
+                 tls=True, timeout=60):
+        self.host = host
+        self.username = username
+        self.password = password
+        self.directory = directory
+        self.tls = tls
+        self.timeout = timeout
+
+    def upload(self, local_path, name):
+        """Stores local_path in the upload folder as name."""
+        import ftplib
+
+        ftp_class = ftplib.FTP_TLS if self.tls else ftplib.FTP
+        ftp = ftp_class(self.host, timeout=self.timeout)
+
+        try:
+            ftp.login(self.username, self.password)
+            if self.tls:
+                ftp.prot_p()
+            ftp.cwd(self.directory)
+
+            with open(local_path, 'rb') as f:
+                ftp.storbinary('STOR %s' % name, f)
+        finally:
+            ftp.close()
+
+        log.debug('Uploaded %s to %s/%s', local_path, self.host, name)
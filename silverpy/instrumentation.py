@@ -0,0 +1,290 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: instrumentation
+    :synopsis: Per-call timing events, metrics and slow-call logging.
+
+API given an Instrumentation emits a CallEvent for every Engage call,
+with the time spent building the envelope, serializing it, waiting on
+the HTTP post and parsing the response. Listeners receive the events;
+Metrics aggregates them into counters and latency histograms. Login and
+Logout requests have events of their own, including the Logins renewing
+an expired session in the middle of another call.
+
+Without one, the only cost is a None check per call and request.
+"""
+
+import bisect
+import collections
+import logging
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+PHASES = ('build', 'serialize', 'request', 'parse')
+
+# Upper bounds of the latency histogram buckets, in milliseconds.
+BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000,
+              30000)
+
+try:
+    now_ns = time.perf_counter_ns
+except AttributeError:  # Before Python 3.7
+    _timer = getattr(time, 'perf_counter', time.time)
+
+    def now_ns():
+        return int(_timer() * 1e9)
+
+
+class CallEvent(object):
+    """Timing and outcome of one API call.
+
+    :ivar action: The Engage action, e.g. AddRecipient.
+    :ivar phases: Nanoseconds spent per phase, see PHASES. A call
+                  retried or replayed after a session renewal adds up
+                  the time of every request. Streamed envelopes are
+                  serialized while they are sent; the time spent
+                  producing their chunks counts as serialize, not
+                  request.
+    :ivar duration_ns: Nanoseconds from the call to its result, waits of
+                       the scheduler included.
+    :ivar requests: Number of HTTP requests made.
+    :ivar bytes_sent: Request bytes.
+    :ivar bytes_received: Response bytes.
+    :ivar success: Boolean indicating whether the call succeeded.
+    :ivar fault_code: Engage errorid of a failed call.
+    :ivar error: Exception raised by the call, if any.
+    """
+    __slots__ = ('action', 'phases', 'duration_ns', 'requests', 'bytes_sent',
+                 'bytes_received', 'success', 'fault_code', 'error',
+                 '_started', '_outer')
+
+    def __init__(self, action, started, build_ns=0):
+        self.action = action
+        self.phases = dict.fromkeys(PHASES, 0)
+        self.phases['build'] = build_ns
+        self.duration_ns = 0
+        self.requests = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.success = False
+        self.fault_code = None
+        self.error = None
+        self._started = started - build_ns
+        self._outer = None
+
+    def add(self, phase, ns):
+        self.phases[phase] += ns
+
+    def __repr__(self):
+        return '<CallEvent %s %.1f ms success=%r>' % (
+            self.action, self.duration_ns / 1e6, self.success)
+
+
+class _Counted(object):
+    """Iterates a streamed body, counting its bytes and the time spent
+    serializing its chunks.
+    """
+    def __init__(self, body, event):
+        self._body = body
+        self._event = event
+
+    def __iter__(self):
+        event = self._event
+        chunks = iter(self._body)
+
+        while True:
+            started = now_ns()
+            try:
+                chunk = next(chunks)
+            except StopIteration:
+                return
+            finally:
+                event.add('serialize', now_ns() - started)
+
+            event.bytes_sent += len(chunk)
+            yield chunk
+
+
+class Instrumentation(object):
+    """Emits a CallEvent per API call to every listener.
+
+    Usage:
+    metrics = Metrics()
+    api = API('user', 'passwd', 'silverpop_url',
+              instrumentation=Instrumentation([metrics],
+                                              slow_call_threshold=2.0))
+
+    :params listeners: Callables receiving every CallEvent, from the
+                       thread that made the call. Exceptions they raise
+                       are logged and ignored.
+    :params slow_call_threshold: Seconds after which a call is logged
+                                 as a warning, with its phases.
+    """
+    def __init__(self, listeners=(), slow_call_threshold=None):
+        self.listeners = list(listeners)
+        self.slow_call_threshold = slow_call_threshold
+        self._local = threading.local()
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def enter(self):
+        """Marks the start of a public API method, before its envelope
+        is built.
+        """
+        self._local.entered = now_ns()
+
+    def leave(self):
+        """Marks the end of a public API method, whose call, if it made
+        one, already took the mark of enter.
+        """
+        self._local.entered = None
+
+    def begin(self, action):
+        """Starts the event of a call about to be sent.
+
+        :returns: The CallEvent.
+        """
+        started = now_ns()
+        entered = getattr(self._local, 'entered', None)
+        self._local.entered = None
+
+        event = CallEvent(
+            action, started, started - entered if entered else 0)
+        # A Login renewing the session of a call in progress
+        event._outer = self.current()
+        self._local.event = event
+
+        return event
+
+    def current(self):
+        """:returns: The CallEvent of the call in progress in this
+                     thread, or None.
+        """
+        return getattr(self._local, 'event', None)
+
+    def end(self, event, result=None, error=None):
+        """Completes an event with the result or exception of its call
+        and hands it to the listeners.
+        """
+        self._local.event = event._outer
+        event.duration_ns = now_ns() - event._started
+
+        if result is not None:
+            event.success = result.success
+            event.fault_code = result.fault_code
+        event.error = error
+
+        threshold = self.slow_call_threshold
+        if threshold is not None and event.duration_ns > threshold * 1e9:
+            log.warning(
+                'Slow %s call: %.1f ms (%s), %d requests, %d bytes sent, '
+                '%d received.', event.action, event.duration_ns / 1e6,
+                ', '.join('%s %.1f ms' % (phase, event.phases[phase] / 1e6)
+                          for phase in PHASES),
+                event.requests, event.bytes_sent, event.bytes_received)
+
+        for listener in self.listeners:
+            try:
+                listener(event)
+            except Exception as e:
+                log.error('Instrumentation listener failed: %s', e)
+
+    def counted(self, body, event):
+        """Counts the request bytes of event, wrapping streamed bodies."""
+        if isinstance(body, bytes):
+            event.bytes_sent += len(body)
+            return body
+
+        return _Counted(body, event)
+
+
+class Histogram(object):
+    """Latency counts per BUCKETS_MS bucket, plus one for anything
+    slower.
+    """
+    __slots__ = ('counts', 'total', 'sum_ns')
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.total = 0
+        self.sum_ns = 0
+
+    def add(self, ns):
+        self.counts[bisect.bisect_left(BUCKETS_MS, ns / 1e6)] += 1
+        self.total += 1
+        self.sum_ns += ns
+
+    def percentile(self, q):
+        """:returns: Upper bound, in milliseconds, of the bucket holding
+                     the q quantile, or None if it's the overflow one.
+        """
+        rank = q * self.total
+        seen = 0
+
+        for bound, count in zip(BUCKETS_MS, self.counts):
+            seen += count
+            if count and seen >= rank:
+                return bound
+
+        return None
+
+
+class Metrics(object):
+    """Listener aggregating events into counters and histograms per
+    action and per fault code.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = collections.Counter()
+        self.failures = collections.Counter()
+        self.errors = collections.Counter()
+        # (action, fault_code) -> count
+        self.faults = collections.Counter()
+        self.bytes_sent = collections.Counter()
+        self.bytes_received = collections.Counter()
+        # (action, phase) -> nanoseconds
+        self.phase_ns = collections.Counter()
+        self.latency = collections.defaultdict(Histogram)
+
+    def __call__(self, event):
+        action = event.action
+
+        with self._lock:
+            self.calls[action] += 1
+            self.bytes_sent[action] += event.bytes_sent
+            self.bytes_received[action] += event.bytes_received
+            self.latency[action].add(event.duration_ns)
+
+            for phase, ns in event.phases.items():
+                self.phase_ns[(action, phase)] += ns
+
+            if event.error is not None:
+                self.errors[action] += 1
+            elif not event.success:
+                self.failures[action] += 1
+                self.faults[(action, event.fault_code)] += 1
+
+    def snapshot(self):
+        """:returns: A dict per action of its counters, phase totals and
+                     latency histogram, for exporting.
+        """
+        with self._lock:
+            return dict((action, {
+                'calls': self.calls[action],
+                'failures': self.failures[action],
+                'errors': self.errors[action],
+                'faults': dict(
+                    (code, count)
+                    for (name, code), count in self.faults.items()
+                    if name == action),
+                'bytes_sent': self.bytes_sent[action],
+                'bytes_received': self.bytes_received[action],
+                'phase_ns': dict(
+                    (phase, self.phase_ns[(action, phase)])
+                    for phase in PHASES),
+                'latency_buckets_ms': list(BUCKETS_MS),
+                'latency_counts': list(self.latency[action].counts),
+                'latency_sum_ns': self.latency[action].sum_ns,
+            }) for action in self.calls)
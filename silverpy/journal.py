@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: journal
+    :synopsis: SQLite journal making bulk runs resumable.
+
+A Journal records every operation of a bulk run and its outcome in a
+SQLite database in WAL mode. Given the same journal again, a bulk run
+skips what already finished, and API.bulk_replay resends only the
+operations that failed. See API.bulk_add_recipients.
+"""
+
+import json
+import logging
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+PENDING = 'pending'
+DONE = 'done'
+FAILED = 'failed'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job TEXT PRIMARY KEY,
+    method TEXT NOT NULL,
+    created REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS operations (
+    job TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    spec TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    recipient_id TEXT,
+    fault_code TEXT,
+    fault_message TEXT,
+    updated REAL,
+    PRIMARY KEY (job, idx)
+);
+CREATE INDEX IF NOT EXISTS operations_status ON operations (job, status);
+"""
+
+
+class Journal(object):
+    """Durable record of one bulk job.
+
+    Outcomes are committed in batches, every commit_every operations or
+    commit_interval seconds, whichever comes first. After a crash, the
+    operations of the last uncommitted batch are sent again, so delivery
+    is at least once.
+
+    Specs must be JSON serializable: dicts of keyword arguments or tuples
+    of positional arguments, as given to the bulk methods.
+
+    :params path: The database file, created if needed.
+    :params job: Name of the job, several jobs can share a file.
+    """
+    def __init__(self, path, job='default', commit_every=1000,
+                 commit_interval=1.0, clock=time.time):
+        self.path = path
+        self.job = job
+        self.commit_every = commit_every
+        self.commit_interval = commit_interval
+        self._clock = clock
+
+        # Bulk runs use the journal from the consuming thread only, the
+        # lock covers callers sharing it anyway.
+        self._lock = threading.Lock()
+        import sqlite3
+
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript(_SCHEMA)
+
+        self._uncommitted = 0
+        self._last_commit = clock()
+
+    @property
+    def method(self):
+        """Name of the API method the job runs, None for a new job."""
+        row = self._db.execute(
+            'SELECT method FROM jobs WHERE job = ?', (self.job,)).fetchone()
+
+        return row[0] if row else None
+
+    def begin(self, method):
+        """Registers the job, or checks an existing one runs the same
+        method.
+
+        :params method: Name of the API method, e.g. 'add_recipient'.
+        :returns: Set of the indexes that already finished.
+        """
+        with self._lock:
+            existing = self.method
+            if existing is None:
+                with self._db:
+                    self._db.execute(
+                        'INSERT INTO jobs (job, method, created) '
+                        'VALUES (?, ?, ?)', (self.job, method, self._clock()))
+            elif existing != method:
+                raise ValueError('Job %s runs %s, not %s.' % (
+                    self.job, existing, method))
+
+            rows = self._db.execute(
+                'SELECT idx FROM operations WHERE job = ? AND status != ?',
+                (self.job, PENDING))
+
+            return set(row[0] for row in rows)
+
+    def started(self, index, spec):
+        """Records an operation as sent."""
+        with self._lock:
+            self._db.execute(
+                'INSERT OR IGNORE INTO operations (job, idx, spec, status) '
+                'VALUES (?, ?, ?, ?)',
+                (self.job, index, json.dumps(spec), PENDING))
+            self._db.execute(
+                'UPDATE operations SET status = ?, attempts = attempts + 1, '
+                'updated = ? WHERE job = ? AND idx = ?',
+                (PENDING, self._clock(), self.job, index))
+
+    def record(self, item):
+        """Records the outcome of a BulkItem."""
+        recipient_id = fault_code = fault_message = None
+
+        if item.success:
+            status = DONE
+            # Only add_recipient returns (success, recipient_id, error)
+            if len(item.value) == 3:
+                recipient_id = item.value[1]
+        else:
+            status = FAILED
+            if isinstance(item.error, tuple):
+                fault_code, fault_message = item.error
+            else:
+                fault_message = '%s: %s' % (
+                    type(item.error).__name__, item.error)
+
+        with self._lock:
+            self._db.execute(
+                'UPDATE operations SET status = ?, recipient_id = ?, '
+                'fault_code = ?, fault_message = ?, updated = ? '
+                'WHERE job = ? AND idx = ?',
+                (status, recipient_id, fault_code, fault_message,
+                 self._clock(), self.job, item.index))
+
+            self._uncommitted += 1
+            if self._uncommitted >= self.commit_every \
+                    or self._clock() - self._last_commit \
+                    >= self.commit_interval:
+                self._commit()
+
+    def commit(self):
+        """Makes every recorded outcome durable."""
+        with self._lock:
+            self._commit()
+
+    def _commit(self):
+        self._db.commit()
+        self._uncommitted = 0
+        self._last_commit = self._clock()
+
+    def failed(self):
+        """:returns: List of (index, spec) of the failed operations."""
+        rows = self._db.execute(
+            'SELECT idx, spec FROM operations WHERE job = ? AND status = ? '
+            'ORDER BY idx', (self.job, FAILED))
+
+        return [(index, _load_spec(spec)) for index, spec in rows]
+
+    def outcome(self, index):
+        """:returns: Tuple (status, recipient_id, error_tuple) of an
+                     operation, None if it was never sent.
+        """
+        row = self._db.execute(
+            'SELECT status, recipient_id, fault_code, fault_message '
+            'FROM operations WHERE job = ? AND idx = ?',
+            (self.job, index)).fetchone()
+
+        if row is None:
+            return None
+
+        status, recipient_id, fault_code, fault_message = row
+        error = (fault_code, fault_message) if status == FAILED else None
+
+        return (status, recipient_id, error)
+
+    def counts(self):
+        """:returns: Dict of the number of operations per status."""
+        rows = self._db.execute(
+            'SELECT status, COUNT(*) FROM operations WHERE job = ? '
+            'GROUP BY status', (self.job,))
+
+        return dict(rows)
+
+    def close(self):
+        self.commit()
+        self._db.close()
+
+
+def _load_spec(spec):
+    spec = json.loads(spec)
+
+    # Positional arguments come back as a JSON array
+    return spec if isinstance(spec, dict) else tuple(spec)
@@ -0,0 +1,316 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: metadata
+    :synopsis: In memory index of databases, lists and mailing templates.
+
+Metadata fetches GetLists and GetMailingTemplates once, indexes the
+results by name and ID and refreshes them in the background every ttl
+seconds. With a path, the index is also saved to a file that other
+processes load at startup instead of calling Engage.
+"""
+
+import collections
+import json
+import logging
+import os
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+LIST_TYPE_DATABASE = '0'
+LIST_TYPE_QUERY = '1'
+LIST_TYPE_CONTACT_LIST = '18'
+
+# LIST_TYPE values accepted by GetLists.
+GET_LISTS_DATABASES_AND_QUERIES = 2
+GET_LISTS_CONTACT_LISTS = 18
+
+VISIBILITY_PRIVATE = 0
+VISIBILITY_SHARED = 1
+
+ListInfo = collections.namedtuple(
+    'ListInfo', 'id name type visibility parent_name')
+
+TemplateInfo = collections.namedtuple(
+    'TemplateInfo', 'id name subject visibility')
+
+_replace = getattr(os, 'replace', os.rename)
+
+
+class _Index(object):
+    """Lists and templates of one fetch, never modified once built
+    except to record lists created since, see Metadata._install.
+    """
+    def __init__(self, lists, templates, loaded):
+        self.loaded = loaded
+        self.lists = {}
+        self.list_names = {}
+        # Contact lists by parent database name and name
+        self.contact_lists = {}
+        self.templates = {}
+
+        for info in lists:
+            self.add_list(info)
+
+        for info in templates:
+            # First one wins if private and shared templates share a name
+            self.templates.setdefault(info.name, info)
+
+    def add_list(self, info):
+        self.lists[info.id] = info
+        self.list_names.setdefault((info.type, info.name), info)
+
+        if info.type == LIST_TYPE_CONTACT_LIST:
+            self.contact_lists.setdefault((info.parent_name, info.name), info)
+
+
+class Metadata(object):
+    """Index of an org's databases, queries, contact lists and mailing
+    templates, see API.metadata.
+
+    The first lookup fetches everything. After that the index is
+    refreshed in the background every ttl seconds, or on the first
+    lookup after ttl seconds if background is False. Lookups never wait
+    on a refresh once the index is loaded.
+
+    :params api: A logged-in API instance.
+    :params ttl: Seconds an index stays fresh.
+    :params path: File to share the index with other processes.
+    :params visibilities: Folders to fetch, VISIBILITY_* constants.
+    """
+    def __init__(self, api, ttl=300.0, path=None, background=True,
+                 visibilities=(VISIBILITY_PRIVATE, VISIBILITY_SHARED),
+                 clock=time.time):
+        self._api = api
+        self.ttl = ttl
+        self.path = path
+        self.background = background
+        self.visibilities = visibilities
+        self._clock = clock
+
+        self._index = None
+        self._load_lock = threading.Lock()
+        self._create_lock = threading.Lock()
+        # Lists created by get_or_create_contact_list, by ID, kept in
+        # every index installed since as its fetch may predate them
+        self._created = {}
+        self._created_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def refresh(self):
+        """Fetches everything from Engage now."""
+        lists = []
+        templates = []
+
+        for visibility in self.visibilities:
+            for list_type in (GET_LISTS_DATABASES_AND_QUERIES,
+                              GET_LISTS_CONTACT_LISTS):
+                lists.extend(self._fetch(
+                    self._api.get_lists, visibility, list_type))
+
+            templates.extend(self._fetch(
+                self._api.get_mailing_templates, visibility))
+
+        self._install(_Index(
+            [_list_info(record) for record in lists],
+            [_template_info(record) for record in templates],
+            self._clock()))
+
+        log.info('Metadata loaded: %d lists, %d templates.',
+                 len(self._index.lists), len(self._index.templates))
+
+        if self.path:
+            self._save()
+
+    def _fetch(self, method, *args):
+        success, records, error = method(*args)
+
+        if error:
+            self._api._error(error)
+
+        return records
+
+    def _save(self):
+        index = self._index
+        data = {
+            'loaded': index.loaded,
+            'lists': [info._asdict() for info in index.lists.values()],
+            'templates': [
+                info._asdict() for info in index.templates.values()],
+        }
+
+        tmp = '%s.%d.tmp' % (self.path, os.getpid())
+        with open(tmp, 'w') as f:
+            json.dump(data, f)
+        _replace(tmp, self.path)
+
+    def _load(self):
+        """Reads the index saved by another process, if still fresh."""
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (IOError, OSError, ValueError):
+            return False
+
+        if data['loaded'] + self.ttl <= self._clock():
+            return False
+
+        self._install(_Index(
+            [ListInfo(**record) for record in data['lists']],
+            [TemplateInfo(**record) for record in data['templates']],
+            data['loaded']))
+
+        return True
+
+    def _install(self, index):
+        """Makes index the current one, with the lists created since."""
+        with self._created_lock:
+            for info in self._created.values():
+                if info.id not in index.lists:
+                    index.add_list(info)
+
+            self._index = index
+
+    def _add_created(self, info):
+        with self._created_lock:
+            self._created[info.id] = info
+            self._index.add_list(info)
+
+    def _get_index(self):
+        index = self._index
+
+        if index is not None and (
+                self.background or index.loaded + self.ttl > self._clock()):
+            return index
+
+        with self._load_lock:
+            # Unless another thread loaded it meanwhile
+            if self._index is index:
+                if not (self.path and self._load()):
+                    self.refresh()
+
+                if self.background and self._thread is None:
+                    self._thread = threading.Thread(
+                        target=self._run, name='silverpy-metadata')
+                    self._thread.daemon = True
+                    self._thread.start()
+
+        return self._index
+
+    def _run(self):
+        attempted = self._index.loaded
+        interval = self.ttl
+
+        while True:
+            # From the last attempt, so failures back off too
+            delay = max(attempted, self._index.loaded) + interval \
+                - self._clock()
+
+            if self._stopped.wait(max(delay, 0)):
+                return
+
+            attempted = self._clock()
+
+            try:
+                self.refresh()
+                interval = self.ttl
+            except Exception as e:
+                # Keep serving the previous index
+                log.warning('Metadata refresh failed: %s', e)
+                interval = min(self.ttl, 60)
+
+    def close(self):
+        """Stops refreshing in the background."""
+        self._stopped.set()
+
+        if self._thread is not None:
+            self._thread.join()
+
+    def list(self, list_id):
+        """:returns: ListInfo of a database, query or contact list ID,
+                     or None.
+        """
+        return self._get_index().lists.get(str(list_id))
+
+    def database(self, name):
+        """:returns: ListInfo of the database named name, or None."""
+        return self._get_index().list_names.get((LIST_TYPE_DATABASE, name))
+
+    def query(self, name):
+        """:returns: ListInfo of the query named name, or None."""
+        return self._get_index().list_names.get((LIST_TYPE_QUERY, name))
+
+    def contact_list(self, name, database_id=None):
+        """:params database_id: Only look in the contact lists of this
+                                database.
+        :returns: ListInfo of the contact list named name, or None.
+        """
+        if database_id is None:
+            return self._get_index().list_names.get(
+                (LIST_TYPE_CONTACT_LIST, name))
+
+        return self._get_index().contact_lists.get(
+            (self._database_name(database_id), name))
+
+    def _database_name(self, database_id):
+        info = self.list(database_id)
+
+        if info is None or info.type != LIST_TYPE_DATABASE:
+            raise KeyError('No database with ID %r.' % database_id)
+
+        return info.name
+
+    def template(self, name):
+        """:returns: TemplateInfo of the mailing template named name,
+                     or None.
+        """
+        return self._get_index().templates.get(name)
+
+    def template_id(self, name):
+        """:returns: ID of the mailing template named name."""
+        info = self.template(name)
+
+        if info is None:
+            raise KeyError('No mailing template named %r.' % name)
+
+        return info.id
+
+    def get_or_create_contact_list(self, database_id, name, visibility=0):
+        """Returns the contact list named name of a database, creating it
+        if it doesn't exist. Concurrent calls create it only once.
+
+        Contact lists are matched to their database by its name, the
+        PARENT_NAME GetLists gives, so the database must be indexed.
+
+        :returns: Tuple (bool_success, contact_list_id, error_info)
+        """
+        info = self.contact_list(name, database_id)
+        if info is not None:
+            return (True, info.id, None)
+
+        with self._create_lock:
+            info = self.contact_list(name, database_id)
+            if info is not None:
+                return (True, info.id, None)
+
+            success, contact_list_id, error = self._api.create_contact_list(
+                database_id, name, visibility)
+
+            if success:
+                self._add_created(ListInfo(
+                    contact_list_id, name, LIST_TYPE_CONTACT_LIST,
+                    str(visibility), self._database_name(database_id)))
+
+            return (success, contact_list_id, error)
+
+
+def _list_info(record):
+    return ListInfo(record.get('ID'), record.get('NAME'), record.get('TYPE'),
+                    record.get('VISIBILITY'), record.get('PARENT_NAME'))
+
+
+def _template_info(record):
+    return TemplateInfo(record.get('MAILING_ID'), record.get('MAILING_NAME'),
+                        record.get('SUBJECT'), record.get('VISIBILITY'))
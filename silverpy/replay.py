@@ -0,0 +1,259 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: replay
+    :synopsis: Replays a traffic capture against a local stand-in.
+
+Posts the envelopes of a silverpy.capture.Capture with the same spacing
+as when they were captured, divided by a speed factor, through a pool
+of threads and sessions. Reports throughput, latency percentiles per
+action next to the captured ones, and how late calls started compared
+to the schedule, which grows when the pool is too small for the load.
+
+Login and Logout requests are not replayed; the replaying client logs
+in its own sessions.
+
+Usage: python -m silverpy.replay CAPTURE [--speed N] [--concurrency N] ...
+"""
+
+from __future__ import print_function
+
+import argparse
+import collections
+import json
+import logging
+import multiprocessing
+import sys
+import threading
+import time
+from concurrent import futures
+
+from .api import API
+from .bench import _percentile, _serve
+from .capture import read
+from .templates import RenderedEnvelope
+
+log = logging.getLogger(__name__)
+
+_timer = getattr(time, 'perf_counter', time.time)
+
+_SKIPPED = ('Login', 'Logout')
+
+
+def load(path):
+    """:returns: The replayable records of a capture."""
+    records = []
+    omitted = 0
+
+    for record in read(path):
+        if record.get('body_omitted'):
+            omitted += 1
+            continue
+
+        if 'body' not in record:
+            raise ValueError('%s was captured without bodies.' % path)
+
+        if record['action'] in _SKIPPED:
+            continue
+
+        records.append(record)
+
+    if omitted:
+        log.warning('Skipping %d records captured without their envelope.',
+                    omitted)
+
+    # Written as responses arrive, so concurrent calls are out of order
+    records.sort(key=lambda record: record['ts'])
+
+    return records
+
+
+def _summary(samples):
+    samples = sorted(samples)
+
+    return {
+        'p50_ms': _percentile(samples, 0.5) * 1000,
+        'p90_ms': _percentile(samples, 0.9) * 1000,
+        'p99_ms': _percentile(samples, 0.99) * 1000,
+        'max_ms': samples[-1] * 1000,
+    }
+
+
+def replay(records, url, speed=1.0, concurrency=8, sessions=1):
+    """Posts the envelopes of records to url.
+
+    :params speed: Factor the captured pace is sped up by. 0 sends
+                   every record as soon as a thread is free.
+    :params concurrency: Threads sending the records.
+    :params sessions: Engage sessions they share.
+    :returns: Dict of the overall results, with an actions dict of the
+              results per action.
+    """
+    if not records:
+        raise ValueError('Nothing to replay.')
+
+    api = API('replay', 'replay', url, sessions=sessions,
+              pool_maxsize=concurrency)
+    api.login()
+
+    def call(record, due):
+        started = _timer()
+        envelope = RenderedEnvelope(
+            record['body'].encode('utf-8'), record['action'])
+
+        try:
+            success = api._call(envelope).success
+        except Exception:
+            success = False
+
+        return (record['action'], _timer() - started, started - due,
+                success, record['latency_ms'] / 1e3)
+
+    executor = futures.ThreadPoolExecutor(max_workers=concurrency)
+    # Submitted calls not done yet, bounded so that the executor queue
+    # doesn't grow with the capture when Engage can't keep up.
+    pending = set()
+    slots = threading.BoundedSemaphore(concurrency * 2)
+    lock = threading.Lock()
+    outcomes = []
+
+    def done(future):
+        with lock:
+            pending.discard(future)
+        slots.release()
+
+        if not future.cancelled():
+            outcomes.append(future.result())
+
+    first = records[0]['ts']
+    begin = _timer()
+
+    try:
+        for record in records:
+            due = begin
+            if speed:
+                due += (record['ts'] - first) / speed
+                delay = due - _timer()
+                if delay > 0:
+                    time.sleep(delay)
+
+            slots.acquire()
+            future = executor.submit(call, record, due)
+            with lock:
+                pending.add(future)
+            future.add_done_callback(done)
+
+        executor.shutdown(wait=True)
+        elapsed = _timer() - begin
+    finally:
+        with lock:
+            for future in list(pending):
+                future.cancel()
+        executor.shutdown(wait=True)
+        api.logout()
+        api.close()
+
+    by_action = collections.defaultdict(list)
+    for outcome in outcomes:
+        by_action[outcome[0]].append(outcome)
+
+    actions = {}
+    for action, calls in by_action.items():
+        actions[action] = dict(
+            _summary([latency for _, latency, _, _, _ in calls]),
+            calls=len(calls),
+            errors=sum(not success for _, _, _, success, _ in calls),
+            captured=_summary([captured for _, _, _, _, captured in calls]))
+
+    return dict(
+        calls=len(outcomes),
+        errors=sum(action['errors'] for action in actions.values()),
+        elapsed=elapsed,
+        captured_seconds=records[-1]['ts'] - first,
+        calls_per_sec=len(outcomes) / elapsed,
+        lag=_summary([max(lag, 0) for _, _, lag, _, _ in outcomes]),
+        actions=actions)
+
+
+def report(results, out=sys.stdout):
+    print('%d calls in %.2f s (%.2f s captured), %.1f calls/s, %d errors' % (
+        results['calls'], results['elapsed'], results['captured_seconds'],
+        results['calls_per_sec'], results['errors']), file=out)
+    print('start lag: p50 %(p50_ms).1f ms, p99 %(p99_ms).1f ms, '
+          'max %(max_ms).1f ms' % results['lag'], file=out)
+    print('%-28s %7s %7s %9s %9s %9s %9s %13s' % (
+        'action', 'calls', 'errors', 'p50 ms', 'p90 ms', 'p99 ms',
+        'max ms', 'captured p99'), file=out)
+
+    for action in sorted(results['actions']):
+        r = results['actions'][action]
+        print('%-28s %7d %7d %9.2f %9.2f %9.2f %9.2f %13.2f' % (
+            action, r['calls'], r['errors'], r['p50_ms'], r['p90_ms'],
+            r['p99_ms'], r['max_ms'], r['captured']['p99_ms']), file=out)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m silverpy.replay',
+        description='Replays a silverpy capture against a local Engage '
+                    'stand-in.')
+    parser.add_argument('capture', help='file written by a Capture')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='pace factor, 0 to send as fast as possible')
+    parser.add_argument('--concurrency', type=int, default=8,
+                        help='threads sending the calls')
+    parser.add_argument('--sessions', type=int, default=1,
+                        help='Engage sessions shared by the threads')
+    parser.add_argument('--url', default=None,
+                        help='URL of a stand-in already running, '
+                             'instead of one started for the run')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='stand-in latency, in milliseconds')
+    parser.add_argument('--jitter', type=float, default=0.0,
+                        help='random extra latency, in milliseconds')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='fraction of calls answered with a fault')
+    parser.add_argument('--throttle-rate', type=float, default=None,
+                        help='calls per second before HTTP 429s')
+    parser.add_argument('--json', action='store_true',
+                        help='print results as JSON')
+
+    return parser.parse_args(argv)
+
+
+def run(options):
+    """Replays options.capture, against a stand-in served from another
+    process unless options.url is given.
+
+    :returns: The results of replay.
+    """
+    records = load(options.capture)
+
+    if options.url:
+        return replay(records, options.url, options.speed,
+                      options.concurrency, options.sessions)
+
+    parent, child = multiprocessing.Pipe()
+    server = multiprocessing.Process(target=_serve, args=(options, child))
+    server.daemon = True
+    server.start()
+
+    try:
+        return replay(records, parent.recv(), options.speed,
+                      options.concurrency, options.sessions)
+    finally:
+        parent.send(None)
+        server.join()
+
+
+def main(argv=None):
+    options = parse_args(argv)
+    results = run(options)
+
+    if options.json:
+        print(json.dumps(results, indent=2, sort_keys=True))
+    else:
+        report(results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: scheduler
+    :synopsis: Rate limiting, retries and adaptive concurrency for API calls.
+
+A scheduler sits in API's request path: every authenticated call goes
+through Scheduler.run(), which waits for a token from a TokenBucket and a
+slot from an AIMDLimiter, classifies the outcome and retries transient
+failures with exponential backoff and jitter.
+"""
+
+import logging
+import random
+import sys
+import threading
+import time
+
+log = logging.getLogger(__name__)
+
+# HTTP statuses Engage answers with when overloaded or throttling.
+RETRYABLE_STATUSES = frozenset((429, 500, 502, 503, 504))
+THROTTLING_STATUSES = frozenset((429, 503))
+
+# Lower case fragments of the FaultString Engage sends when an org goes
+# over its API call limits.
+THROTTLING_MESSAGES = ('too many', 'throttl', 'rate limit', 'limit exceeded')
+
+
+class TokenBucket(object):
+    """Allows rate calls per second on average, with bursts of up to
+    burst calls. Callers over the limit are put to sleep.
+    """
+    def __init__(self, rate, burst=None, clock=time.time, sleep=time.sleep):
+        if rate <= 0:
+            raise ValueError('rate must be positive.')
+
+        self.rate = float(rate)
+        self.burst = float(burst or rate)
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = self.burst
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Takes a token, sleeping until one is available.
+
+        :returns: Seconds slept.
+        """
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(
+                self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # Reserve the token now so concurrent callers queue behind us
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+
+        if wait:
+            self._sleep(wait)
+
+        return wait
+
+
+class AIMDLimiter(object):
+    """Concurrency limit with additive increase, multiplicative decrease.
+
+    The limit grows by about increase per window of successful calls and
+    is multiplied by decrease when a call reports congestion (throttling,
+    overload or latency above latency_target).
+    """
+    def __init__(self, initial=4, minimum=1, maximum=64, increase=1.0,
+                 decrease=0.5, latency_target=None, clock=time.time):
+        if not 1 <= minimum <= initial <= maximum:
+            raise ValueError('Expected 1 <= minimum <= initial <= maximum.')
+
+        self.minimum = minimum
+        self.maximum = maximum
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_target = latency_target
+        self._clock = clock
+        self._limit = float(initial)
+        self._in_flight = 0
+        self._last_decrease = None
+        self._cond = threading.Condition()
+
+    @property
+    def limit(self):
+        """Current number of calls allowed in flight."""
+        return int(self._limit)
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    def acquire(self):
+        """Waits for a free slot.
+
+        :returns: Time the call started, to be given back to release().
+        """
+        with self._cond:
+            while self._in_flight >= int(self._limit):
+                self._cond.wait()
+
+            self._in_flight += 1
+
+        return self._clock()
+
+    def release(self, started, congested=False):
+        """Frees a slot and adapts the limit to how the call went.
+
+        :params started: Value returned by acquire().
+        :params congested: True if the call was throttled or failed
+                           because of overload.
+        """
+        now = self._clock()
+
+        if self.latency_target is not None:
+            congested = congested or now - started > self.latency_target
+
+        with self._cond:
+            self._in_flight -= 1
+
+            if congested:
+                # Calls started before the last decrease saw the old limit,
+                # they must not shrink it again.
+                if self._last_decrease is None \
+                        or started >= self._last_decrease:
+                    self._limit = max(
+                        self.minimum, self._limit * self.decrease)
+                    self._last_decrease = now
+                    log.info('Concurrency limit lowered to %d.', self.limit)
+            else:
+                self._limit = min(
+                    self.maximum, self._limit + self.increase / self._limit)
+
+            self._cond.notify_all()
+
+
+class Scheduler(object):
+    """Runs API calls within a rate and concurrency budget, retrying the
+    ones that failed for transient reasons.
+
+    :params rate: Calls per second allowed, None for no rate limit.
+    :params burst: Calls allowed at once above the rate. Defaults to rate.
+    :params limiter: AIMDLimiter instance, None for no concurrency limit.
+    :params max_retries: Retries after the first attempt.
+    :params backoff: Base of the exponential backoff, in seconds.
+    :params max_backoff: Upper bound of a single backoff, in seconds.
+    :params retryable_errors: Engage errorids worth retrying.
+    :params throttling_errors: Engage errorids meaning the org is over its
+                               call limit. They are retried too.
+    """
+    def __init__(self, rate=None, burst=None, limiter=None, max_retries=3,
+                 backoff=0.5, max_backoff=30.0, retryable_errors=(),
+                 throttling_errors=(), clock=time.time, sleep=time.sleep):
+        self.bucket = TokenBucket(rate, burst, clock, sleep) if rate else None
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.retryable_errors = frozenset(retryable_errors)
+        self.throttling_errors = frozenset(throttling_errors)
+        self._sleep = sleep
+
+    def is_throttled(self, result):
+        """True if a failed Result says the org is over its call limit."""
+        if result.success:
+            return False
+
+        if result.fault_code in self.throttling_errors:
+            return True
+
+        message = (result.fault_message or '').lower()
+        return any(m in message for m in THROTTLING_MESSAGES)
+
+    def is_retryable(self, result):
+        """True if a failed Result is worth another attempt."""
+        if result.success:
+            return False
+
+        return (
+            result.fault_code in self.retryable_errors
+            or self.is_throttled(result)
+        )
+
+    def classify_exception(self, exc):
+        """Tells whether a failed request is worth another attempt.
+
+        :returns: Tuple (bool_retryable, bool_congested)
+        """
+        # Not loaded means the transport isn't requests, nor its errors
+        requests = sys.modules.get('requests')
+        if requests is None:
+            return (False, False)
+
+        if isinstance(exc, requests.HTTPError) and exc.response is not None:
+            status = exc.response.status_code
+            return (status in RETRYABLE_STATUSES,
+                    status in THROTTLING_STATUSES or status >= 500)
+
+        # Connection failures almost always happen before Engage got the
+        # request, unlike read timeouts which are not repeated.
+        if isinstance(exc, requests.ConnectionError):
+            return (True, False)
+
+        if isinstance(exc, requests.Timeout):
+            return (False, True)
+
+        return (False, False)
+
+    def delay(self, attempt):
+        """Backoff before retry number attempt (0 based), full jitter."""
+        return random.uniform(
+            0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    def run(self, action, call):
+        """Runs call, a function returning a Result, within the budget.
+
+        :params action: Name of the Engage action, for logging.
+        :returns: The Result of the last attempt.
+        """
+        attempt = 0
+
+        while True:
+            if self.bucket is not None:
+                self.bucket.acquire()
+
+            started = self.limiter.acquire() if self.limiter else None
+            congested = False
+
+            try:
+                result = call()
+            except Exception as e:
+                retryable, congested = self.classify_exception(e)
+
+                if not retryable or attempt >= self.max_retries:
+                    raise
+
+                log.warning('%s failed (%s), retrying.', action, e)
+            else:
+                congested = self.is_throttled(result)
+
+                if not self.is_retryable(result) \
+                        or attempt >= self.max_retries:
+                    return result
+
+                log.warning('%s fault %s, retrying.',
+                            action, result.fault_code)
+            finally:
+                if self.limiter is not None:
+                    self.limiter.release(started, congested)
+
+            self._sleep(self.delay(attempt))
+            attempt += 1
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: sessions
+    :synopsis: Pool of logged-in Engage sessions.
+"""
+
+import logging
+import threading
+
+try:
+    import queue
+except ImportError:  # Python 2
+    import Queue as queue
+
+log = logging.getLogger(__name__)
+
+
+class SessionPool(object):
+    """Keeps up to size logged-in Engage sessions and leases each one to
+    a single request at a time, as Engage serializes work per session.
+
+    Sessions are created lazily through api._new_session() and closed
+    through api._end_session(session_id). Sessions leased when the pool
+    is closed are closed once released.
+    """
+    def __init__(self, api, size):
+        if size < 1:
+            raise ValueError('size must be positive.')
+
+        self._api = api
+        self._size = size
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._sessions = set()
+        # Sessions leased when the pool was closed
+        self._closing = set()
+        self._creating = 0
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __contains__(self, session_id):
+        with self._lock:
+            return session_id in self._sessions
+
+    def add(self, session_id):
+        """Puts an already logged-in session in the pool.
+
+        :returns: False if the pool is full and the session was not added.
+        """
+        with self._lock:
+            if len(self._sessions) + self._creating >= self._size:
+                return False
+
+            self._sessions.add(session_id)
+
+        self._idle.put(session_id)
+
+        return True
+
+    def acquire(self, timeout=None):
+        """Leases a session, logging in a new one if the pool isn't full.
+
+        :params timeout: Seconds to wait for a session to be released.
+        :returns: A session id.
+        """
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            create = len(self._sessions) + self._creating < self._size
+            if create:
+                self._creating += 1
+
+        if not create:
+            try:
+                return self._idle.get(timeout=timeout)
+            except queue.Empty:
+                raise RuntimeError('Timed out waiting for an Engage session.')
+
+        return self._create()
+
+    def release(self, session_id):
+        """Gives a leased session back to the pool, or logs it out if the
+        pool was closed while it was leased.
+        """
+        with self._lock:
+            if session_id in self._sessions:
+                self._idle.put(session_id)
+                return
+
+            if session_id not in self._closing:
+                return
+
+            self._closing.discard(session_id)
+
+        self._end(session_id)
+
+    def discard(self, session_id):
+        """Forgets a leased session, e.g. because Engage expired it."""
+        with self._lock:
+            self._sessions.discard(session_id)
+            self._closing.discard(session_id)
+
+    def renew(self, session_id, login=None):
+        """Replaces an expired leased session with a newly logged-in one.
+
+        :params login: Callable returning the new session id, instead of
+                       api._new_session.
+        :returns: The id of the new session, leased to the caller.
+        """
+        with self._lock:
+            self._sessions.discard(session_id)
+            self._closing.discard(session_id)
+            self._creating += 1
+
+        return self._create(login)
+
+    def _create(self, login=None):
+        """Logs in a session for a slot already reserved in _creating."""
+        try:
+            session_id = (login or self._api._new_session)()
+        except Exception:
+            with self._lock:
+                self._creating -= 1
+            raise
+
+        # In one go, or a concurrent acquire could go over size
+        with self._lock:
+            self._creating -= 1
+            self._sessions.add(session_id)
+
+        log.debug('Session pool holds %d sessions.', len(self._sessions))
+
+        return session_id
+
+    def _end(self, session_id):
+        """:returns: True if the session was logged out."""
+        try:
+            self._api._end_session(session_id)
+            return True
+        except Exception as e:
+            log.warning('Could not log out session: %s', e)
+            return False
+
+    def close(self, keep=()):
+        """Logs out every idle session and empties the pool. Leased
+        sessions are logged out when they are released.
+
+        :params keep: Sessions to only forget, as others still use them.
+        :returns: Number of sessions logged out.
+        """
+        keep = set(keep)
+        idle = []
+
+        with self._lock:
+            while True:
+                try:
+                    idle.append(self._idle.get_nowait())
+                except queue.Empty:
+                    break
+
+            self._closing.update(
+                self._sessions.difference(idle).difference(keep))
+            self._sessions.clear()
+
+        idle = [session_id for session_id in idle if session_id not in keep]
+
+        if self._closing:
+            log.debug('%d leased sessions will be logged out when released.',
+                      len(self._closing))
+
+        return sum(self._end(session_id) for session_id in idle)
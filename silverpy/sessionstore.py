@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: sessionstore
+    :synopsis: Engage sessions shared by processes through a local file.
+
+API clients given a SessionStore adopt the session saved there, by any
+process, instead of logging in. The session is only checked by the
+first real call. When Engage reports it expired, a single process logs
+in again while holding the file lock; the others wait for the lock and
+adopt the new session.
+"""
+
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+log = logging.getLogger(__name__)
+
+_replace = getattr(os, 'replace', os.rename)
+
+
+def _lock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+
+
+def _unlock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class SessionStore(object):
+    """Saves one Engage session per org and user in a JSON file, along
+    with when it was last used.
+
+    Usage:
+    store = SessionStore('/var/run/silverpy/sessions.json')
+    api = API('user', 'passwd', 'silverpop_url', session_store=store)
+    api.login()  # No Login request if another process left a session
+
+    The file holds session ids, which are credentials: it is created
+    readable by its owner only.
+
+    :params path: The file. A lock file is kept next to it.
+    :params idle_timeout: Seconds after its last use a session is deemed
+                          expired, and no longer adopted. Keep it below
+                          the session timeout of the org.
+    :params touch_interval: Minimum seconds between two writes of the
+                            last use of a session, by a process.
+    :params clock: Callable returning the current time in seconds.
+    """
+    def __init__(self, path, idle_timeout=1500.0, touch_interval=60.0,
+                 clock=time.time):
+        self.path = path
+        self.lock_path = path + '.lock'
+        self.idle_timeout = idle_timeout
+        self.touch_interval = touch_interval
+        self.clock = clock
+        self._lock = threading.Lock()
+        # key -> when this process last wrote its last use
+        self._touched = {}
+
+    @staticmethod
+    def key(username, url):
+        """:returns: The key the session of a user of an org is saved
+                     under.
+        """
+        return '%s %s' % (username, url)
+
+    @contextlib.contextmanager
+    def locked(self):
+        """Excludes every other thread and process using the store."""
+        with self._lock:
+            with open(self.lock_path, 'a') as f:
+                _lock_file(f)
+                try:
+                    yield
+                finally:
+                    _unlock_file(f)
+
+    def _read(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return {}
+
+    def _write(self, sessions):
+        tmp = '%s.%d.tmp' % (self.path, os.getpid())
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(sessions, f)
+        _replace(tmp, self.path)
+
+    def _fresh(self, entry):
+        return entry is not None \
+            and entry['last_used'] + self.idle_timeout > self.clock()
+
+    def get(self, key):
+        """:returns: Tuple (session_id, last_used) of the saved session,
+                     or None if there is none or it is expired.
+        """
+        entry = self._read().get(key)
+
+        if not self._fresh(entry):
+            return None
+
+        return (entry['session_id'], entry['last_used'])
+
+    def renew(self, key, stale, login):
+        """Logs in again, unless another process already did.
+
+        :params stale: The session found expired, or None if there was
+                       none.
+        :params login: Callable logging in and returning the session id.
+        :returns: The session id to use from now on.
+        """
+        with self.locked():
+            sessions = self._read()
+            entry = sessions.get(key)
+
+            if self._fresh(entry) and entry['session_id'] != stale:
+                return entry['session_id']
+
+            log.info('Logging in a new shared Engage session.')
+            session_id = login()
+            now = self.clock()
+            sessions[key] = {'session_id': session_id, 'last_used': now}
+            self._write(sessions)
+            self._touched[key] = now
+
+        return session_id
+
+    def touch(self, key, session_id):
+        """Records that a session was just used. Written at most every
+        touch_interval seconds per process.
+
+        :returns: True if written.
+        """
+        now = self.clock()
+        if now - self._touched.get(key, 0) < self.touch_interval:
+            return False
+
+        with self.locked():
+            sessions = self._read()
+            entry = sessions.get(key)
+
+            # Replaced by another process meanwhile
+            if entry is None or entry['session_id'] != session_id:
+                return False
+
+            entry['last_used'] = now
+            self._write(sessions)
+            self._touched[key] = now
+
+        return True
+
+    def discard(self, key, session_id):
+        """Forgets a session, if it's still the saved one."""
+        with self.locked():
+            sessions = self._read()
+            entry = sessions.get(key)
+
+            if entry is not None and entry['session_id'] == session_id:
+                del sessions[key]
+                self._write(sessions)
+                self._touched.pop(key, None)
@@ -0,0 +1,361 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: sharding
+    :synopsis: Bulk operations spread over a pool of worker processes.
+
+Threads overlap the network waits of a bulk run, but building and
+parsing envelopes still happens under one GIL. ShardedExecutor runs the
+operations in worker processes instead, each with its own API client
+and Engage session, and routes every recipient to the same process.
+"""
+
+import collections
+import logging
+import multiprocessing
+import pickle
+import threading
+import zlib
+
+from .api import API, BulkItem, SilverpopError
+from .cache import column_email
+
+try:
+    import queue
+except ImportError:  # Python 2
+    import Queue as queue
+
+log = logging.getLogger(__name__)
+
+OPERATIONS = ('add_recipient', 'opt_out_recipient', 'remove_recipient')
+
+# Seconds between checks that the workers are still alive.
+_POLL_INTERVAL = 1.0
+
+
+def recipient_key(method, spec):
+    """:returns: The key operations are sharded by, the recipient email
+                 in lower case, or the spec itself if it has no email.
+    """
+    if method == 'add_recipient':
+        if isinstance(spec, dict):
+            email = column_email(spec.get('columns'))
+        else:
+            email = column_email(spec[2] if len(spec) > 2 else None)
+    elif isinstance(spec, dict):
+        email = spec.get('email')
+    else:
+        email = spec[1] if len(spec) > 1 else None
+
+    if email:
+        return email.lower()
+
+    return repr(spec)
+
+
+def shard(key, shards):
+    """:returns: The shard, between 0 and shards - 1, of a key. Stable
+                 across processes and runs, unlike hash().
+    """
+    if not isinstance(key, bytes):
+        key = key.encode('utf-8')
+
+    return zlib.crc32(key) % shards
+
+
+def _picklable(error):
+    """Exceptions that can't be pickled are sent back as SilverpopError."""
+    try:
+        pickle.dumps(error, pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        return SilverpopError(repr(error))
+
+    return error
+
+
+def _worker(args, kwargs, threads, inbox, outbox):
+    """Entry point of a worker process.
+
+    Builds and logs in its own API, then runs the operations received on
+    inbox from threads threads, until each of them reads a None.
+    Results are put on outbox as (run, index, success, value, error).
+    """
+    api = API(*args, **kwargs)
+
+    try:
+        api.login()
+        failure = None
+    except Exception as e:
+        log.error('Worker login failed: %s', e)
+        failure = _picklable(e)
+
+    def run():
+        while True:
+            message = inbox.get()
+            if message is None:
+                return
+
+            run_id, index, method, spec = message
+
+            if failure is not None:
+                outbox.put((run_id, index, False, None, failure))
+                continue
+
+            try:
+                if isinstance(spec, dict):
+                    value = getattr(api, method)(**spec)
+                else:
+                    value = getattr(api, method)(*spec)
+            except Exception as e:
+                log.error('Sharded %s item %d failed: %s', method, index, e)
+                outbox.put((run_id, index, False, None, _picklable(e)))
+            else:
+                outbox.put((run_id, index, value[0], value, value[-1]))
+
+    workers = [threading.Thread(target=run) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+
+    if failure is None:
+        try:
+            api.logout()
+        except Exception as e:
+            log.warning('Worker logout failed: %s', e)
+
+    api.close()
+
+
+class ShardedExecutor(object):
+    """Runs bulk recipient operations over a pool of processes.
+
+    Every process logs in its own API, built with the given arguments,
+    and runs the operations of its shard from threads threads. The
+    operations of a recipient always go to the same process, never
+    split across several of them.
+
+    Usage:
+    executor = ShardedExecutor('user', 'passwd', 'silverpop_url')
+    for item in executor.bulk_add_recipients(recipients):
+        ...
+    executor.close()
+
+    :params processes: Number of worker processes, defaults to the
+                       number of CPUs.
+    :params threads: Concurrent requests per process.
+    :params queue_size: Operations queued per process before submitting
+                        blocks.
+    :params api_options: Further keyword arguments of API. They, and the
+                         transport if any, must be picklable.
+    """
+    def __init__(self, username, password, url, processes=None, threads=8,
+                 queue_size=None, **api_options):
+        if processes is None:
+            processes = multiprocessing.cpu_count()
+
+        if processes < 1 or threads < 1:
+            raise ValueError('processes and threads must be positive.')
+
+        self.processes = processes
+        self.threads = threads
+        self._run_id = 0
+        # Queue of the results of each run being consumed, by run id
+        self._results = {}
+        self._lock = threading.Lock()
+        self._closed = False
+
+        self._outbox = multiprocessing.Queue()
+        self._inboxes = []
+        self._workers = []
+
+        for number in range(processes):
+            inbox = multiprocessing.Queue(queue_size or threads * 4)
+            worker = multiprocessing.Process(
+                target=_worker,
+                args=((username, password, url), api_options, threads,
+                      inbox, self._outbox),
+                name='silverpy-shard-%d' % number)
+            worker.daemon = True
+            worker.start()
+
+            self._inboxes.append(inbox)
+            self._workers.append(worker)
+
+        self._dispatcher = threading.Thread(
+            target=self._dispatch, name='silverpy-shard-results')
+        self._dispatcher.daemon = True
+        self._dispatcher.start()
+
+    def _dispatch(self):
+        """Routes every result to the queue of its run, until a None is
+        read. Results of abandoned runs are dropped.
+        """
+        while True:
+            result = self._outbox.get()
+            if result is None:
+                return
+
+            with self._lock:
+                results = self._results.get(result[0])
+
+            if results is not None:
+                results.put(result)
+
+    def _result(self, run_id):
+        """Waits for the next result of a run."""
+        results = self._results[run_id]
+
+        while True:
+            try:
+                return results.get(timeout=_POLL_INTERVAL)
+            except queue.Empty:
+                pass
+
+            dead = [w.name for w in self._workers if not w.is_alive()]
+            if dead:
+                raise SilverpopError(
+                    'Worker processes exited: %s' % ', '.join(dead))
+
+    def run(self, method, specs, max_in_flight=None, ordered=True):
+        """Runs an API method once per spec, in the worker processes.
+
+        A fault or exception on one spec doesn't stop the others.
+
+        :params method: Name of the method, one of OPERATIONS.
+        :params specs: Iterable of dicts (keyword arguments) or
+                       tuples (positional arguments).
+        :params max_in_flight: Maximum number of specs submitted but not
+                               yet yielded. Defaults to twice the
+                               threads of all processes.
+        :params ordered: If True, items come back in input order,
+                         otherwise as soon as they complete.
+        :returns: Generator of BulkItem objects.
+        """
+        if method not in OPERATIONS:
+            raise ValueError('%s can not be sharded.' % method)
+
+        if max_in_flight is None:
+            max_in_flight = self.processes * self.threads * 2
+
+        if max_in_flight < 1:
+            raise ValueError('max_in_flight must be positive.')
+
+        if self._closed:
+            raise RuntimeError('ShardedExecutor is closed.')
+
+        def generate():
+            with self._lock:
+                self._run_id += 1
+                run_id = self._run_id
+                self._results[run_id] = queue.Queue()
+
+            try:
+                for item in self._run(run_id, method, specs, max_in_flight,
+                                      ordered):
+                    yield item
+            finally:
+                # From now on, results of the run are dropped
+                with self._lock:
+                    del self._results[run_id]
+
+        return generate()
+
+    def _run(self, run_id, method, specs, max_in_flight, ordered):
+        # Specs submitted and not yet yielded, by index
+        in_flight = {}
+        # Completed out of order, by index
+        done = {}
+        # Indices in submission order, for ordered runs
+        order = collections.deque()
+
+        def receive():
+            result = self._result(run_id)
+            index = result[1]
+
+            return BulkItem(index, in_flight[index], *result[2:])
+
+        def drain(block_until_empty):
+            while in_flight:
+                if ordered:
+                    if order[0] not in done:
+                        item = receive()
+                        done[item.index] = item
+                        continue
+
+                    index = order.popleft()
+                    del in_flight[index]
+                    yield done.pop(index)
+                else:
+                    item = receive()
+                    del in_flight[item.index]
+                    yield item
+
+                if not block_until_empty and len(in_flight) < max_in_flight:
+                    return
+
+        for index, spec in enumerate(specs):
+            if len(in_flight) >= max_in_flight:
+                for item in drain(False):
+                    yield item
+
+            inbox = self._inboxes[
+                shard(recipient_key(method, spec), self.processes)]
+
+            in_flight[index] = spec
+            if ordered:
+                order.append(index)
+
+            inbox.put((run_id, index, method, spec))
+
+        for item in drain(True):
+            yield item
+
+    def bulk_add_recipients(self, recipients, max_in_flight=None,
+                            ordered=True):
+        """Sharded add_recipient over an iterable of recipients.
+
+        :returns: Generator of BulkItem objects, see
+                  API.bulk_add_recipients.
+        """
+        return self.run('add_recipient', recipients, max_in_flight, ordered)
+
+    def bulk_opt_out(self, recipients, max_in_flight=None, ordered=True):
+        """Sharded opt_out_recipient over an iterable of recipients.
+
+        :returns: Generator of BulkItem objects.
+        """
+        return self.run(
+            'opt_out_recipient', recipients, max_in_flight, ordered)
+
+    def bulk_remove(self, recipients, max_in_flight=None, ordered=True):
+        """Sharded remove_recipient over an iterable of recipients.
+
+        :returns: Generator of BulkItem objects.
+        """
+        return self.run(
+            'remove_recipient', recipients, max_in_flight, ordered)
+
+    def close(self):
+        """Stops the workers once their queued operations are done, and
+        logs out their sessions.
+        """
+        if self._closed:
+            return
+
+        self._closed = True
+
+        for inbox in self._inboxes:
+            for _ in range(self.threads):
+                inbox.put(None)
+
+        # The dispatcher reads the results of abandoned runs meanwhile,
+        # which workers need to exit
+        for worker in self._workers:
+            worker.join()
+
+        self._outbox.put(None)
+        self._dispatcher.join()
+
+        self._outbox.close()
+        for inbox in self._inboxes:
+            inbox.close()
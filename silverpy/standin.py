@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: standin
+    :synopsis: Local stand-in for the Engage XML API.
+
+StandIn answers the calls silverpy makes over plain HTTP, keeping
+sessions, recipients, contact lists and mailings in memory. Latency,
+faults and throttling can be injected, to test and benchmark a client
+without an Engage account, see silverpy.bench.
+"""
+
+import collections
+import itertools
+import logging
+import random
+import threading
+import time
+
+from . import backends
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+except ImportError:  # Python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+
+log = logging.getLogger(__name__)
+
+# Fault sent for injected errors, and when a session is missing.
+INJECTED_ERROR = ('999', 'Injected error.')
+SESSION_EXPIRED = ('145', 'Session has expired or is invalid.')
+
+
+def _envelope(fields=(), fault=None):
+    xml = backends.get_backend()
+    root = xml.Element('Envelope')
+    body = xml.SubElement(root, 'Body')
+    result = xml.SubElement(body, 'RESULT')
+    xml.SubElement(result, 'SUCCESS').text = 'false' if fault else 'true'
+
+    for tag, text in fields:
+        xml.SubElement(result, tag).text = str(text)
+
+    if fault:
+        element = xml.SubElement(body, 'Fault')
+        xml.SubElement(element, 'FaultString').text = fault[1]
+        error = xml.SubElement(
+            xml.SubElement(element, 'detail'), 'error')
+        xml.SubElement(error, 'errorid').text = fault[0]
+
+    return xml.tostring(root)
+
+
+class StandIn(object):
+    """In memory Engage XML API served over HTTP.
+
+    Usage:
+    with StandIn(latency=0.05) as engage:
+        api = API('user', 'passwd', engage.url)
+
+    :params latency: Seconds every call waits before answering.
+    :params jitter: Up to that many more seconds, at random.
+    :params error_rate: Fraction of calls, other than Login, answered
+                        with the INJECTED_ERROR fault.
+    :params throttle_rate: Calls per second accepted, the rest are
+                           answered with HTTP 429. None disables it.
+    :params seed: Seed of the random injections.
+    """
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, jitter=0.0,
+                 error_rate=0.0, throttle_rate=None, seed=None,
+                 clock=time.time):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self._clock = clock
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+        self.calls = collections.Counter()
+        # TCP connections accepted
+        self.connections = 0
+        self.sessions = set()
+        # (list_id, email) -> RecipientId
+        self.recipients = {}
+        self.contact_lists = {}
+        self.mailings = {}
+        self._ids = itertools.count(1000)
+
+        self._tokens = throttle_rate
+        self._updated = clock()
+
+        self._server = _Server((host, port), _Handler)
+        self._server.standin = self
+        self._thread = None
+
+    @property
+    def url(self):
+        """The XML API endpoint to give API."""
+        host, port = self._server.server_address[:2]
+        return 'http://%s:%d/XMLAPI' % (host, port)
+
+    def start(self):
+        """Serves from a background thread."""
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, kwargs={'poll_interval': 0.05},
+            name='silverpy-standin')
+        self._thread.daemon = True
+        self._thread.start()
+
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def _throttled(self):
+        if self.throttle_rate is None:
+            return False
+
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(
+                self.throttle_rate,
+                self._tokens + (now - self._updated) * self.throttle_rate)
+            self._updated = now
+
+            if self._tokens < 1:
+                return True
+
+            self._tokens -= 1
+            return False
+
+    def delay(self):
+        """:returns: Seconds to wait before answering a call."""
+        if not self.jitter:
+            return self.latency
+
+        with self._lock:
+            return self.latency + self._random.uniform(0, self.jitter)
+
+    def handle(self, path, body):
+        """Answers one request.
+
+        :params path: Request path, with the jsessionid if any.
+        :params body: The request envelope.
+        :returns: Tuple (http_status, response_body)
+        """
+        if self._throttled():
+            return (429, b'Too many requests')
+
+        try:
+            action = backends.get_backend().fromstring(body).find('Body/*')
+        except (SyntaxError, ValueError):
+            # Parse errors of every backend
+            action = None
+
+        if action is None:
+            return (200, _envelope(fault=('100', 'Malformed request.')))
+
+        with self._lock:
+            self.calls[action.tag] += 1
+
+            if action.tag != 'Login':
+                session = path.partition(';jsessionid=')[2]
+                if session not in self.sessions:
+                    return (200, _envelope(fault=SESSION_EXPIRED))
+
+                if self.error_rate \
+                        and self._random.random() < self.error_rate:
+                    return (200, _envelope(fault=INJECTED_ERROR))
+
+            method = getattr(self, '_%s' % action.tag, None)
+            if method is None:
+                return (200, _envelope(
+                    fault=('100', 'Unknown action %s.' % action.tag)))
+
+            return (200, method(action))
+
+    def _Login(self, action):
+        session = '%032X' % self._random.getrandbits(128)
+        self.sessions.add(session)
+
+        return _envelope([('SESSIONID', session)])
+
+    def _Logout(self, action):
+        # The request was checked to hold a valid session
+        return _envelope()
+
+    def _recipient(self, action):
+        list_id = action.findtext('LIST_ID')
+        email = action.findtext('EMAIL')
+
+        for column in action:
+            if column.tag == 'COLUMN' \
+                    and column.findtext('NAME', '').upper() == 'EMAIL':
+                email = column.findtext('VALUE')
+
+        return (list_id, (email or '').lower())
+
+    def _AddRecipient(self, action):
+        key = self._recipient(action)
+
+        if key not in self.recipients:
+            self.recipients[key] = next(self._ids)
+
+        return _envelope([('RecipientId', self.recipients[key])])
+
+    def _RemoveRecipient(self, action):
+        if self.recipients.pop(self._recipient(action), None) is None:
+            return _envelope(fault=('128', 'Recipient is not a member.'))
+
+        return _envelope()
+
+    def _OptOutRecipient(self, action):
+        return _envelope()
+
+    def _SelectRecipientData(self, action):
+        recipient_id = self.recipients.get(self._recipient(action))
+
+        if recipient_id is None:
+            return _envelope(fault=('128', 'Recipient is not a member.'))
+
+        return _envelope([('RecipientId', recipient_id)])
+
+    def _CreateContactList(self, action):
+        contact_list_id = next(self._ids)
+        self.contact_lists[contact_list_id] = action.findtext(
+            'CONTACT_LIST_NAME')
+
+        return _envelope([('CONTACT_LIST_ID', contact_list_id)])
+
+    def _AddContactToContactList(self, action):
+        return _envelope()
+
+    def _SendMailing(self, action):
+        return _envelope()
+
+    def _ScheduleMailing(self, action):
+        mailing_id = next(self._ids)
+        self.mailings[mailing_id] = action.findtext('MAILING_NAME')
+
+        return _envelope([('MAILING_ID', mailing_id)])
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    # Many clients connecting at once
+    request_queue_size = 128
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # Keep-alive, as Engage
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately, don't wait for acks
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        BaseHTTPRequestHandler.setup(self)
+
+        standin = self.server.standin
+        with standin._lock:
+            standin.connections += 1
+
+    def do_POST(self):
+        standin = self.server.standin
+
+        if self.headers.get('Transfer-Encoding', '').lower() == 'chunked':
+            body = self._read_chunked()
+        else:
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+        delay = standin.delay()
+        if delay:
+            time.sleep(delay)
+
+        status, response = standin.handle(self.path, body)
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/xml;charset=UTF-8')
+        self.send_header('Content-Length', str(len(response)))
+        self.end_headers()
+        self.wfile.write(response)
+
+    def _read_chunked(self):
+        chunks = []
+
+        while True:
+            size = int(self.rfile.readline().split(b';')[0], 16)
+            if not size:
+                # Trailer, up to the empty line
+                while self.rfile.readline().strip():
+                    pass
+                return b''.join(chunks)
+
+            chunks.append(self.rfile.read(size))
+            self.rfile.readline()
+
+    def log_message(self, format, *args):
+        log.debug(format, *args)
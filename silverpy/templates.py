@@ -0,0 +1,381 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: templates
+    :synopsis: Precompiled request templates for high volume operations.
+
+A RequestTemplate declares the fields of an Engage operation once and
+serializes every request by escaping the values and joining them with
+byte fragments computed up front, without building an lxml tree. The
+output is byte-identical to etree.tostring() of the tree the BaseAPI
+builders produce for the same arguments.
+"""
+
+import re
+
+try:
+    string_types = basestring
+    text_type = unicode
+except NameError:  # Python 3
+    string_types = str
+    text_type = str
+
+# Same message and exception lxml raises for text it can not serialize.
+_NOT_XML_COMPATIBLE = ('All strings must be XML compatible: Unicode or '
+                       'ASCII, no NULL bytes or control characters')
+
+_INVALID_CHARS = re.compile(u'[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+
+# Anything but printable ASCII without markup characters, tabs and
+# newlines. Most values have none and are written as they are.
+_SPECIAL_CHARS = re.compile(u'[^\t\n\x20-\x25\x27-\x3b\x3d\x3f-\x7e]')
+
+
+def escape(text):
+    """Serializes a text node the way etree.tostring() does: markup
+    characters and carriage returns escaped, non-ASCII characters as
+    character references.
+
+    :params text: The node text.
+    :returns: ASCII bytes.
+    """
+    if not isinstance(text, string_types):
+        raise TypeError('text must be a string.')
+
+    if not _SPECIAL_CHARS.search(text):
+        return text if isinstance(text, bytes) else text.encode('ascii')
+
+    if not isinstance(text, text_type):
+        # Python 2 str, lxml only accepts plain ASCII there
+        try:
+            text = text.decode('ascii')
+        except UnicodeDecodeError:
+            raise ValueError(_NOT_XML_COMPATIBLE)
+
+    if _INVALID_CHARS.search(text):
+        raise ValueError(_NOT_XML_COMPATIBLE)
+
+    text = text.replace('&', '&amp;').replace('<', '&lt;') \
+        .replace('>', '&gt;').replace('\r', '&#13;')
+
+    return text.encode('ascii', 'xmlcharrefreplace')
+
+
+def escape_column(texts):
+    """escape over a whole column, None values kept as they are. The
+    column is searched, escaped and encoded at once, joined by NULL
+    bytes, which can't be part of any value.
+
+    :params texts: List of texts or None.
+    :returns: List of ASCII bytes or None.
+    """
+    present = [text for text in texts if text is not None]
+    if not present:
+        return list(texts)
+
+    try:
+        plain = u''.join(present)
+    except UnicodeDecodeError:  # Python 2 str that isn't ASCII
+        plain = None
+
+    if plain is None or _INVALID_CHARS.search(plain):
+        # Raises what escape raises for the first offending value
+        return [None if text is None else escape(text) for text in texts]
+
+    joined = u'\x00'.join(present)
+    if _SPECIAL_CHARS.search(plain):
+        joined = joined.replace('&', '&amp;').replace('<', '&lt;') \
+            .replace('>', '&gt;').replace('\r', '&#13;')
+
+    escaped = joined.encode('ascii', 'xmlcharrefreplace').split(b'\x00')
+
+    if len(present) == len(texts):
+        return escaped
+
+    escaped = iter(escaped)
+    return [None if text is None else next(escaped) for text in texts]
+
+
+def _tag(fmt, tag):
+    return (fmt % tag).encode('ascii')
+
+
+class RenderedEnvelope(bytes):
+    """Serialized request body, remembering the action it performs."""
+    def __new__(cls, data, action):
+        envelope = bytes.__new__(cls, data)
+        envelope.action = action
+        return envelope
+
+
+class Serialized(bytes):
+    """Items of a Pairs or Items field serialized ahead, e.g. by
+    silverpy.columnar, and written as they are.
+    """
+
+
+class Text(object):
+    """A text node.
+
+    :params tag: The node tag.
+    :params name: Key of the value, defaults to the lower case tag.
+    :params convert: Applied to the value before serializing, e.g. str.
+    :params optional: If True, the node is only written when a value is
+                      given.
+    """
+    def __init__(self, tag, name=None, convert=None, optional=False):
+        self.name = name or tag.lower()
+        self.convert = convert
+        self.optional = optional
+        self._open = _tag('<%s>', tag)
+        self._close = _tag('</%s>', tag)
+
+    def render(self, values, out):
+        if self.name not in values:
+            if self.optional:
+                return
+            raise TypeError('%s is required.' % self.name)
+
+        value = values[self.name]
+        if self.convert is not None:
+            value = self.convert(value)
+
+        out.append(self._open)
+        out.append(escape(value))
+        out.append(self._close)
+
+
+class Flag(object):
+    """A node holding 'true', written only when the value is True."""
+    def __init__(self, tag, name=None):
+        self.name = name or tag.lower()
+        self._node = _tag('<%s>true</%s>', (tag, tag))
+
+    def render(self, values, out):
+        if values.get(self.name) is True:
+            out.append(self._node)
+
+
+class Pairs(object):
+    """One tag node with NAME and VALUE children per item of a dict.
+
+    Without a container, nothing is written for an empty dict. With one,
+    the container is written whenever a value is given.
+
+    :params tag: Tag of every item, e.g. COLUMN.
+    :params name: Key of the dict, or of its Serialized items.
+    :params container: Tag of the node wrapping the items, if any.
+    """
+    def __init__(self, tag, name, container=None):
+        self.name = name
+        self.container = container
+        self._item_open = _tag('<%s><NAME>', tag)
+        self._item_value = b'</NAME><VALUE>'
+        self._item_close = _tag('</VALUE></%s>', tag)
+
+        if container:
+            self._open = _tag('<%s>', container)
+            self._close = _tag('</%s>', container)
+            self._empty = _tag('<%s/>', container)
+
+    def item(self, key, value):
+        """:returns: The serialized node of one item."""
+        return b''.join((self._item_open, escape(key), self._item_value,
+                         escape(str(value)), self._item_close))
+
+    def render(self, values, out):
+        pairs = values.get(self.name)
+
+        if self.container is None:
+            if not pairs:
+                return
+        elif self.name not in values:
+            return
+
+        if isinstance(pairs, Serialized):
+            if self.container is None:
+                out.append(pairs)
+            elif pairs:
+                out.extend((self._open, pairs, self._close))
+            else:
+                out.append(self._empty)
+            return
+
+        if not isinstance(pairs, dict):
+            raise TypeError('%s must be a dict.' % self.name)
+
+        if self.container is not None:
+            if not pairs:
+                out.append(self._empty)
+                return
+            out.append(self._open)
+
+        for key in pairs:
+            out.append(self._item_open)
+            out.append(escape(key))
+            out.append(self._item_value)
+            out.append(escape(str(pairs[key])))
+            out.append(self._item_close)
+
+        if self.container is not None:
+            out.append(self._close)
+
+
+class Items(object):
+    """A container node with one text node per item of a list, written
+    whenever a value is given.
+
+    :params tag: Tag of every item, e.g. SUPRESSION_LIST_ID.
+    :params name: Key of the list, or of its Serialized items.
+    :params container: Tag of the node wrapping the items.
+    """
+    def __init__(self, tag, name, container):
+        self.name = name
+        self._item_open = _tag('<%s>', tag)
+        self._item_close = _tag('</%s>', tag)
+        self._open = _tag('<%s>', container)
+        self._close = _tag('</%s>', container)
+        self._empty = _tag('<%s/>', container)
+
+    def render(self, values, out):
+        if self.name not in values:
+            return
+
+        items = values[self.name]
+        if not isinstance(items, Serialized):
+            if not isinstance(items, list):
+                raise TypeError('%s must be a list.' % self.name)
+
+            items = b''.join(
+                self._item_open + escape(str(item)) + self._item_close
+                for item in items)
+
+        if items:
+            out.extend((self._open, items, self._close))
+        else:
+            out.append(self._empty)
+
+
+class RequestTemplate(object):
+    """Serializes the envelope of one Engage action from a dict of values.
+
+    Usage:
+    template = RequestTemplate('RemoveRecipient', [
+        Text('LIST_ID', convert=str),
+        Text('EMAIL'),
+    ])
+    body = template.render({'list_id': 1, 'email': 'a@b.com'})
+
+    :params action: The action node tag.
+    :params fields: Text, Flag and Pairs objects, in document order.
+    """
+    def __init__(self, action, fields):
+        self.action = action
+        self.fields = tuple(fields)
+        self._head = _tag('<Envelope><Body><%s>', action)
+        self._tail = _tag('</%s></Body></Envelope>', action)
+        self._empty = _tag('<Envelope><Body><%s/></Body></Envelope>', action)
+
+    def partial(self, values, varying):
+        """Renders the fields not named in varying once, for envelopes
+        only differing by those.
+
+        :params values: Values of the other fields.
+        :params varying: Names of the fields rendered per envelope.
+        :returns: A function rendering the RenderedEnvelope of a dict of
+                  the varying values.
+        """
+        parts = []
+        out = []
+
+        for field in self.fields:
+            if field.name in varying:
+                parts.append(b''.join(out))
+                parts.append(field)
+                out = []
+            else:
+                field.render(values, out)
+
+        parts.append(b''.join(out))
+        parts = [part for part in parts if part != b'']
+        head, tail, action = self._head, self._tail, self.action
+
+        def render(row):
+            out = [head]
+
+            for part in parts:
+                if isinstance(part, bytes):
+                    out.append(part)
+                else:
+                    part.render(row, out)
+
+            out.append(tail)
+
+            return RenderedEnvelope(b''.join(out), action)
+
+        return render
+
+    def render(self, values):
+        """Values without a field are ignored.
+
+        :returns: A RenderedEnvelope.
+        """
+        out = [self._head]
+
+        for field in self.fields:
+            field.render(values, out)
+
+        if len(out) == 1:
+            return RenderedEnvelope(self._empty, self.action)
+
+        out.append(self._tail)
+
+        return RenderedEnvelope(b''.join(out), self.action)
+
+
+ADD_RECIPIENT = RequestTemplate('AddRecipient', [
+    Text('LIST_ID', convert=str),
+    Text('CREATED_FROM', convert=str),
+    Flag('SEND_AUTOREPLY'),
+    Flag('UPDATE_IF_FOUND'),
+    Flag('ALLOW_HTML'),
+    Text('VISITOR_KEY', optional=True),
+    Pairs('SYNC_FIELD', 'sync_fields', container='SYNC_FIELDS'),
+    Pairs('COLUMN', 'columns'),
+])
+
+OPT_OUT_RECIPIENT = RequestTemplate('OptOutRecipient', [
+    Text('LIST_ID', convert=str),
+    Text('EMAIL', optional=True),
+    Text('MAILING_ID', convert=str, optional=True),
+    Text('RECIPIENT_ID', convert=str, optional=True),
+    Text('JOB_ID', convert=str, optional=True),
+    Pairs('COLUMN', 'columns'),
+])
+
+REMOVE_RECIPIENT = RequestTemplate('RemoveRecipient', [
+    Text('LIST_ID', convert=str),
+    Text('EMAIL'),
+    Pairs('COLUMN', 'columns'),
+])
+
+SCHEDULE_MAILING = RequestTemplate('ScheduleMailing', [
+    Text('TEMPLATE_ID', convert=str),
+    Text('LIST_ID', convert=str),
+    Text('MAILING_NAME'),
+    Text('VISIBILITY', convert=str),
+    Flag('SEND_HTML'),
+    Flag('SEND_AOL'),
+    Flag('SEND_TEXT'),
+    Flag('INBOX_MONITOR'),
+    Flag('CREATE_PARENT_FOLDER'),
+    Text('SUBJECT', optional=True),
+    Text('FROM_NAME', optional=True),
+    Text('FROM_ADDRESS', optional=True),
+    Text('REPLY_TO', optional=True),
+    Text('PARENT_FOLDER_PATH', optional=True),
+    Text('SEND_TIME_OPTIMIZATION', optional=True),
+    Items('SUPRESSION_LIST_ID', 'supression_list',
+          container='SUPRESSION_LISTS'),
+    Text('SCHEDULED', optional=True),
+    Pairs('SUBSTITUTION', 'substitutions', container='SUBSTITUTIONS'),
+])
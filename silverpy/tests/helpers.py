@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""Fakes shared by the tests, which run from the silverpy directory."""
+
+import itertools
+import os
+import threading
+
+from lxml import etree
+
+from silverpy.capture import action_of
+
+
+def fixture(name):
+    """:returns: The bytes of a fixture file of the tests directory."""
+    with open('tests/%s' % name, 'rb') as f:
+        return f.read()
+
+
+class FakeResponse(object):
+    """HTTP response of a fake transport or API._request."""
+    def __init__(self, content):
+        self.content = content
+
+
+class FakeClock(object):
+    """Clock whose time only moves when set, or slept."""
+    def __init__(self, now=0.0):
+        self.now = now
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+class FakeTransport(object):
+    """Transport recording the bodies posted, streamed ones joined, and
+    answering with a response fixture per action.
+
+    :params responses: Dict of action to fixture name. Login is answered
+                       with test_login_response.xml, the others with
+                       test_response.xml unless given.
+    """
+    def __init__(self, responses=None):
+        self.sent = []
+        self.responses = {'Login': 'test_login_response.xml'}
+        self.responses.update(responses or {})
+
+    def post(self, url, headers, data):
+        if not isinstance(data, bytes):
+            data = b''.join(data)
+        self.sent.append(data)
+
+        return FakeResponse(fixture(
+            self.responses.get(action_of(data), 'test_response.xml')))
+
+    def close(self):
+        pass
+
+
+class FakeEngage(object):
+    """Answers API._request calls, handing out numbered sessions."""
+    def __init__(self, api):
+        self.api = api
+        self.login = fixture('test_login_response.xml')
+        self.counter = itertools.count(1)
+        self.lock = threading.Lock()
+        self.expired = set()
+        self.logged_out = []
+        self.used = set()
+
+    def request(self, data, auth=True, session_id=None):
+        if not etree.iselement(data):
+            data = etree.fromstring(data)
+
+        action = data.find('Body/*').tag
+
+        if action == 'Login':
+            session = 'SESSION%d' % next(self.counter)
+            return FakeResponse(self.login.replace(
+                b'DCA89FB13DEAE8DA2B3F87388A8E47A4', session.encode()))
+
+        session = session_id or self.api._sessionId
+
+        with self.lock:
+            if session in self.expired:
+                return FakeResponse(
+                    fixture('test_session_expired_response.xml'))
+
+            self.used.add(session)
+
+            if action == 'Logout':
+                self.logged_out.append(session)
+
+        return FakeResponse(fixture('test_response.xml'))
+
+
+class WorkerTransport(object):
+    """Picklable transport answering Login and recipient calls, with the
+    worker pid as RecipientId.
+    """
+    def __init__(self, login=True):
+        self.login = login
+
+    def post(self, url, headers, data):
+        if b'<Login>' in data:
+            if not self.login:
+                raise IOError('connection refused')
+
+            return FakeResponse(
+                b'<Envelope><Body><RESULT><SUCCESS>true</SUCCESS>'
+                b'<SESSIONID>S</SESSIONID></RESULT></Body></Envelope>')
+
+        if b'fail@' in data:
+            return FakeResponse(
+                b'<Envelope><Body><RESULT><SUCCESS>false</SUCCESS>'
+                b'</RESULT><Fault><FaultString>Invalid</FaultString>'
+                b'<detail><error><errorid>122</errorid></error></detail>'
+                b'</Fault></Body></Envelope>')
+
+        return FakeResponse(
+            b'<Envelope><Body><RESULT><SUCCESS>true</SUCCESS>'
+            b'<RecipientId>%d</RecipientId></RESULT></Body></Envelope>'
+            % os.getpid())
+
+    def close(self):
+        pass
@@ -0,0 +1,126 @@
+import unittest
+
+import sys
+sys.path.append('..')
+
+try:
+    import asyncio
+except ImportError:  # Python 2
+    asyncio = None
+
+from silverpy.api import SilverpopError
+from silverpy.tests import helpers
+
+
+def resolved(value):
+    future = asyncio.Future()
+    future.set_result(value)
+    return future
+
+
+class FakeResponse(helpers.FakeResponse):
+    """aiohttp response, used as an async context manager."""
+    def __aenter__(self):
+        return resolved(self)
+
+    def __aexit__(self, *exc_info):
+        return resolved(False)
+
+    def raise_for_status(self):
+        pass
+
+    def read(self):
+        return resolved(self.content)
+
+
+class FakeSession(object):
+    """Stands in for aiohttp.ClientSession, answering with fixtures."""
+    def __init__(self):
+        self.requests = []
+
+    def post(self, url, headers=None, data=None):
+        self.requests.append((url, data))
+
+        if b'<Login>' in data:
+            name = 'test_login_response.xml'
+        elif b'<ScheduleMailing>' in data:
+            name = 'test_error_response.xml'
+        else:
+            name = 'test_response.xml'
+
+        return FakeResponse(helpers.fixture(name))
+
+
+@unittest.skipIf(asyncio is None or sys.version_info < (3, 5),
+                 'AsyncAPI requires Python 3.5+')
+class TestAsyncApi(unittest.TestCase):
+    def setUp(self):
+        from silverpy.aio import AsyncAPI
+
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.session = FakeSession()
+        self.api = AsyncAPI(
+            username='test',
+            password='test',
+            url='testURL',
+            session=self.session,
+        )
+
+    def tearDown(self):
+        asyncio.set_event_loop(None)
+        self.loop.close()
+
+    def run_coroutine(self, coroutine):
+        return self.loop.run_until_complete(coroutine)
+
+    def test_login(self):
+        self.assertTrue(self.run_coroutine(self.api.login()))
+        self.assertEqual(
+            self.api._sessionId, 'DCA89FB13DEAE8DA2B3F87388A8E47A4')
+
+        url, data = self.session.requests[0]
+        self.assertEqual(url, 'testURL')
+        self.assertIn(b'<USERNAME>test</USERNAME>', data)
+
+    def test_xml_backend(self):
+        from silverpy.aio import AsyncAPI
+
+        api = AsyncAPI('test', 'test', 'testURL', session=self.session,
+                       xml_backend='etree')
+
+        self.assertEqual(api._xml.name, 'etree')
+        self.assertTrue(self.run_coroutine(api.login()))
+
+    def test_requires_session(self):
+        with self.assertRaises(SilverpopError):
+            self.run_coroutine(self.api.remove_recipient(1, 'a@b.com'))
+
+    def test_concurrent_add_recipient(self):
+        self.run_coroutine(self.api.login())
+
+        results = self.run_coroutine(asyncio.gather(*[
+            self.api.add_recipient(1, 1, {'EMAIL': 'user%d@b.com' % i})
+            for i in range(20)
+        ]))
+
+        self.assertEqual(len(results), 20)
+        for success, recipient_id, error in results:
+            self.assertTrue(success)
+            self.assertEqual(recipient_id, '33439394')
+            self.assertIsNone(error)
+
+        url, data = self.session.requests[-1]
+        self.assertEqual(
+            url, 'testURL;jsessionid=DCA89FB13DEAE8DA2B3F87388A8E47A4')
+
+    def test_schedule_mailing_fault_raises(self):
+        self.run_coroutine(self.api.login())
+
+        with self.assertRaises(SilverpopError):
+            self.run_coroutine(
+                self.api.schedule_mailing(1, 2, 'Mailing name'))
+
+
+if __name__ == '__main__':
+    unittest.main()
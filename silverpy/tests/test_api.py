@@ -1,11 +1,13 @@
 import unittest
 
 import sys
-sys.path.append('.')
+sys.path.append('..')
 
 from lxml import etree
 
-from api import API
+from silverpy.api import API, BulkItem, Result, StreamingEnvelope
+from silverpy.templates import RenderedEnvelope
+from silverpy.tests.helpers import FakeResponse, fixture
 
 
 class TestSilverpopApi(unittest.TestCase):
@@ -22,7 +24,7 @@ class TestSilverpopApi(unittest.TestCase):
         )
 
     def test_envelope(self):
-        expected = "<Envelope><Body><Test/></Body></Envelope>"
+        expected = b"<Envelope><Body><Test/></Body></Envelope>"
 
         envelope = self.api._envelope('Test')
 
@@ -99,8 +101,8 @@ class TestSilverpopApi(unittest.TestCase):
         self.api._create_child_element(action_node, 'COLUMN', dict_columns)
         children = action_node.getchildren()
 
-        names = list(dict_columns.iterkeys())
-        values = list(dict_columns.itervalues())
+        names = list(dict_columns.keys())
+        values = list(dict_columns.values())
 
         for child in children:
             self.assertEqual(child.tag, 'COLUMN')
@@ -127,6 +129,159 @@ class TestSilverpopApi(unittest.TestCase):
         self.assertIsNotNone(session)
         self.assertEqual(len(session), 32)
 
+    def test_parse_result_with_successful_response(self):
+        result = self.api._parse_result(fixture('test_response.xml'))
+
+        self.assertIsInstance(result, Result)
+        self.assertTrue(result.success)
+        self.assertIsNone(result.error)
+        self.assertEqual(result.recipient_id, '33439394')
+        self.assertIsNone(result.mailing_id)
+        self.assertIsNone(result.session_id)
+
+    def test_parse_result_with_error_response(self):
+        result = self.api._parse_result(fixture('test_error_response.xml'))
+
+        self.assertFalse(result.success)
+        self.assertEqual(result.fault_code, '140')
+        self.assertEqual(result.error, (result.fault_code,
+                                        result.fault_message))
+        self.assertIsNone(result.recipient_id)
+
+    def test_parse_result_with_login_response(self):
+        result = self.api._parse_result(fixture('test_login_response.xml'))
+
+        self.assertTrue(result.success)
+        self.assertEqual(
+            result.session_id, 'DCA89FB13DEAE8DA2B3F87388A8E47A4')
+
+
+class TestBulkOperations(unittest.TestCase):
+    """Bulk methods, with _request replaced so no connection is made."""
+    def setUp(self):
+        self.api = API(
+            username='test',
+            password='test',
+            url='testURL',
+        )
+        self.api._sessionId = 'test'
+        self.api._request = self._request
+
+    def _request(self, data, auth=True):
+        if not etree.iselement(data):
+            data = etree.fromstring(data)
+
+        email = data.find('Body/*/EMAIL')
+        if email is not None and email.text == 'boom@example.com':
+            raise IOError('connection reset')
+
+        if email is not None and email.text == 'fault@example.com':
+            return FakeResponse(fixture('test_error_response.xml'))
+
+        return FakeResponse(fixture('test_response.xml'))
+
+    def test_bulk_add_recipients_ordered(self):
+        specs = [
+            {'list_id': 1, 'created_from': 1,
+             'columns': {'EMAIL': 'user%d@example.com' % i}}
+            for i in range(50)
+        ]
+
+        items = list(self.api.bulk_add_recipients(
+            specs, workers=4, max_in_flight=5))
+
+        self.assertEqual([item.index for item in items], list(range(50)))
+        for item in items:
+            self.assertIsInstance(item, BulkItem)
+            self.assertTrue(item.success)
+            self.assertEqual(item.value[1], '33439394')
+            self.assertIsNone(item.error)
+
+    def test_bulk_remove_collects_errors(self):
+        specs = [
+            (1, 'ok@example.com'),
+            (1, 'fault@example.com'),
+            (1, 'boom@example.com'),
+        ]
+
+        items = list(self.api.bulk_remove(specs, ordered=False))
+        items.sort(key=lambda item: item.index)
+
+        self.assertEqual(len(items), 3)
+        self.assertTrue(items[0].success)
+        self.assertFalse(items[1].success)
+        self.assertEqual(items[1].error[0], '140')
+        self.assertFalse(items[2].success)
+        self.assertIsNone(items[2].value)
+        self.assertIsInstance(items[2].error, IOError)
+
+    def test_bulk_rejects_invalid_pool_size(self):
+        with self.assertRaises(ValueError):
+            self.api.bulk_opt_out([], workers=0)
+
+
+class TestStreamingEnvelope(unittest.TestCase):
+    def setUp(self):
+        self.api = API(
+            username='test',
+            password='test',
+            url='testURL',
+            stream_threshold=100,
+        )
+
+    def test_add_recipient_matches_tree(self):
+        columns = dict(('COLUMN_%d' % i, 'value <%d>' % i) for i in range(500))
+        args = (1, 2, columns)
+        kwargs = {'sync_fields': {'EMAIL': 'a@b.com'}, 'update_if_found': True}
+
+        parts = self.api._add_recipient_parts(*args, **kwargs)
+        envelope = StreamingEnvelope('AddRecipient', parts, chunk_size=1024)
+        chunks = list(envelope)
+
+        self.assertGreater(len(chunks), 10)
+        self.assertEqual(
+            b''.join(chunks),
+            etree.tostring(self.api._build_add_recipient(*args, **kwargs)))
+        # Can be sent again, e.g. on retries
+        self.assertEqual(b''.join(envelope), b''.join(chunks))
+
+    def test_schedule_mailing_matches_tree(self):
+        args = (1, 2, 'Mailing')
+        kwargs = {
+            'substitutions': dict(('S%d' % i, i) for i in range(300)),
+            'supression_list': list(range(300)),
+            'subject': 'Hi',
+        }
+
+        parts = self.api._schedule_mailing_parts(*args, **kwargs)
+
+        self.assertEqual(
+            b''.join(StreamingEnvelope('ScheduleMailing', parts)),
+            etree.tostring(self.api._build_schedule_mailing(*args, **kwargs)))
+
+    def test_large_requests_are_streamed(self):
+        sent = []
+
+        def request(data, auth=True):
+            sent.append(data)
+            return FakeResponse(fixture('test_response.xml'))
+
+        self.api._sessionId = 'test'
+        self.api._request = request
+
+        self.api.add_recipient(1, 1, {'EMAIL': 'a@b.com'})
+        self.api.add_recipient(1, 1, dict(('C%d' % i, i) for i in range(100)))
+
+        self.assertIsInstance(sent[0], RenderedEnvelope)
+        self.assertIsInstance(sent[1], StreamingEnvelope)
+
+    def test_invalid_arguments_fail_before_streaming(self):
+        with self.assertRaises(TypeError):
+            self.api._add_recipient_parts(1, 1, columns=['EMAIL'])
+
+        with self.assertRaises(TypeError):
+            self.api._schedule_mailing_parts(1, 2, 'Mailing', substitutions=['S'])
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+import os
+import subprocess
+import unittest
+from datetime import datetime
+
+import sys
+sys.path.append('..')
+
+from lxml import etree
+
+from silverpy import backends
+from silverpy.api import API
+from silverpy.standin import StandIn
+from silverpy.tests.helpers import fixture
+
+FIXTURES = (
+    'test_response.xml',
+    'test_error_response.xml',
+    'test_login_response.xml',
+    'test_get_lists_response.xml',
+    'test_get_mailing_templates_response.xml',
+    'test_job_status_response.xml',
+)
+
+
+def builds(api):
+    """Serialized envelopes of a few builders."""
+    return [api._prepare_request(root, auth=False)[2] for root in (
+        api._build_login(),
+        api._build_add_recipient(
+            1, 2, {'EMAIL': 'a@b.com', 'Name': 'Zoe & <Co>'},
+            update_if_found=True),
+        api._build_remove_recipient(1, 'a@b.com', {'Key': 'Value'}),
+        api._build_send_mailing(9700, 'a@b.com', {'Name': 'A'}),
+        api._build_schedule_mailing(
+            9700, 1, 'Mailing', substitutions={'TOKEN': 'value'}),
+        api._build_export_list(
+            1, date_start=datetime(2020, 1, 2), columns=['EMAIL']),
+        api._build_get_lists(1, 2),
+    )]
+
+
+class TestBackends(unittest.TestCase):
+    def setUp(self):
+        self.lxml = API('test', 'test', 'testURL')
+
+    def api(self, name):
+        return API('test', 'test', 'testURL', xml_backend=name)
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            backends.get_backend('xerces')
+
+    def test_environment_variable(self):
+        os.environ[backends.ENV_VAR] = 'string'
+        try:
+            self.assertEqual(API('a', 'b', 'c')._xml.name, 'string')
+        finally:
+            del os.environ[backends.ENV_VAR]
+
+    def test_string_envelopes_are_identical(self):
+        self.assertEqual(builds(self.api('string')), builds(self.lxml))
+
+        # lxml escapes carriage returns, ElementTree writes them as is
+        def remove(api):
+            return api._prepare_request(api._build_remove_recipient(
+                1, 'a@b.com', {'Key': 'Value\r'}), auth=False)[2]
+
+        self.assertEqual(remove(self.api('string')), remove(self.lxml))
+
+    def test_etree_envelopes_are_equivalent(self):
+        for ours, expected in zip(builds(self.api('etree')),
+                                  builds(self.lxml)):
+            self.assertEqual(
+                etree.tostring(etree.fromstring(ours)),
+                etree.tostring(etree.fromstring(expected)))
+
+    def test_responses_decode_alike(self):
+        for name in ('etree', 'string'):
+            api = self.api(name)
+
+            for fixture_name in FIXTURES:
+                content = fixture(fixture_name)
+                ours = api._parse_result(content)
+                expected = self.lxml._parse_result(content)
+
+                for attr in expected.__slots__:
+                    self.assertEqual(getattr(ours, attr),
+                                     getattr(expected, attr),
+                                     (name, fixture_name, attr))
+
+            with self.assertRaises(ValueError):
+                api._parse_result(fixture('test_error_malformed_response.xml'))
+
+            self.assertEqual(
+                api._get_session_id(fixture('test_login_response.xml')),
+                'DCA89FB13DEAE8DA2B3F87388A8E47A4')
+
+    def test_import_is_lazy(self):
+        loaded = subprocess.check_output([
+            sys.executable, '-c',
+            'import sys; sys.path.insert(0, ".."); import silverpy; '
+            'import silverpy.scheduler, silverpy.campaigns, '
+            'silverpy.exports, silverpy.journal, silverpy.standin, '
+            'silverpy.transact; '
+            'print(" ".join(sorted(sys.modules)))']).decode().split()
+
+        for module in ('lxml', 'requests', 'ftplib', 'sqlite3', 'aiohttp'):
+            self.assertNotIn(module, loaded)
+
+    def test_string_parser(self):
+        parse = backends.get_backend('string').fromstring
+
+        root = parse(b'<?xml version="1.0"?><A><B>x &amp; y &#233;</B>'
+                     b'<!-- note --><C><![CDATA[<raw> & ]]></C><D/></A>')
+
+        self.assertEqual(root.findtext('B'), u'x & y \xe9')
+        self.assertEqual(root.findtext('C'), u'<raw> & ')
+        self.assertIsNone(root.find('D').text)
+        self.assertEqual([node.tag for node in root], ['B', 'C', 'D'])
+
+        for broken in (b'<A><B></A>', b'<A>', b'', b'<A/><B/>'):
+            with self.assertRaises(ValueError):
+                parse(broken)
+
+    def test_calls_through_every_backend(self):
+        with StandIn() as engage:
+            for name in backends.BACKENDS:
+                api = API('test', 'test', engage.url, xml_backend=name,
+                          stream_threshold=1)
+                self.assertTrue(api.login())
+
+                success, recipient_id, error = api.add_recipient(
+                    1, 1, {'EMAIL': 'a@b.com', 'Name': 'A'})
+                self.assertTrue(success, name)
+                self.assertEqual(api.schedule_mailing(9700, 1, 'M')[0], True)
+                self.assertEqual(api.remove_recipient(1, 'a@b.com'),
+                                 (True, None))
+
+                api.logout()
+                api.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,217 @@
+import threading
+import unittest
+
+import sys
+sys.path.append('..')
+
+from silverpy.api import API, Result, _action
+from silverpy.breakers import (BulkheadFullError, CircuitBreaker,
+                               CircuitOpenError, Guard)
+from silverpy.scheduler import Scheduler
+from silverpy.standin import StandIn
+from silverpy.tests.helpers import FakeClock, FakeResponse, fixture
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.transitions = []
+        self.breaker = CircuitBreaker(
+            'ScheduleMailing', minimum_calls=4, window=10, open_for=30,
+            slow_call_threshold=5, half_open_probes=2,
+            listeners=[lambda *t: self.transitions.append(t)],
+            clock=self.clock)
+
+    def call(self, failed=False, duration=0):
+        probe = self.breaker.allow()
+        self.breaker.record(probe, duration, failed)
+
+    def test_opens_on_failure_rate(self):
+        self.call()
+        self.call()
+        self.call(failed=True)
+        self.assertEqual(self.breaker.state, 'closed')
+
+        self.call(failed=True)
+        self.assertEqual(self.breaker.state, 'open')
+        self.assertEqual(self.transitions,
+                         [('ScheduleMailing', 'closed', 'open')])
+
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.allow()
+        self.assertEqual(self.breaker.snapshot()['rejected'], 1)
+
+    def test_opens_on_slow_calls(self):
+        for _ in range(4):
+            self.call(duration=6)
+
+        self.assertEqual(self.breaker.state, 'open')
+
+    def test_old_calls_leave_the_window(self):
+        self.call(failed=True)
+        self.call(failed=True)
+        self.clock.now += 11
+        self.call()
+        self.call()
+        self.call(failed=True)
+
+        snapshot = self.breaker.snapshot()
+        self.assertEqual(snapshot['state'], 'closed')
+        self.assertEqual(snapshot['calls'], 3)
+        self.assertAlmostEqual(snapshot['failure_rate'], 1 / 3.0)
+
+    def test_half_open_probes_close(self):
+        for _ in range(4):
+            self.call(failed=True)
+
+        self.clock.now += 30
+        first = self.breaker.allow()
+        second = self.breaker.allow()
+        self.assertTrue(first and second)
+        self.assertEqual(self.breaker.state, 'half_open')
+
+        # Only half_open_probes calls at a time
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.allow()
+
+        self.breaker.record(first, 1, False)
+        self.assertEqual(self.breaker.state, 'half_open')
+        self.breaker.record(second, 1, False)
+        self.assertEqual(self.breaker.state, 'closed')
+        self.assertEqual(
+            [t[2] for t in self.transitions], ['open', 'half_open', 'closed'])
+
+    def test_failed_probe_reopens(self):
+        for _ in range(4):
+            self.call(failed=True)
+
+        self.clock.now += 30
+        self.call(duration=6)
+
+        self.assertEqual(self.breaker.state, 'open')
+        self.assertEqual(self.breaker.opened_at, 30)
+        self.assertEqual(
+            self.breaker.snapshot()['transitions']['half_open->open'], 1)
+
+
+class TestGuard(unittest.TestCase):
+    def test_faults_count_only_when_listed(self):
+        guard = Guard(failure_faults=(50,), minimum_calls=2,
+                      clock=FakeClock())
+
+        for _ in range(2):
+            guard.run('AddRecipient', lambda: Result(False, '140', 'Private'))
+        self.assertEqual(guard.breaker('AddRecipient').state, 'closed')
+
+        for _ in range(2):
+            guard.run('AddRecipient', lambda: Result(False, '50', 'Down'))
+        self.assertEqual(guard.breaker('AddRecipient').state, 'open')
+
+    def test_bulkhead_is_per_action(self):
+        guard = Guard(bulkheads={'ScheduleMailing': 1})
+        started, release = threading.Event(), threading.Event()
+
+        def hang():
+            started.set()
+            release.wait()
+            return Result(True)
+
+        thread = threading.Thread(
+            target=guard.run, args=('ScheduleMailing', hang))
+        thread.start()
+        started.wait()
+
+        try:
+            with self.assertRaises(BulkheadFullError):
+                guard.run('ScheduleMailing', lambda: Result(True))
+            self.assertTrue(
+                guard.run('AddRecipient', lambda: Result(True)).success)
+
+            snapshot = guard.snapshot()
+            self.assertEqual(snapshot['ScheduleMailing']['bulkhead'],
+                             {'in_flight': 1, 'max_concurrent': 1,
+                              'rejected': 1})
+            self.assertIsNone(snapshot['AddRecipient']['bulkhead'])
+        finally:
+            release.set()
+            thread.join()
+
+        self.assertEqual(guard.bulkhead('ScheduleMailing').in_flight, 0)
+
+
+class TestApiGuard(unittest.TestCase):
+    def test_open_circuit_fails_fast(self):
+        transitions = []
+        guard = Guard(minimum_calls=2, listeners=[
+            lambda *t: transitions.append(t)])
+        api = API('test', 'test', 'testURL', guard=guard)
+        api._sessionId = 'test'
+        sent = []
+
+        def request(data, auth=True):
+            sent.append(data)
+            if _action(data) == 'ScheduleMailing':
+                raise IOError('Timed out')
+            return FakeResponse(fixture('test_response.xml'))
+
+        api._request = request
+
+        for _ in range(2):
+            with self.assertRaises(IOError):
+                api.schedule_mailing(1, 1, 'Test')
+
+        with self.assertRaises(CircuitOpenError):
+            api.schedule_mailing(1, 1, 'Test')
+        self.assertEqual(len(sent), 2)
+        self.assertEqual(transitions,
+                         [('ScheduleMailing', 'closed', 'open')])
+
+        # Other actions are not affected
+        self.assertTrue(api.add_recipient(1, 1)[0])
+
+    def test_scheduler_waits_are_not_latency(self):
+        guard = Guard(slow_call_threshold=0.05, minimum_calls=5,
+                      bulkheads={'RemoveRecipient': 1})
+
+        with StandIn() as engage:
+            api = API('test', 'test', engage.url, guard=guard,
+                      scheduler=Scheduler(rate=10, burst=1))
+            api.login()
+
+            for _ in range(12):
+                api.remove_recipient(1, 'a@b.com')
+            api.close()
+
+        snapshot = guard.snapshot()['RemoveRecipient']
+        self.assertEqual(snapshot['state'], 'closed')
+        self.assertEqual(snapshot['calls'], 12)
+        self.assertEqual(snapshot['slow_calls'], 0)
+        self.assertEqual(snapshot['bulkhead']['in_flight'], 0)
+
+    def test_open_circuit_skips_the_scheduler(self):
+        waits = []
+
+        class RecordingScheduler(object):
+            def run(self, action, call):
+                waits.append(action)
+                return call()
+
+        guard = Guard(minimum_calls=1)
+        api = API('test', 'test', 'testURL', guard=guard,
+                  scheduler=RecordingScheduler())
+        api._sessionId = 'test'
+
+        def request(data, auth=True):
+            raise IOError('Timed out')
+
+        api._request = request
+
+        with self.assertRaises(IOError):
+            api.schedule_mailing(1, 1, 'Test')
+        with self.assertRaises(CircuitOpenError):
+            api.schedule_mailing(1, 1, 'Test')
+        self.assertEqual(waits, ['ScheduleMailing'])
+
+
+if __name__ == '__main__':
+    unittest.main()
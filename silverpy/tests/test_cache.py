@@ -0,0 +1,117 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import sys
+sys.path.append('..')
+
+from lxml import etree
+
+from silverpy.api import API
+from silverpy.cache import MappingStore, RecipientCache, SQLiteStore
+from silverpy.tests.helpers import FakeClock, FakeResponse, fixture
+
+
+class TestRecipientCache(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock(1000.0)
+        self.cache = RecipientCache(maxsize=2, ttl=60, clock=self.clock)
+
+    def test_lru_eviction(self):
+        self.cache.set(1, 'a@b.com', 'A')
+        self.cache.set(1, 'b@b.com', 'B')
+        self.assertEqual(self.cache.get(1, 'A@B.com'), 'A')
+
+        self.cache.set(1, 'c@b.com', 'C')
+
+        self.assertIsNone(self.cache.get(1, 'b@b.com'))
+        self.assertEqual(self.cache.get('1', 'a@b.com'), 'A')
+        self.assertEqual(len(self.cache), 2)
+        self.assertEqual((self.cache.hits, self.cache.misses), (2, 1))
+
+    def test_ttl_expiry(self):
+        self.cache.set(1, 'a@b.com', 'A')
+        self.clock.now += 61
+
+        self.assertIsNone(self.cache.get(1, 'a@b.com'))
+        self.assertEqual(len(self.cache), 0)
+
+    def test_invalidate(self):
+        self.cache.set(1, 'a@b.com', 'A')
+        self.cache.invalidate(1, 'a@b.com')
+
+        self.assertIsNone(self.cache.get(1, 'a@b.com'))
+
+    def test_mapping_store_is_shared(self):
+        store = MappingStore({})
+        other = RecipientCache(store=store, clock=self.clock)
+        RecipientCache(store=store, clock=self.clock).set(1, 'a@b.com', 'A')
+
+        self.assertEqual(other.get(1, 'a@b.com'), 'A')
+        self.assertEqual(other.hits, 1)
+
+    def test_sqlite_store_is_shared(self):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'recipients.db')
+
+        try:
+            first, second = SQLiteStore(path), SQLiteStore(path)
+            writer = RecipientCache(store=first, clock=self.clock)
+            reader = RecipientCache(store=second, clock=self.clock)
+
+            writer.set(1, 'a@b.com', 'A')
+            self.assertEqual(reader.get(1, 'a@b.com'), 'A')
+
+            writer.invalidate(1, 'a@b.com')
+            reader.clear()
+            self.assertIsNone(reader.get(1, 'a@b.com'))
+
+            first.close()
+            second.close()
+        finally:
+            shutil.rmtree(directory)
+
+
+class TestAPICache(unittest.TestCase):
+    def setUp(self):
+        self.cache = RecipientCache()
+        self.api = API('test', 'test', 'testURL', cache=self.cache)
+        self.api._sessionId = 'test'
+        self.api._request = self._request
+        self.actions = []
+
+    def _request(self, data, auth=True):
+        if not etree.iselement(data):
+            data = etree.fromstring(data)
+
+        self.actions.append(data.find('Body/*').tag)
+        return FakeResponse(fixture('test_response.xml'))
+
+    def test_add_recipient_feeds_lookups(self):
+        self.api.add_recipient(1, 1, {'Email': 'A@b.com'})
+
+        self.assertEqual(
+            self.api.get_recipient_id(1, 'a@b.com'), (True, '33439394', None))
+        self.assertEqual(self.actions, ['AddRecipient'])
+
+    def test_lookup_miss_asks_engage(self):
+        self.assertEqual(
+            self.api.get_recipient_id(1, 'a@b.com'), (True, '33439394', None))
+        self.api.get_recipient_id(1, 'a@b.com')
+
+        self.assertEqual(self.actions, ['SelectRecipientData'])
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1))
+
+    def test_remove_and_opt_out_invalidate(self):
+        self.cache.set(1, 'a@b.com', '1')
+        self.cache.set(1, 'b@b.com', '2')
+
+        self.api.remove_recipient(1, 'a@b.com')
+        self.api.opt_out_recipient(1, 'b@b.com')
+
+        self.assertEqual(len(self.cache), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
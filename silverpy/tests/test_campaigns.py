@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+import collections
+import unittest
+from datetime import datetime
+
+import sys
+sys.path.append('..')
+
+from lxml import etree
+
+from silverpy.api import API
+from silverpy.campaigns import CampaignScheduler, _values
+from silverpy.standin import INJECTED_ERROR, StandIn
+from silverpy.templates import SCHEDULE_MAILING
+from silverpy.tests.helpers import FakeClock
+
+
+class TestScheduleMailingTemplate(unittest.TestCase):
+    def setUp(self):
+        self.api = API('test', 'test', 'testURL')
+
+    def built(self, *args, **kwargs):
+        return etree.tostring(self.api._tree(
+            'ScheduleMailing',
+            self.api._schedule_mailing_parts(*args, **kwargs)))
+
+    def test_matches_builder(self):
+        cases = [
+            {},
+            {'substitutions': {u'N\xe4me': 'A & B', 'n': 3}},
+            {'substitutions': {}, 'subject': '', 'supression_list': []},
+            {'send_html': True, 'send_text': False, 'subject': 'Hi <you>',
+             'from_name': 'Me', 'reply_to': 'me@example.com',
+             'send_time_optimization': 'SEND_24HRS',
+             'supression_list': [1, '2'],
+             'scheduled': datetime(2026, 10, 16, 9, 30),
+             'substitutions': {'a': 'b'}},
+        ]
+
+        for kwargs in cases:
+            values = _values(dict(
+                kwargs, template_id=7, list_id=8, mailing_name='M',
+                visibility=0))
+            self.assertEqual(SCHEDULE_MAILING.render(values),
+                             self.built(7, 8, 'M', 0, **kwargs))
+
+    def test_overrides(self):
+        shared = collections.OrderedDict([('a', '1'), ('b', '2')])
+        campaign = CampaignScheduler(
+            self.api, 7, 'Sale', subject='Sale', substitutions=shared,
+            supression_list=[5])
+
+        self.assertEqual(
+            campaign.render(8),
+            self.built(7, 8, 'Sale', subject='Sale', substitutions=shared,
+                       supression_list=[5]))
+        substitutions = collections.OrderedDict([('b', '3'), ('c', '<4>')])
+        merged = collections.OrderedDict(
+            [('a', '1'), ('b', '3'), ('c', '<4>')])
+        self.assertEqual(
+            campaign.render(9, {'mailing_name': 'Sale 9', 'subject': 'Hi',
+                                'substitutions': substitutions}),
+            self.built(7, 9, 'Sale 9', subject='Hi', substitutions=merged,
+                       supression_list=[5]))
+
+    def test_empty_overrides(self):
+        scheduled = datetime(2026, 10, 16, 9, 30)
+        campaign = CampaignScheduler(
+            self.api, 7, 'Sale', subject='Sale', scheduled=scheduled,
+            substitutions={'a': '1'})
+
+        self.assertEqual(
+            campaign.render(8, {'subject': '', 'scheduled': None,
+                                'substitutions': {}}),
+            self.built(7, 8, 'Sale', substitutions={'a': '1'}))
+        self.assertEqual(
+            campaign.render(9),
+            self.built(7, 9, 'Sale', subject='Sale', scheduled=scheduled,
+                       substitutions={'a': '1'}))
+
+    def test_invalid_values(self):
+        with self.assertRaises(TypeError):
+            CampaignScheduler(self.api, 7, 'Sale', substitutions=[('a', 1)])
+
+        with self.assertRaises(ValueError):
+            CampaignScheduler(self.api, 7, 'Sale',
+                              send_time_optimization='SOON')
+
+
+class TestCampaignScheduler(unittest.TestCase):
+    def setUp(self):
+        self.engage = StandIn().start()
+        self.api = API('test', 'test', self.engage.url)
+        self.api.login()
+
+    def tearDown(self):
+        self.api.close()
+        self.engage.stop()
+
+    def test_schedule(self):
+        campaign = self.api.campaign_scheduler(
+            7, 'Sale', substitutions={'a': '1'}, workers=2)
+
+        schedule = campaign.schedule(
+            [101, (102, {'mailing_name': 'Sale 102'}), 101])
+
+        self.assertEqual(sorted(schedule.mailing_ids), [101, 102])
+        self.assertEqual(schedule.errors, {})
+        self.assertEqual(schedule.skipped, [101])
+        self.assertEqual(self.engage.calls['ScheduleMailing'], 2)
+        self.assertEqual(
+            self.engage.mailings[int(schedule.mailing_ids[102])],
+            'Sale 102')
+
+    def test_errors_are_per_segment(self):
+        campaign = self.api.campaign_scheduler(7, 'Sale')
+        campaign.schedule([101])
+
+        self.engage.error_rate = 1.0
+        schedule = campaign.schedule(
+            [101, 102, (103, {'substitutions': 'a'})])
+
+        self.assertEqual(schedule.mailing_ids, {})
+        self.assertEqual(schedule.skipped, [101])
+        self.assertEqual(schedule.errors[102], INJECTED_ERROR)
+        self.assertIsInstance(schedule.errors[103], TypeError)
+
+        self.engage.error_rate = 0.0
+        schedule = campaign.schedule([102])
+        self.assertEqual(list(schedule.mailing_ids), [102])
+        self.assertEqual(sorted(campaign.mailing_ids), [101, 102])
+
+    def test_rate(self):
+        clock = FakeClock()
+        campaign = self.api.campaign_scheduler(
+            7, 'Sale', rate=2, burst=1, workers=1, clock=clock,
+            sleep=clock.sleep)
+
+        schedule = campaign.schedule(range(101, 105))
+
+        self.assertEqual(len(schedule.mailing_ids), 4)
+        self.assertEqual(len(clock.slept), 3)
+        self.assertAlmostEqual(clock.now, 1.5)
+
+
+if __name__ == '__main__':
+    unittest.main()
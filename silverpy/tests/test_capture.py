@@ -0,0 +1,167 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import sys
+sys.path.append('..')
+
+from silverpy.api import API
+from silverpy.capture import Capture, _Tee, read, scrub
+from silverpy.instrumentation import Instrumentation
+from silverpy.replay import load, parse_args, run
+from silverpy.standin import StandIn
+
+
+class BrokenTransport(object):
+    def post(self, url, headers, data):
+        raise IOError('connection reset')
+
+    def close(self):
+        pass
+
+
+class TestCapture(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'capture.jsonl.gz')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def capture(self, capture_options=None, **options):
+        with StandIn() as engage, \
+                Capture(self.path, **(capture_options or {})) as capture:
+            api = API('user', 's3cret', engage.url, capture=capture,
+                      **options)
+            api.login()
+            api.add_recipient(1, 1, {'EMAIL': 'a@b.com'})
+            api.schedule_mailing(9700, 1, 'Mailing', sync_fields={'A': 'B'})
+            api.add_recipient(1, 1, {'EMAIL': 'b@b.com'})
+            api.logout()
+            api.close()
+
+        return list(read(self.path))
+
+    def test_records(self):
+        records = self.capture(stream_threshold=1)
+
+        self.assertEqual([record['action'] for record in records], [
+            'Login', 'AddRecipient', 'ScheduleMailing', 'AddRecipient',
+            'Logout'])
+
+        for record in records:
+            self.assertEqual(record['status'], 200)
+            if record['action'] != 'Login':
+                self.assertEqual(record['sent'], len(record['body']))
+            self.assertGreater(record['received'], 0)
+            self.assertGreater(record['latency_ms'], 0)
+            self.assertNotIn('s3cret', record['body'])
+            self.assertNotIn('jsessionid', repr(record))
+
+        self.assertIn('<VALUE>a@b.com</VALUE>', records[1]['body'])
+        self.assertIn('<USERNAME>***</USERNAME>', records[0]['body'])
+        self.assertLessEqual(records[0]['ts'], records[-1]['ts'])
+
+    def test_large_streamed_envelopes_are_left_out(self):
+        records = self.capture({'max_body': 100}, stream_threshold=1)
+
+        self.assertEqual([record['action'] for record in records], [
+            'Login', 'AddRecipient', 'ScheduleMailing', 'AddRecipient',
+            'Logout'])
+
+        for record in (records[1], records[3]):
+            self.assertTrue(record['body_omitted'])
+            self.assertNotIn('body', record)
+            self.assertGreater(record['sent'], 100)
+
+        self.assertEqual([record['action'] for record in load(self.path)],
+                         ['ScheduleMailing'])
+
+    def test_streamed_envelopes_are_only_counted_without_bodies(self):
+        tee = _Tee(iter([b'<Envelope><Body><AddRecipient>', b'x' * 1000]))
+
+        self.assertEqual(len(b''.join(tee)), 1030)
+        self.assertEqual(tee.size, 1030)
+        self.assertIsNone(tee.chunks)
+        self.assertEqual(len(tee.head), 256)
+
+    def test_instrumented_calls_are_captured(self):
+        records = self.capture(instrumentation=Instrumentation())
+
+        self.assertEqual(len(records), 5)
+
+    def test_failed_requests(self):
+        with Capture(self.path, bodies=False) as capture:
+            api = API('user', 's3cret', 'testURL', capture=capture,
+                      transport=BrokenTransport())
+
+            with self.assertRaises(IOError):
+                api.login()
+
+        record, = read(self.path)
+        self.assertEqual(record['error'], 'IOError: connection reset'
+                         if sys.version_info[0] == 2 else
+                         'OSError: connection reset')
+        self.assertNotIn('body', record)
+        self.assertIsNone(record['status'])
+
+        with self.assertRaises(ValueError):
+            load(self.path)
+
+    def test_truncated_capture(self):
+        self.capture()
+        with open(self.path, 'rb') as f:
+            data = f.read()
+        records = list(read(self.path))
+
+        # Without the gzip trailer, as left by a process killed on close
+        with open(self.path, 'wb') as f:
+            f.write(data[:-8])
+
+        self.assertEqual(list(read(self.path)), records)
+
+        with open(self.path, 'wb') as f:
+            f.write(data[:len(data) // 2])
+
+        truncated = list(read(self.path))
+        self.assertLess(len(truncated), len(records))
+        self.assertEqual(truncated, records[:len(truncated)])
+
+    def test_load_sorts_by_timestamp(self):
+        self.capture()
+        records = list(read(self.path))
+        records[1]['ts'], records[2]['ts'] = \
+            records[2]['ts'], records[1]['ts']
+
+        with gzip.open(self.path, 'wb') as f:
+            for record in records:
+                f.write((json.dumps(record) + '\n').encode('utf-8'))
+
+        loaded = load(self.path)
+        self.assertEqual([record['ts'] for record in loaded],
+                         sorted(record['ts'] for record in loaded))
+
+    def test_scrub(self):
+        self.assertEqual(
+            scrub(b'<Login><USERNAME>u</USERNAME><PASSWORD/></Login>'),
+            b'<Login><USERNAME>***</USERNAME><PASSWORD>***</PASSWORD>'
+            b'</Login>')
+
+    def test_replay(self):
+        self.capture()
+
+        results = run(parse_args([
+            self.path, '--speed', '0', '--concurrency', '2']))
+
+        self.assertEqual(results['calls'], 3)
+        self.assertEqual(results['errors'], 0)
+        self.assertEqual(sorted(results['actions']),
+                         ['AddRecipient', 'ScheduleMailing'])
+        self.assertEqual(results['actions']['AddRecipient']['calls'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+import unittest
+from datetime import date, datetime
+
+import sys
+sys.path.append('..')
+
+from lxml import etree
+
+from silverpy.api import API
+from silverpy.cache import RecipientCache
+from silverpy.columnar import ColumnBatch, Row
+from silverpy.templates import (
+    ADD_RECIPIENT, Serialized, escape, escape_column,
+)
+from silverpy.tests.helpers import FakeTransport
+
+try:
+    import pandas
+except ImportError:
+    pandas = None
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+COLUMNS = {
+    'EMAIL': ['a@b.com', 'B@b.com', None],
+    'Name': [u'Zo\xeb & Co', 'Bo', float('nan')],
+    'Score': [1, 2.5, 3],
+    'Joined': [date(2020, 1, 2), datetime(2021, 3, 4, 5, 6), None],
+}
+
+
+class TestColumnBatch(unittest.TestCase):
+    def test_escape_column(self):
+        for texts in (['a', 'b'], ['a', None, 'c'], [u'\xe9', None, '<'],
+                      [None], []):
+            self.assertEqual(
+                escape_column(texts),
+                [None if text is None else escape(text) for text in texts])
+
+        with self.assertRaises(ValueError):
+            escape_column(['a', u'null\x00byte'])
+
+    def test_partial_template(self):
+        values = {'list_id': 1, 'created_from': 2, 'allow_html': True}
+        render = ADD_RECIPIENT.partial(values, ('columns',))
+
+        for columns in ({}, {'EMAIL': 'a@b.com', 'Name': 'A & B'}):
+            self.assertEqual(
+                render({'columns': columns}),
+                ADD_RECIPIENT.render(dict(values, columns=columns)))
+
+    def test_fragments_match_dict_rows(self):
+        batch = ColumnBatch(COLUMNS, date_format='%Y-%m-%d', chunk_size=2)
+
+        rows = list(batch.rows())
+
+        self.assertEqual(len(rows), 3)
+        self.assertEqual([email for email, _ in rows],
+                         ['a@b.com', 'B@b.com', None])
+
+        expected = [
+            {'EMAIL': 'a@b.com', 'Name': u'Zo\xeb & Co', 'Score': '1',
+             'Joined': '2020-01-02'},
+            {'EMAIL': 'B@b.com', 'Name': 'Bo', 'Score': '2.5',
+             'Joined': '2021-03-04'},
+            {'Score': '3'},
+        ]
+
+        for (email, fragment), columns in zip(rows, expected):
+            node = etree.fromstring(ADD_RECIPIENT.render({
+                'list_id': 1, 'created_from': 2,
+                'columns': Serialized(fragment)}))
+            self.assertEqual(
+                dict((column.findtext('NAME'), column.findtext('VALUE'))
+                     for column in node.iter('COLUMN')),
+                columns)
+
+    def test_without_email(self):
+        batch = ColumnBatch({'Mail': ['a@b.com'], 'Name': ['A']},
+                            email_column='Mail')
+
+        (email, fragment), = batch.rows(with_email=False)
+
+        self.assertEqual(email, 'a@b.com')
+        self.assertEqual(fragment, b'<COLUMN><NAME>Name</NAME>'
+                                   b'<VALUE>A</VALUE></COLUMN>')
+
+    def test_invalid_batches(self):
+        with self.assertRaises(TypeError):
+            ColumnBatch([{'EMAIL': 'a@b.com'}])
+
+        with self.assertRaises(ValueError):
+            ColumnBatch({'EMAIL': ['a'], 'Name': []})
+
+        with self.assertRaises(ValueError):
+            ColumnBatch({'EMAIL': ['a']}, email_column='Mail')
+
+    @unittest.skipIf(pandas is None, 'pandas is not installed')
+    def test_data_frame(self):
+        frame = pandas.DataFrame({
+            'EMAIL': ['a@b.com', None],
+            'Score': [1.5, float('nan')],
+            'Joined': pandas.to_datetime(['2020-01-02', None]),
+        })
+
+        rows = list(ColumnBatch(frame).rows())
+
+        self.assertEqual(rows[0][1], (
+            b'<COLUMN><NAME>EMAIL</NAME><VALUE>a@b.com</VALUE></COLUMN>'
+            b'<COLUMN><NAME>Score</NAME><VALUE>1.5</VALUE></COLUMN>'
+            b'<COLUMN><NAME>Joined</NAME>'
+            b'<VALUE>01/02/2020</VALUE></COLUMN>'))
+        self.assertEqual(rows[1], (None, b''))
+
+    @unittest.skipIf(numpy is None, 'NumPy is not installed')
+    def test_structured_array(self):
+        array = numpy.array([('a@b.com', 1)], dtype=[
+            ('EMAIL', 'U20'), ('Score', 'i4')])
+
+        self.assertEqual(list(ColumnBatch(array).rows()), [('a@b.com', (
+            b'<COLUMN><NAME>EMAIL</NAME><VALUE>a@b.com</VALUE></COLUMN>'
+            b'<COLUMN><NAME>Score</NAME><VALUE>1</VALUE></COLUMN>'))])
+
+
+class TestBulkColumns(unittest.TestCase):
+    def setUp(self):
+        self.transport = FakeTransport()
+        self.cache = RecipientCache()
+        self.api = API('test', 'test', 'testURL', transport=self.transport,
+                       cache=self.cache)
+        self.api._sessionId = 'test'
+
+    def test_add_recipients(self):
+        batch = {'EMAIL': ['a@b.com', 'b@b.com'], 'Name': ['A', 'B']}
+
+        items = list(self.api.bulk_add_recipient_columns(
+            1, 2, batch, workers=2, update_if_found=True))
+
+        self.assertEqual([item.index for item in items], [0, 1])
+        self.assertTrue(all(item.success for item in items))
+        self.assertIsInstance(items[0].spec, Row)
+        self.assertEqual(items[0].spec.email, 'a@b.com')
+
+        sent = sorted(self.transport.sent)
+        expected = sorted(ADD_RECIPIENT.render({
+            'list_id': 1, 'created_from': 2, 'update_if_found': True,
+            'columns': {'EMAIL': email, 'Name': name}})
+            for email, name in zip(batch['EMAIL'], batch['Name']))
+        self.assertEqual(sent, expected)
+
+        self.assertEqual(self.cache.get(1, 'a@b.com'), '33439394')
+
+    def test_opt_out_and_remove(self):
+        self.cache.set(1, 'a@b.com', '7')
+        batch = {'Email': ['a@b.com', None], 'Reason': ['spam', 'x']}
+
+        items = list(self.api.bulk_opt_out_columns(1, batch))
+
+        self.assertTrue(items[0].success)
+        self.assertFalse(items[1].success)
+        self.assertIsInstance(items[1].error, ValueError)
+        self.assertIsNone(self.cache.get(1, 'a@b.com'))
+        self.assertEqual(self.transport.sent, [
+            b'<Envelope><Body><OptOutRecipient><LIST_ID>1</LIST_ID>'
+            b'<EMAIL>a@b.com</EMAIL><COLUMN><NAME>Reason</NAME>'
+            b'<VALUE>spam</VALUE></COLUMN></OptOutRecipient></Body>'
+            b'</Envelope>'])
+
+        items = list(self.api.bulk_remove_columns(1, {'EMAIL': ['a@b.com']}))
+
+        self.assertTrue(items[0].success)
+        self.assertEqual(
+            self.transport.sent[-1],
+            etree.tostring(
+                self.api._build_remove_recipient(1, 'a@b.com')))
+
+    def test_email_column_is_required(self):
+        with self.assertRaises(ValueError):
+            self.api.bulk_remove_columns(1, {'Name': ['A']})
+
+
+if __name__ == '__main__':
+    unittest.main()
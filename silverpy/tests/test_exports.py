@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+import io
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from datetime import datetime
+
+import sys
+sys.path.append('..')
+
+from silverpy.api import API, JOB_COMPLETE, JOB_ERROR, SilverpopError
+from silverpy.exports import (
+    ExportManager,
+    JobManager,
+    LocalDirectoryDownloader,
+    read_rows,
+)
+from silverpy.tests.helpers import FakeResponse, fixture
+
+
+class FakeJobsAPI(object):
+    """Reports each job as running a number of times before its status."""
+    def __init__(self, jobs):
+        self.jobs = dict(jobs)
+        self.polls = {}
+        self.lock = threading.Lock()
+
+    def get_job_status(self, job_id):
+        with self.lock:
+            self.polls[job_id] = self.polls.get(job_id, 0) + 1
+            running, status = self.jobs[job_id]
+
+            if self.polls[job_id] <= running:
+                return (True, 'RUNNING', None)
+
+        if status == 'FAULT':
+            return (False, None, ('140', 'No such job'))
+
+        return (True, status, None)
+
+
+class TestJobManager(unittest.TestCase):
+    def test_polls_many_jobs(self):
+        api = FakeJobsAPI({
+            1: (3, JOB_COMPLETE),
+            2: (0, JOB_ERROR),
+            3: (1, 'FAULT'),
+        })
+        manager = JobManager(api, interval=0.001, max_interval=0.01)
+
+        try:
+            first = manager.watch(1)
+            second = manager.watch(2)
+            third = manager.watch(3)
+
+            self.assertEqual(first.result(5), JOB_COMPLETE)
+            self.assertEqual(second.result(5), JOB_ERROR)
+            with self.assertRaises(SilverpopError):
+                third.result(5)
+        finally:
+            manager.close()
+
+        self.assertEqual(api.polls, {1: 4, 2: 1, 3: 2})
+
+    def test_cancelled_job_leaves_the_others(self):
+        api = FakeJobsAPI({1: (2, JOB_COMPLETE), 2: (5, JOB_COMPLETE)})
+        manager = JobManager(api, interval=0.01, max_interval=0.02)
+
+        try:
+            cancelled = manager.watch(1)
+            other = manager.watch(2)
+            self.assertTrue(cancelled.cancel())
+
+            self.assertEqual(other.result(5), JOB_COMPLETE)
+        finally:
+            manager.close()
+
+        self.assertLessEqual(api.polls.get(1, 0), 1)
+
+    def test_close_cancels_pending_jobs(self):
+        manager = JobManager(FakeJobsAPI({1: (1000, JOB_COMPLETE)}),
+                             interval=10)
+        future = manager.watch(1)
+        manager.close()
+
+        self.assertTrue(future.cancelled())
+        with self.assertRaises(RuntimeError):
+            manager.watch(2)
+
+
+class TestReadRows(unittest.TestCase):
+    def test_read_rows(self):
+        data = u'﻿EMAIL,Name\r\na@example.com,Jos\xe9\r\n'
+        rows = list(read_rows(io.BytesIO(data.encode('utf-8'))))
+
+        self.assertEqual(rows, [{'EMAIL': 'a@example.com', 'Name': u'Jos\xe9'}])
+
+
+class TestExportManager(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.requests = []
+        self.api = API('test', 'test', 'testURL')
+        self.api._sessionId = 'test'
+        self.api._request = self._request
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _request(self, data, auth=True):
+        self.requests.append(data)
+
+        if data.find('Body/ExportList') is not None:
+            return FakeResponse(fixture('test_export_list_response.xml'))
+
+        content = fixture('test_job_status_response.xml')
+        if len(self.requests) < 4:
+            content = content.replace(b'COMPLETE', b'RUNNING')
+
+        return FakeResponse(content)
+
+    def test_export_rows(self):
+        with open(os.path.join(self.directory, 'Contacts_123.CSV'), 'wb') as f:
+            f.write(b'EMAIL,Name\r\n')
+            for i in range(10):
+                f.write(b'user%d@example.com,User %d\r\n' % (i, i))
+
+        manager = ExportManager(
+            self.api, LocalDirectoryDownloader(self.directory),
+            JobManager(self.api, interval=0.001))
+
+        try:
+            export = manager.export(
+                123, columns=['EMAIL', 'Name'],
+                date_start=datetime(2017, 1, 31, 8, 0, 0))
+            rows = list(export.rows(timeout=5))
+        finally:
+            manager.close()
+
+        self.assertEqual(export.job_id, '499600')
+        self.assertEqual(len(rows), 10)
+        self.assertEqual(rows[3]['Name'], 'User 3')
+
+        export_list = self.requests[0].find('Body/ExportList')
+        self.assertEqual(export_list.findtext('LIST_ID'), '123')
+        self.assertEqual(export_list.findtext('DATE_START'),
+                         '01/31/2017 08:00:00')
+        self.assertEqual(
+            [c.text for c in export_list.findall('EXPORT_COLUMNS/COLUMN')],
+            ['EMAIL', 'Name'])
+
+
+if __name__ == '__main__':
+    unittest.main()
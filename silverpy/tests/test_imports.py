@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+import csv
+import os
+import shutil
+import tempfile
+import unittest
+
+import sys
+sys.path.append('..')
+
+from lxml import etree
+
+from silverpy.api import API, JOB_COMPLETE
+from silverpy import backends, imports
+from silverpy.tests.helpers import FakeResponse, fixture
+
+
+class TestImportFiles(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'data.csv')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_write_csv(self):
+        rows = iter([
+            {'EMAIL': 'a@example.com', 'Name': 'Ann'},
+            ('b@example.com', None),
+        ])
+
+        count = imports.write_csv(self.path, rows, ['EMAIL', 'Name'])
+
+        with open(self.path) as f:
+            lines = list(csv.reader(f))
+
+        self.assertEqual(count, 2)
+        self.assertEqual(lines, [
+            ['EMAIL', 'Name'],
+            ['a@example.com', 'Ann'],
+            ['b@example.com', ''],
+        ])
+
+    def test_write_csv_rejects_short_rows(self):
+        with self.assertRaises(ValueError):
+            imports.write_csv(self.path, [('a@example.com',)], ['EMAIL', 'X'])
+
+    def test_build_mapping(self):
+        root = imports.build_mapping(
+            123, ['EMAIL', 'Name'], sync_fields={'EMAIL': 'a@example.com'})
+
+        self.assertEqual(root.findtext('LIST_INFO/LIST_ID'), '123')
+        self.assertEqual(root.findtext('LIST_INFO/ACTION'), 'ADD_AND_UPDATE')
+        self.assertEqual(root.findtext('SYNC_FIELDS/SYNC_FIELD/NAME'), 'EMAIL')
+
+        columns = root.findall('MAPPING/COLUMN')
+        self.assertEqual([c.findtext('INDEX') for c in columns], ['1', '2'])
+        self.assertEqual([c.findtext('NAME') for c in columns],
+                         ['EMAIL', 'Name'])
+
+    def test_write_mapping_with_every_backend(self):
+        for name in backends.BACKENDS:
+            imports.write_mapping(
+                self.path, 7, ['EMAIL', 'Name'], ['EMAIL'],
+                backend=backends.get_backend(name))
+
+            mapping = etree.parse(self.path)
+            self.assertEqual(mapping.findtext('LIST_INFO/LIST_ID'), '7', name)
+            self.assertEqual(
+                mapping.findtext('SYNC_FIELDS/SYNC_FIELD/NAME'), 'EMAIL')
+            self.assertEqual(len(mapping.findall('MAPPING/COLUMN')), 2)
+
+    def test_build_mapping_validates(self):
+        with self.assertRaises(ValueError):
+            imports.build_mapping(1, ['EMAIL'], action='MERGE')
+
+        with self.assertRaises(ValueError):
+            imports.build_mapping(1, ['EMAIL'], sync_fields=['ID'])
+
+
+class TestBulkImport(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.requests = []
+        self.api = API('test', 'test', 'testURL')
+        self.api._sessionId = 'test'
+        self.api._request = self._request
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _request(self, data, auth=True):
+        self.requests.append(data)
+
+        if data.find('Body/ImportList') is not None:
+            return FakeResponse(fixture('test_import_list_response.xml'))
+
+        return FakeResponse(fixture('test_job_status_response.xml'))
+
+    def test_bulk_import(self):
+        rows = ({'EMAIL': 'user%d@example.com' % i} for i in range(100))
+        uploader = imports.LocalDirectoryUploader(self.directory)
+
+        job_id, status = self.api.bulk_import(
+            5, rows, ['EMAIL'], uploader, sync_fields=['EMAIL'])
+
+        self.assertEqual(job_id, '72649')
+        self.assertEqual(status, JOB_COMPLETE)
+
+        import_list = self.requests[0].find('Body/ImportList')
+        source = import_list.findtext('SOURCE_FILE')
+        map_file = import_list.findtext('MAP_FILE')
+
+        with open(os.path.join(self.directory, source)) as f:
+            self.assertEqual(len(f.readlines()), 101)
+
+        mapping = etree.parse(os.path.join(self.directory, map_file))
+        self.assertEqual(mapping.findtext('LIST_INFO/LIST_ID'), '5')
+
+        job_status = self.requests[1].find('Body/GetJobStatus')
+        self.assertEqual(job_status.findtext('JOB_ID'), '72649')
+
+
+if __name__ == '__main__':
+    unittest.main()
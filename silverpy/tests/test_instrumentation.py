@@ -0,0 +1,196 @@
+import logging
+import time
+import unittest
+
+import sys
+sys.path.append('..')
+
+from silverpy.api import API
+from silverpy.cache import RecipientCache
+from silverpy.instrumentation import (
+    PHASES, Histogram, Instrumentation, Metrics,
+)
+from silverpy.tests.helpers import FakeResponse, FakeTransport, fixture
+
+
+class BreakingTransport(FakeTransport):
+    """Fails the requests of broken@ and expires the session of the next
+    expired@ ones.
+    """
+    def __init__(self):
+        FakeTransport.__init__(
+            self, {'RemoveRecipient': 'test_error_response.xml'})
+        self.expired = 0
+
+    def post(self, url, headers, data):
+        if not isinstance(data, bytes):
+            data = b''.join(data)
+
+        if b'broken@' in data:
+            self.sent.append(data)
+            raise IOError('connection reset')
+
+        if b'expired@' in data and self.expired:
+            self.sent.append(data)
+            self.expired -= 1
+            return FakeResponse(fixture('test_session_expired_response.xml'))
+
+        return FakeTransport.post(self, url, headers, data)
+
+
+class RecordingHandler(logging.Handler):
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+class TestInstrumentation(unittest.TestCase):
+    def setUp(self):
+        self.events = []
+        self.metrics = Metrics()
+        self.instrumentation = Instrumentation(
+            [self.events.append, self.metrics])
+        self.transport = BreakingTransport()
+        self.api = API('test', 'test', 'testURL', transport=self.transport,
+                       instrumentation=self.instrumentation)
+        self.api._sessionId = 'test'
+
+    def test_call_event(self):
+        self.api.add_recipient(1, 1, {'EMAIL': 'a@b.com'})
+
+        event, = self.events
+        self.assertEqual(event.action, 'AddRecipient')
+        self.assertTrue(event.success)
+        self.assertEqual(event.requests, 1)
+        self.assertEqual(event.bytes_sent, len(self.transport.sent[0]))
+        self.assertEqual(
+            event.bytes_received, len(fixture('test_response.xml')))
+
+        self.assertEqual(sorted(event.phases), sorted(PHASES))
+        self.assertTrue(all(ns >= 0 for ns in event.phases.values()))
+        self.assertGreater(event.phases['request'], 0)
+        self.assertGreaterEqual(
+            event.duration_ns, sum(event.phases.values()))
+
+    def test_streamed_bytes_are_counted(self):
+        self.api._stream_threshold = 1
+        self.api.add_recipient(1, 1, {'EMAIL': 'a@b.com'})
+
+        self.assertEqual(
+            self.events[0].bytes_sent, len(self.transport.sent[0]))
+
+    def test_streamed_serialization(self):
+        prepare = self.api._prepare_request
+
+        def slow(*args):
+            url, headers, data = prepare(*args)
+
+            def chunks():
+                time.sleep(0.05)
+                yield data
+
+            return url, headers, chunks()
+
+        self.api._prepare_request = slow
+        self.api.send_mailing(1, 'a@b.com')
+
+        event, = self.events
+        self.assertGreaterEqual(event.phases['serialize'], 0.05e9)
+        self.assertLess(event.phases['request'], 0.05e9)
+
+    def assertNextBuildIsZero(self):
+        time.sleep(0.05)
+        self.api.login()
+
+        event = self.events.pop()
+        self.assertEqual(event.action, 'Login')
+        self.assertEqual(event.phases['build'], 0)
+
+    def test_build_mark_of_raising_methods(self):
+        with self.assertRaises(ValueError):
+            self.api.opt_out_recipient(1)
+
+        self.assertNextBuildIsZero()
+
+    def test_build_mark_of_methods_returning_early(self):
+        self.api._cache = RecipientCache()
+        self.api._cache.set(1, 'a@b.com', '42')
+
+        self.assertEqual(self.api.get_recipient_id(1, 'a@b.com'),
+                         (True, '42', None))
+        self.assertEqual(self.events, [])
+        self.assertNextBuildIsZero()
+
+    def test_sessions(self):
+        self.transport.expired = 1
+
+        self.api.login()
+        self.api.add_recipient(1, 1, {'EMAIL': 'expired@b.com'})
+        self.api.logout()
+
+        self.assertEqual([event.action for event in self.events],
+                         ['Login', 'Login', 'AddRecipient', 'Logout'])
+        self.assertTrue(all(event.success for event in self.events))
+        self.assertEqual([event.requests for event in self.events],
+                         [1, 1, 2, 1])
+        self.assertEqual(self.metrics.snapshot()['Login']['calls'], 2)
+
+    def test_metrics(self):
+        self.api.send_mailing(1, 'a@b.com')
+        self.api.send_mailing(1, 'b@b.com')
+        self.api.remove_recipient(1, 'a@b.com')
+
+        with self.assertRaises(IOError):
+            self.api.send_mailing(1, 'broken@b.com')
+
+        self.assertEqual(self.events[-1].error.args, ('connection reset',))
+
+        snapshot = self.metrics.snapshot()
+        self.assertEqual(snapshot['SendMailing']['calls'], 3)
+        self.assertEqual(snapshot['SendMailing']['errors'], 1)
+        self.assertEqual(snapshot['RemoveRecipient']['failures'], 1)
+        self.assertEqual(snapshot['RemoveRecipient']['faults'], {'140': 1})
+        self.assertEqual(sum(snapshot['SendMailing']['latency_counts']), 3)
+
+    def test_slow_calls_are_logged(self):
+        self.instrumentation.slow_call_threshold = 0
+        handler = RecordingHandler()
+        logger = logging.getLogger('silverpy.instrumentation')
+        logger.addHandler(handler)
+
+        try:
+            self.api.send_mailing(1, 'a@b.com')
+        finally:
+            logger.removeHandler(handler)
+
+        self.assertEqual(len(handler.messages), 1)
+        self.assertTrue(handler.messages[0].startswith('Slow SendMailing'))
+
+    def test_failing_listener(self):
+        def listener(event):
+            raise ValueError('broken listener')
+
+        self.instrumentation.add_listener(listener)
+
+        self.assertEqual(self.api.send_mailing(1, 'a@b.com'), (True, None))
+        self.assertEqual(len(self.events), 1)
+
+
+class TestHistogram(unittest.TestCase):
+    def test_percentile(self):
+        histogram = Histogram()
+        for ms in (0.5, 3, 3, 4, 80):
+            histogram.add(int(ms * 1e6))
+
+        self.assertEqual(histogram.percentile(0.5), 5)
+        self.assertEqual(histogram.percentile(0.99), 100)
+
+        histogram.add(int(60e9))
+        self.assertIsNone(histogram.percentile(1))
+
+
+if __name__ == '__main__':
+    unittest.main()
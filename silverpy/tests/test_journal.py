@@ -0,0 +1,125 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+import sys
+sys.path.append('..')
+
+from lxml import etree
+
+from silverpy.api import API
+from silverpy.journal import DONE, FAILED, Journal
+from silverpy.tests.helpers import FakeResponse, fixture
+
+
+class TestJournal(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'journal.db')
+
+        self.api = API('test', 'test', 'testURL')
+        self.api._sessionId = 'test'
+        self.api._request = self._request
+        self.sent = []
+        self.failing = set(['fault@example.com', 'boom@example.com'])
+
+        self.specs = [
+            {'list_id': 1, 'created_from': 1,
+             'columns': {'EMAIL': 'user%d@example.com' % i}}
+            for i in range(20)
+        ]
+        self.specs[3]['columns']['EMAIL'] = 'fault@example.com'
+        self.specs[7]['columns']['EMAIL'] = 'boom@example.com'
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _request(self, data, auth=True):
+        email = etree.fromstring(data).find('Body/*/COLUMN/VALUE').text
+        self.sent.append(email)
+
+        if email in self.failing and email.startswith('boom'):
+            raise IOError('connection reset')
+
+        if email in self.failing:
+            return FakeResponse(fixture('test_error_response.xml'))
+
+        return FakeResponse(fixture('test_response.xml'))
+
+    def test_outcomes_are_recorded(self):
+        journal = Journal(self.path, 'sync')
+        items = list(self.api.bulk_add_recipients(
+            self.specs, workers=4, journal=journal))
+        journal.close()
+
+        self.assertEqual(len(items), 20)
+
+        journal = Journal(self.path, 'sync')
+        self.assertEqual(journal.method, 'add_recipient')
+        self.assertEqual(journal.counts(), {DONE: 18, FAILED: 2})
+        self.assertEqual(journal.outcome(0), (DONE, '33439394', None))
+        self.assertEqual(journal.outcome(3)[2][0], '140')
+        self.assertIn('connection reset', journal.outcome(7)[2][1])
+        self.assertIsNone(journal.outcome(20))
+        journal.close()
+
+    def test_resume_skips_finished(self):
+        journal = Journal(self.path, 'sync')
+        items = self.api.bulk_add_recipients(
+            self.specs, workers=2, max_in_flight=2, journal=journal)
+        for _ in range(10):
+            next(items)
+        # Dies halfway
+        items.close()
+        journal.close()
+
+        del self.sent[:]
+        journal = Journal(self.path, 'sync')
+        resumed = list(self.api.bulk_add_recipients(
+            self.specs, workers=2, journal=journal))
+
+        self.assertEqual([item.index for item in resumed], list(range(10, 20)))
+        self.assertEqual(len(self.sent), 10)
+        self.assertEqual(journal.counts(), {DONE: 18, FAILED: 2})
+        journal.close()
+
+    def test_replay_failed_only(self):
+        journal = Journal(self.path, 'sync')
+        list(self.api.bulk_add_recipients(self.specs, journal=journal))
+
+        del self.sent[:]
+        self.failing = set()
+        items = list(self.api.bulk_replay(journal))
+
+        self.assertEqual([item.index for item in items], [3, 7])
+        self.assertEqual(
+            sorted(self.sent), ['boom@example.com', 'fault@example.com'])
+        self.assertEqual(journal.counts(), {DONE: 20})
+        journal.close()
+
+        db = sqlite3.connect(self.path)
+        self.assertEqual(db.execute(
+            'SELECT attempts FROM operations WHERE idx = 3').fetchone(), (2,))
+        self.assertEqual(
+            db.execute('PRAGMA journal_mode').fetchone()[0], 'wal')
+        db.close()
+
+    def test_job_runs_a_single_method(self):
+        journal = Journal(self.path, 'sync')
+        list(self.api.bulk_add_recipients(self.specs[:1], journal=journal))
+
+        with self.assertRaises(ValueError):
+            list(self.api.bulk_remove([(1, 'a@b.com')], journal=journal))
+
+        other = Journal(self.path, 'other')
+        with self.assertRaises(ValueError):
+            self.api.bulk_replay(other)
+
+        other.close()
+        journal.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
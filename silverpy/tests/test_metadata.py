@@ -0,0 +1,216 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import sys
+sys.path.append('..')
+
+from lxml import etree
+
+from silverpy.api import API
+from silverpy.metadata import (
+    LIST_TYPE_CONTACT_LIST, LIST_TYPE_DATABASE, ListInfo, Metadata,
+)
+from silverpy.tests.helpers import FakeClock, FakeResponse, fixture
+
+
+class TestMetadata(unittest.TestCase):
+    def setUp(self):
+        self.api = API('test', 'test', 'testURL')
+        self.api._sessionId = 'test'
+        self.api._request = self._request
+        self.clock = FakeClock(1000.0)
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def _request(self, data, auth=True):
+        if not etree.iselement(data):
+            data = etree.fromstring(data)
+
+        action = data.find('Body/*')
+        with self.lock:
+            self.requests.append(action)
+
+        if action.tag == 'GetLists':
+            return FakeResponse(fixture('test_get_lists_response.xml'))
+
+        if action.tag == 'GetMailingTemplates':
+            return FakeResponse(
+                fixture('test_get_mailing_templates_response.xml'))
+
+        if action.tag == 'CreateContactList':
+            return FakeResponse(
+                b'<Envelope><Body><RESULT><SUCCESS>TRUE</SUCCESS>'
+                b'<CONTACT_LIST_ID>5000</CONTACT_LIST_ID>'
+                b'</RESULT></Body></Envelope>')
+
+        return FakeResponse(
+            b'<Envelope><Body><RESULT><SUCCESS>TRUE</SUCCESS>'
+            b'<MAILING_ID>7000</MAILING_ID></RESULT></Body></Envelope>')
+
+    def actions(self):
+        return [action.tag for action in self.requests]
+
+    def metadata(self, **kwargs):
+        kwargs.setdefault('background', False)
+        return Metadata(self.api, clock=self.clock, **kwargs)
+
+    def test_get_lists_records(self):
+        success, lists, error = self.api.get_lists(1, 2)
+
+        self.assertTrue(success)
+        self.assertEqual([record['NAME'] for record in lists],
+                         ['Customers', 'Recent buyers', 'Newsletter'])
+        self.assertEqual(lists[0]['SIZE'], '1620')
+
+    def test_lookups_load_once(self):
+        metadata = self.metadata()
+
+        self.assertEqual(metadata.database('Customers').id, '289032')
+        self.assertEqual(metadata.query('Recent buyers').id, '289033')
+        self.assertEqual(metadata.contact_list('Newsletter').id, '289034')
+        self.assertEqual(metadata.list(289034).type, LIST_TYPE_CONTACT_LIST)
+        self.assertEqual(metadata.template_id('Welcome'), '9700')
+        self.assertIsNone(metadata.database('Newsletter'))
+
+        with self.assertRaises(KeyError):
+            metadata.template_id('Goodbye')
+
+        # GetLists twice and GetMailingTemplates, per visibility
+        self.assertEqual(len(self.requests), 6)
+
+    def test_refresh_after_ttl(self):
+        metadata = self.metadata(ttl=60)
+        metadata.database('Customers')
+
+        self.clock.now += 30
+        metadata.database('Customers')
+        self.assertEqual(len(self.requests), 6)
+
+        self.clock.now += 31
+        metadata.database('Customers')
+        self.assertEqual(len(self.requests), 12)
+
+    def test_background_refresh(self):
+        metadata = Metadata(self.api, ttl=0.01)
+        metadata.database('Customers')
+
+        for _ in range(100):
+            if len(self.requests) > 6:
+                break
+            threading.Event().wait(0.01)
+
+        metadata.close()
+        self.assertGreater(len(self.requests), 6)
+
+    def test_failed_refreshes_back_off(self):
+        clock = self.clock
+
+        class Stopped(object):
+            waits = []
+
+            def wait(self, seconds):
+                self.waits.append(seconds)
+                clock.now += seconds
+                return len(self.waits) > 3
+
+        metadata = self.metadata(ttl=300)
+        metadata.database('Customers')
+        metadata._stopped = Stopped()
+
+        def refresh():
+            raise IOError('Engage is down')
+
+        metadata.refresh = refresh
+        metadata._run()
+
+        self.assertEqual(Stopped.waits, [300, 60, 60, 60])
+
+    def test_index_shared_through_file(self):
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, 'metadata.json')
+
+        try:
+            self.metadata(path=path).database('Customers')
+            del self.requests[:]
+
+            other = self.metadata(path=path)
+            self.assertEqual(other.template('Welcome').subject,
+                             'Welcome aboard')
+            self.assertEqual(self.requests, [])
+        finally:
+            shutil.rmtree(directory)
+
+    def test_get_or_create_contact_list(self):
+        self.api.metadata = self.metadata()
+
+        self.assertEqual(
+            self.api.create_contact_list(289032, 'Newsletter',
+                                         exists_ok=True),
+            (True, '289034', None))
+        self.assertNotIn('CreateContactList', self.actions())
+
+        threads = [
+            threading.Thread(target=self.api.create_contact_list,
+                             args=(289032, 'VIP'),
+                             kwargs={'exists_ok': True})
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.actions().count('CreateContactList'), 1)
+        self.assertEqual(self.api.metadata.contact_list('VIP').id, '5000')
+        self.assertEqual(
+            self.api.metadata.contact_list('VIP', 289032).id, '5000')
+
+    def test_created_contact_lists_survive_refreshes(self):
+        metadata = self.metadata()
+        metadata.get_or_create_contact_list(289032, 'VIP')
+
+        # GetLists answers don't have it yet
+        metadata.refresh()
+
+        self.assertEqual(
+            metadata.get_or_create_contact_list(289032, 'VIP'),
+            (True, '5000', None))
+        self.assertEqual(self.actions().count('CreateContactList'), 1)
+
+    def test_contact_lists_are_looked_up_per_database(self):
+        metadata = self.api.metadata = self.metadata()
+        index = metadata._get_index()
+        index.add_list(ListInfo('289035', 'Prospects', LIST_TYPE_DATABASE,
+                                '1', 'Shared'))
+
+        self.assertIsNone(metadata.contact_list('Newsletter', 289035))
+        self.assertEqual(
+            self.api.create_contact_list(289035, 'Newsletter',
+                                         exists_ok=True),
+            (True, '5000', None))
+        self.assertEqual(self.actions().count('CreateContactList'), 1)
+        self.assertEqual(metadata.contact_list('Newsletter', 289032).id,
+                         '289034')
+        self.assertEqual(metadata.contact_list('Newsletter', 289035).id,
+                         '5000')
+
+        with self.assertRaises(KeyError):
+            metadata.get_or_create_contact_list(289033, 'Newsletter')
+
+    def test_schedule_mailing_resolves_template_names(self):
+        self.api.metadata = self.metadata()
+
+        self.assertEqual(
+            self.api.schedule_mailing('Welcome', 289032, 'Hello'),
+            (True, '7000'))
+
+        schedule = self.requests[-1]
+        self.assertEqual(schedule.tag, 'ScheduleMailing')
+        self.assertEqual(schedule.findtext('TEMPLATE_ID'), '9700')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,136 @@
+import unittest
+
+import sys
+sys.path.append('..')
+
+import requests
+
+from silverpy.api import API, Result
+from silverpy.scheduler import AIMDLimiter, Scheduler, TokenBucket
+from silverpy.tests.helpers import FakeClock, FakeResponse, fixture
+
+
+def http_error(status):
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError(response=response)
+
+
+class TestTokenBucket(unittest.TestCase):
+    def test_bursts_then_throttles(self):
+        clock = FakeClock()
+        bucket = TokenBucket(10, burst=2, clock=clock, sleep=clock.sleep)
+
+        self.assertEqual(bucket.acquire(), 0)
+        self.assertEqual(bucket.acquire(), 0)
+        self.assertAlmostEqual(bucket.acquire(), 0.1)
+
+        clock.now += 1
+        self.assertEqual(bucket.acquire(), 0)
+
+
+class TestAIMDLimiter(unittest.TestCase):
+    def test_additive_increase_multiplicative_decrease(self):
+        clock = FakeClock()
+        limiter = AIMDLimiter(initial=4, maximum=8, clock=clock)
+
+        for i in range(8):
+            limiter.release(limiter.acquire())
+        self.assertEqual(limiter.limit, 5)
+
+        started = limiter.acquire()
+        other = limiter.acquire()
+        clock.now += 1
+        limiter.release(started, congested=True)
+        self.assertEqual(limiter.limit, 2)
+
+        # Started before the decrease, so it doesn't shrink the limit again
+        limiter.release(other, congested=True)
+        self.assertEqual(limiter.limit, 2)
+        self.assertEqual(limiter.in_flight, 0)
+
+    def test_latency_target(self):
+        clock = FakeClock()
+        limiter = AIMDLimiter(initial=4, latency_target=0.5, clock=clock)
+
+        started = limiter.acquire()
+        clock.now += 1
+        limiter.release(started)
+
+        self.assertEqual(limiter.limit, 2)
+
+
+class TestScheduler(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.scheduler = Scheduler(
+            limiter=AIMDLimiter(clock=self.clock), retryable_errors=('999',),
+            clock=self.clock, sleep=self.clock.sleep)
+
+    def run_outcomes(self, outcomes):
+        outcomes = list(outcomes)
+
+        def call():
+            outcome = outcomes.pop(0)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        return self.scheduler.run('AddRecipient', call)
+
+    def test_retries_throttling_fault(self):
+        throttled = Result(False, '123', 'Too many concurrent requests')
+        result = self.run_outcomes([throttled, throttled, Result(True)])
+
+        self.assertTrue(result.success)
+        self.assertEqual(len(self.clock.slept), 2)
+        self.assertLess(self.scheduler.limiter.limit, 4)
+
+    def test_retries_retryable_errorid_and_http_errors(self):
+        result = self.run_outcomes(
+            [Result(False, '999', 'Busy'), http_error(503), Result(True)])
+
+        self.assertTrue(result.success)
+
+    def test_permanent_fault_is_not_retried(self):
+        result = self.run_outcomes([Result(False, '140', 'Private list')])
+
+        self.assertFalse(result.success)
+        self.assertEqual(self.clock.slept, [])
+
+    def test_gives_up_after_max_retries(self):
+        with self.assertRaises(requests.HTTPError):
+            self.run_outcomes([http_error(502)] * 4)
+
+        self.assertEqual(len(self.clock.slept), 3)
+
+    def test_read_timeout_is_not_retried(self):
+        with self.assertRaises(requests.ReadTimeout):
+            self.run_outcomes([requests.ReadTimeout(), Result(True)])
+
+    def test_backoff_is_bounded(self):
+        for attempt in range(20):
+            delay = self.scheduler.delay(attempt)
+            self.assertTrue(0 <= delay <= self.scheduler.max_backoff)
+
+
+class TestApiScheduler(unittest.TestCase):
+    def test_calls_go_through_scheduler(self):
+        actions = []
+
+        class RecordingScheduler(object):
+            def run(self, action, call):
+                actions.append(action)
+                return call()
+
+        api = API('test', 'test', 'testURL', scheduler=RecordingScheduler())
+        api._sessionId = 'test'
+        api._request = lambda data, auth=True: FakeResponse(
+            fixture('test_response.xml'))
+
+        self.assertTrue(api.add_recipient(1, 1)[0])
+        self.assertEqual(actions, ['AddRecipient'])
+
+
+if __name__ == '__main__':
+    unittest.main()
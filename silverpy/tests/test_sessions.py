@@ -0,0 +1,136 @@
+import itertools
+import unittest
+
+import sys
+sys.path.append('..')
+
+from silverpy.api import API
+from silverpy.sessions import SessionPool
+from silverpy.tests.helpers import FakeEngage
+
+
+class TestSessionRenewal(unittest.TestCase):
+    def test_single_session_is_renewed_and_replayed(self):
+        api = API('test', 'test', 'testURL')
+        engage = FakeEngage(api)
+        api._request = engage.request
+
+        api.login()
+        engage.expired.add('SESSION1')
+
+        success, recipient_id, error = api.add_recipient(1, 1)
+
+        self.assertTrue(success)
+        self.assertEqual(recipient_id, '33439394')
+        self.assertEqual(api._sessionId, 'SESSION2')
+
+    def test_pooled_sessions(self):
+        api = API('test', 'test', 'testURL', sessions=3)
+        engage = FakeEngage(api)
+        api._request = engage.request
+
+        api.login()
+        specs = [(1, 'user%d@example.com' % i) for i in range(30)]
+        items = list(api.bulk_remove(specs, workers=6))
+
+        self.assertTrue(all(item.success for item in items))
+        self.assertLessEqual(len(engage.used), 3)
+        self.assertEqual(len(api._pool), len(engage.used))
+
+        engage.expired.update(engage.used)
+        self.assertTrue(api.remove_recipient(1, 'again@example.com')[0])
+
+        api.logout()
+        self.assertIsNone(api._sessionId)
+        # Only the session renewed above was still valid
+        self.assertEqual(len(engage.logged_out), 1)
+        self.assertEqual(len(api._pool), 0)
+
+
+class FakeAPI(object):
+    def __init__(self):
+        self.counter = itertools.count(1)
+        self.ended = []
+
+    def _new_session(self):
+        return 'S%d' % next(self.counter)
+
+    def _end_session(self, session_id):
+        self.ended.append(session_id)
+
+
+class TestSessionPool(unittest.TestCase):
+    def setUp(self):
+        self.api = FakeAPI()
+        self.pool = SessionPool(self.api, 2)
+
+    def test_acquire_creates_up_to_size(self):
+        first = self.pool.acquire()
+        second = self.pool.acquire()
+
+        self.assertNotEqual(first, second)
+        self.assertEqual(len(self.pool), 2)
+
+        with self.assertRaises(RuntimeError):
+            self.pool.acquire(timeout=0.01)
+
+        self.pool.release(first)
+        self.assertEqual(self.pool.acquire(), first)
+
+    def test_renew_replaces_session(self):
+        first = self.pool.acquire()
+        renewed = self.pool.renew(first)
+        self.pool.release(first)
+        self.pool.release(renewed)
+
+        self.assertNotEqual(first, renewed)
+        self.assertEqual(len(self.pool), 1)
+        self.assertEqual(self.pool.close(), 1)
+        self.assertEqual(self.api.ended, [renewed])
+
+    def test_leased_sessions_are_closed_when_released(self):
+        leased = self.pool.acquire()
+        idle = self.pool.acquire()
+        self.pool.release(idle)
+
+        self.assertEqual(self.pool.close(), 1)
+        self.assertEqual(self.api.ended, [idle])
+
+        self.pool.release(leased)
+        self.assertEqual(self.api.ended, [idle, leased])
+        self.assertEqual(len(self.pool), 0)
+        self.assertNotEqual(self.pool.acquire(), leased)
+
+    def test_kept_sessions_are_not_closed(self):
+        self.pool.add('SHARED')
+        leased = self.pool.acquire()
+        own = self.pool.acquire()
+        self.pool.release(own)
+
+        self.assertEqual(self.pool.close(keep=('SHARED',)), 1)
+        self.pool.release(leased)
+        self.assertEqual(self.api.ended, [own])
+
+    def test_failed_login_frees_its_slot(self):
+        def login():
+            raise IOError('connection refused')
+
+        first = self.pool.acquire()
+
+        with self.assertRaises(IOError):
+            self.pool.renew(first, login)
+
+        self.assertEqual(len(self.pool), 0)
+        self.assertEqual(self.pool._creating, 0)
+        self.pool.acquire()
+        self.pool.acquire()
+        self.assertEqual(len(self.pool), 2)
+
+    def test_add_respects_size(self):
+        self.assertTrue(self.pool.add('A'))
+        self.assertTrue(self.pool.add('B'))
+        self.assertFalse(self.pool.add('C'))
+
+
+if __name__ == '__main__':
+    unittest.main()
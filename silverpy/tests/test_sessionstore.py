@@ -0,0 +1,179 @@
+import multiprocessing
+import os
+import shutil
+import stat
+import tempfile
+import time
+import unittest
+
+import sys
+sys.path.append('..')
+
+from silverpy.api import API
+from silverpy.sessionstore import SessionStore
+from silverpy.standin import StandIn
+from silverpy.tests.helpers import FakeClock
+
+
+def _log_in(url, path, results):
+    api = API('test', 'test', url, session_store=SessionStore(path))
+    api.login()
+    results.put(api.send_mailing(9700, 'a@b.com')[0])
+    api.close()
+
+
+class TestSessionStore(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'sessions.json')
+        self.clock = FakeClock(1000.0)
+        self.store = SessionStore(self.path, idle_timeout=100,
+                                  touch_interval=10, clock=self.clock)
+        self.engage = StandIn().start()
+
+    def tearDown(self):
+        self.engage.stop()
+        shutil.rmtree(self.dir)
+
+    def api(self, **options):
+        return API('test', 'test', self.engage.url,
+                   session_store=self.store, **options)
+
+    def test_login_is_shared(self):
+        first, second = self.api(), self.api()
+
+        self.assertTrue(first.login())
+        self.assertTrue(second.login())
+        self.assertEqual(first._sessionId, second._sessionId)
+        self.assertTrue(second.send_mailing(9700, 'a@b.com')[0])
+        self.assertEqual(self.engage.calls['Login'], 1)
+
+        self.assertEqual(
+            stat.S_IMODE(os.stat(self.path).st_mode), 0o600)
+
+    def test_first_call_logs_in(self):
+        self.assertTrue(self.api().send_mailing(9700, 'a@b.com')[0])
+        self.assertTrue(self.api().send_mailing(9700, 'a@b.com')[0])
+        self.assertEqual(self.engage.calls['Login'], 1)
+
+    def test_expired_session_is_renewed_once(self):
+        first, second = self.api(), self.api()
+        first.login()
+        second.login()
+
+        self.engage.sessions.clear()
+
+        self.assertTrue(first.send_mailing(9700, 'a@b.com')[0])
+        self.assertTrue(second.send_mailing(9700, 'a@b.com')[0])
+        self.assertEqual(self.engage.calls['Login'], 2)
+        self.assertEqual(first._sessionId, second._sessionId)
+
+    def test_idle_session_is_not_adopted(self):
+        self.api().login()
+
+        self.clock.now += 50
+        self.api().send_mailing(9700, 'a@b.com')
+        self.clock.now += 60
+        self.api().login()
+        self.assertEqual(self.engage.calls['Login'], 1)
+
+        self.clock.now += 101
+        self.api().login()
+        self.assertEqual(self.engage.calls['Login'], 2)
+
+    def test_logout_leaves_the_session(self):
+        first, second = self.api(), self.api()
+        first.login()
+        second.login()
+
+        self.assertTrue(first.logout())
+        self.assertIsNone(first._sessionId)
+        self.assertTrue(second.send_mailing(9700, 'a@b.com')[0])
+        self.assertEqual(self.engage.calls['Logout'], 0)
+
+    def test_pooled_session_is_renewed_through_the_store(self):
+        first, second = self.api(sessions=2), self.api(sessions=2)
+        first.login()
+        second.login()
+
+        self.engage.sessions.clear()
+
+        self.assertTrue(first.send_mailing(9700, 'a@b.com')[0])
+        self.assertTrue(second.send_mailing(9700, 'a@b.com')[0])
+        self.assertEqual(self.engage.calls['Login'], 2)
+        self.assertEqual(first._sessionId, second._sessionId)
+        self.assertEqual(
+            self.store.get(self.store.key('test', self.engage.url))[0],
+            first._sessionId)
+
+    def test_pooled_session_is_touched(self):
+        api = self.api(sessions=2)
+        api.login()
+        key = self.store.key('test', self.engage.url)
+
+        self.clock.now += 50
+        self.assertTrue(api.send_mailing(9700, 'a@b.com')[0])
+        self.clock.now += 60
+
+        self.assertEqual(self.store.get(key)[0], api._sessionId)
+
+    def test_pooled_heartbeat_uses_the_shared_session(self):
+        self.store.clock = time.time
+        self.store.touch_interval = 0
+        api = self.api(sessions=2, heartbeat=0.05)
+        api.login()
+        key = self.store.key('test', self.engage.url)
+        last_used = self.store.get(key)[1]
+
+        # Only the shared session is idle in the store, not in the pool
+        leased = api._pool.acquire()
+        time.sleep(0.3)
+        api.close()
+        api._pool.release(leased)
+
+        self.assertGreater(self.engage.calls['GetJobStatus'], 0)
+        self.assertEqual(self.engage.calls['Login'], 1)
+        self.assertGreater(self.store.get(key)[1], last_used)
+
+    def test_pooled_logout_leaves_the_session(self):
+        first, second = self.api(sessions=2), self.api()
+        first.login()
+        second.login()
+
+        self.assertTrue(first.logout())
+        self.assertTrue(second.send_mailing(9700, 'a@b.com')[0])
+        self.assertEqual(self.engage.calls['Logout'], 0)
+
+    def test_processes(self):
+        results = multiprocessing.Queue()
+        store = SessionStore(self.path)
+        workers = [
+            multiprocessing.Process(
+                target=_log_in, args=(self.engage.url, self.path, results))
+            for _ in range(4)]
+
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+        self.assertEqual([results.get() for _ in workers], [True] * 4)
+        self.assertEqual(self.engage.calls['Login'], 1)
+        self.assertIsNotNone(store.get(store.key('test', self.engage.url)))
+
+    def test_heartbeat(self):
+        self.store.clock = time.time
+        api = self.api(heartbeat=0.05)
+        api.login()
+
+        time.sleep(0.3)
+        api.close()
+
+        self.assertGreater(self.engage.calls['GetJobStatus'], 0)
+        calls = self.engage.calls['GetJobStatus']
+        time.sleep(0.1)
+        self.assertEqual(self.engage.calls['GetJobStatus'], calls)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+import threading
+import time
+import unittest
+
+import sys
+sys.path.append('..')
+
+try:
+    import queue
+except ImportError:  # Python 2
+    import Queue as queue
+
+from silverpy.sharding import ShardedExecutor, recipient_key, shard
+from silverpy.tests.helpers import WorkerTransport
+
+
+class TestSharding(unittest.TestCase):
+    def test_recipient_key(self):
+        self.assertEqual(
+            recipient_key('add_recipient', (1, 1, {'Email': 'A@b.com'})),
+            'a@b.com')
+        self.assertEqual(
+            recipient_key('add_recipient',
+                          {'list_id': 1, 'created_from': 1,
+                           'columns': {'EMAIL': 'a@b.com'}}),
+            'a@b.com')
+        self.assertEqual(
+            recipient_key('opt_out_recipient', (1, 'A@b.com')), 'a@b.com')
+        self.assertEqual(
+            recipient_key('remove_recipient', {'email': 'a@b.com'}),
+            'a@b.com')
+
+    def test_shard_is_stable(self):
+        self.assertEqual(shard('a@b.com', 4), shard(u'a@b.com', 4))
+        self.assertEqual(
+            len(set(shard('user%d@b.com' % i, 4) for i in range(100))), 4)
+
+
+class TestShardedExecutor(unittest.TestCase):
+    def setUp(self):
+        self.executor = ShardedExecutor(
+            'test', 'test', 'testURL', processes=2, threads=2,
+            transport=WorkerTransport())
+
+    def tearDown(self):
+        self.executor.close()
+
+    def recipients(self, count):
+        return [(1, 1, {'EMAIL': 'user%d@example.com' % (i % 10)})
+                for i in range(count)]
+
+    def test_ordered(self):
+        recipients = self.recipients(50)
+        recipients[7] = (1, 1, {'EMAIL': 'fail@example.com'})
+
+        items = list(self.executor.bulk_add_recipients(
+            recipients, max_in_flight=5))
+
+        self.assertEqual([item.index for item in items], list(range(50)))
+        self.assertEqual(items[3].spec, recipients[3])
+        self.assertFalse(items[7].success)
+        self.assertEqual(items[7].error, ('122', 'Invalid'))
+        self.assertEqual(sum(item.success for item in items), 49)
+
+        # Every recipient was handled by a single process
+        pids = {}
+        for item in items:
+            if item.success:
+                email = item.spec[2]['EMAIL']
+                pids.setdefault(email, set()).add(item.value[1])
+        self.assertTrue(all(len(p) == 1 for p in pids.values()))
+        self.assertEqual(len(set.union(*pids.values())), 2)
+
+    def test_unordered(self):
+        items = list(self.executor.bulk_opt_out(
+            [(1, 'user%d@example.com' % i) for i in range(20)],
+            ordered=False))
+
+        self.assertEqual(
+            sorted(item.index for item in items), list(range(20)))
+
+    def test_abandoned_run(self):
+        items = self.executor.bulk_remove(
+            [(1, 'user%d@example.com' % i) for i in range(20)])
+        next(items)
+        items.close()
+
+        items = list(self.executor.bulk_remove([(1, 'a@b.com')]))
+        self.assertEqual(len(items), 1)
+        self.assertEqual(items[0].index, 0)
+
+    def test_interleaved_runs(self):
+        first = self.executor.bulk_remove(
+            [(1, 'user%d@example.com' % i) for i in range(20)],
+            max_in_flight=4)
+        self.assertEqual(next(first).index, 0)
+
+        # Not blocked by the first run, still referenced
+        second = list(self.executor.bulk_opt_out(
+            [(1, 'user%d@example.com' % i) for i in range(10)]))
+        self.assertEqual([item.index for item in second], list(range(10)))
+        self.assertTrue(all(item.success for item in second))
+
+        rest = list(first)
+        self.assertEqual([item.index for item in rest], list(range(1, 20)))
+        self.assertTrue(all(item.success for item in rest))
+
+    def test_waiting_consumer_leaves_the_lock(self):
+        results = self.executor._results[0] = queue.Queue()
+        consumer = threading.Thread(target=self.executor._result, args=(0,))
+        consumer.start()
+        time.sleep(0.05)
+
+        try:
+            self.assertTrue(self.executor._lock.acquire(timeout=1))
+            self.executor._lock.release()
+        finally:
+            results.put((0, 0, True, None, None))
+            consumer.join()
+            del self.executor._results[0]
+
+    def test_unknown_method(self):
+        with self.assertRaises(ValueError):
+            self.executor.run('send_mailing', [])
+
+
+class TestShardedLoginFailure(unittest.TestCase):
+    def test_items_fail_with_login_error(self):
+        executor = ShardedExecutor(
+            'test', 'test', 'testURL', processes=1, threads=1,
+            transport=WorkerTransport(login=False))
+
+        try:
+            items = list(executor.bulk_remove([(1, 'a@b.com')]))
+        finally:
+            executor.close()
+
+        self.assertFalse(items[0].success)
+        self.assertIsInstance(items[0].error, IOError)
+
+
+if __name__ == '__main__':
+    unittest.main()
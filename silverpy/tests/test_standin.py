@@ -0,0 +1,97 @@
+import unittest
+
+import sys
+sys.path.append('..')
+
+import requests
+
+from silverpy.api import API
+from silverpy.bench import benchmark, parse_args
+from silverpy.standin import StandIn
+
+
+class TestStandIn(unittest.TestCase):
+    def setUp(self):
+        self.standin = StandIn(seed=0).start()
+        self.api = API('test', 'test', self.standin.url)
+        self.api.login()
+
+    def tearDown(self):
+        self.api.close()
+        self.standin.stop()
+
+    def test_recipients(self):
+        success, recipient_id, error = self.api.add_recipient(
+            1, 1, {'EMAIL': 'a@b.com', 'Name': 'A'})
+        self.assertTrue(success)
+        self.assertEqual(
+            self.api.add_recipient(1, 1, {'Email': 'A@b.com'})[1],
+            recipient_id)
+
+        self.assertEqual(self.api.remove_recipient(1, 'a@b.com'),
+                         (True, None))
+        self.assertEqual(self.api.remove_recipient(1, 'a@b.com'),
+                         (False, ('128', 'Recipient is not a member.')))
+        self.assertEqual(self.standin.calls['AddRecipient'], 2)
+
+    def test_mailings_and_contact_lists(self):
+        success, contact_list_id, error = self.api.create_contact_list(
+            1, 'VIP')
+        self.assertTrue(success)
+        self.assertEqual(self.standin.contact_lists[int(contact_list_id)],
+                         'VIP')
+
+        self.assertTrue(self.api.add_contact_to_contact_list(
+            contact_list_id, '', {'EMAIL': 'a@b.com'})[0])
+        self.assertTrue(self.api.send_mailing(9700, 'a@b.com')[0])
+        self.assertEqual(self.api.schedule_mailing(9700, 1, 'Hello')[0], True)
+
+    def test_streamed_requests(self):
+        api = API('test', 'test', self.standin.url, stream_threshold=1)
+        api.login()
+
+        self.assertTrue(api.add_recipient(1, 1, {'EMAIL': 'a@b.com'})[0])
+        api.close()
+
+    def test_expired_session_logs_in_again(self):
+        self.standin.sessions.clear()
+
+        self.assertTrue(self.api.opt_out_recipient(1, 'a@b.com')[0])
+        self.assertEqual(self.standin.calls['Login'], 2)
+
+    def test_injected_errors(self):
+        self.standin.error_rate = 1.0
+
+        self.assertEqual(self.api.send_mailing(9700, 'a@b.com'),
+                         (False, ('999', 'Injected error.')))
+
+    def test_throttling(self):
+        self.standin.throttle_rate = 1
+        self.standin._tokens = 0
+
+        with self.assertRaises(requests.HTTPError) as context:
+            self.api.send_mailing(9700, 'a@b.com')
+
+        self.assertEqual(context.exception.response.status_code, 429)
+
+
+class TestBench(unittest.TestCase):
+    def test_benchmark(self):
+        options = parse_args([
+            '--calls', '5', '--concurrency', '2', '--processes', '1',
+            '--methods', 'add_recipient,send_mailing',
+            '--modes', 'serial,threads,processes'])
+
+        results = benchmark(options)
+
+        self.assertEqual(
+            [(r['mode'], r['method']) for r in results],
+            [('serial', 'add_recipient'), ('serial', 'send_mailing'),
+             ('threads', 'add_recipient'), ('threads', 'send_mailing'),
+             ('processes', 'add_recipient')])
+        self.assertTrue(all(r['calls'] == 5 for r in results))
+        self.assertTrue(all(r['errors'] == 0 for r in results))
+
+
+if __name__ == '__main__':
+    unittest.main()
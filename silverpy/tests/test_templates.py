@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+import unittest
+
+import sys
+sys.path.append('..')
+
+from lxml import etree
+
+from silverpy.api import API
+from silverpy.templates import (
+    ADD_RECIPIENT, OPT_OUT_RECIPIENT, Pairs, RenderedEnvelope,
+    RequestTemplate, Text, escape,
+)
+from silverpy.tests.helpers import FakeResponse, fixture
+
+
+class TestEscape(unittest.TestCase):
+    def test_matches_lxml(self):
+        texts = [
+            u'plain',
+            u'',
+            u'a & b <c> "d" \'e\'',
+            u'line\r\nbreak\ttab',
+            u'Jos\xe9 € \U0001F600',
+        ]
+
+        for text in texts:
+            node = etree.Element('A')
+            node.text = text
+            self.assertEqual(
+                b'<A>' + escape(text) + b'</A>', etree.tostring(node))
+
+    def test_rejects_what_lxml_rejects(self):
+        with self.assertRaises(TypeError):
+            escape(1)
+
+        with self.assertRaises(ValueError):
+            escape(u'null\x00byte')
+
+
+class TestRequestTemplates(unittest.TestCase):
+    def setUp(self):
+        self.api = API('test', 'test', 'testURL')
+
+    def assertSameBytes(self, rendered, root):
+        self.assertIsInstance(rendered, RenderedEnvelope)
+        self.assertEqual(rendered, etree.tostring(root))
+
+    def test_add_recipient_matches_builder(self):
+        columns = {'EMAIL': 'jo@example.com', u'N\xe4me': 'A & B', 'Age': 3}
+        cases = [
+            ((1, 2), {}),
+            ((1, 2, columns), {}),
+            ((1, 2, columns), {
+                'send_autoreply': True,
+                'update_if_found': True,
+                'allow_html': False,
+                'visitor_key': '<key>',
+                'sync_fields': {'EMAIL': 'x@example.com'},
+            }),
+            ((1, 2), {'sync_fields': {}}),
+        ]
+
+        for args, kwargs in cases:
+            values = dict(kwargs, list_id=args[0], created_from=args[1],
+                          columns=args[2] if len(args) > 2 else None)
+            self.assertSameBytes(
+                ADD_RECIPIENT.render(values),
+                self.api._build_add_recipient(*args, **kwargs))
+
+    def test_opt_out_recipient_matches_builder(self):
+        self.assertSameBytes(
+            OPT_OUT_RECIPIENT.render({'list_id': 1, 'email': 'a@b.com',
+                                      'columns': {'Reason': '>_<'}}),
+            self.api._build_opt_out_recipient(1, 'a@b.com', {'Reason': '>_<'}))
+
+        self.assertSameBytes(
+            OPT_OUT_RECIPIENT.render({'list_id': 1, 'mailing_id': 2,
+                                      'recipient_id': 3, 'job_id': 4}),
+            self.api._build_opt_out_recipient(
+                1, mailing_id=2, recipient_id=3, job_id=4))
+
+    def test_empty_action(self):
+        template = RequestTemplate('Logout', [Text('X', optional=True)])
+
+        self.assertSameBytes(template.render({}), self.api._build_logout())
+
+    def test_invalid_values(self):
+        with self.assertRaises(TypeError):
+            ADD_RECIPIENT.render({'list_id': 1})
+
+        with self.assertRaises(TypeError):
+            ADD_RECIPIENT.render(
+                {'list_id': 1, 'created_from': 2, 'columns': ['EMAIL']})
+
+        with self.assertRaises(TypeError):
+            RequestTemplate('T', [Pairs('P', 'pairs')]).render(
+                {'pairs': {1: 'one'}})
+
+    def test_api_sends_rendered_envelopes(self):
+        sent = []
+
+        def request(data, auth=True):
+            sent.append(data)
+            return FakeResponse(fixture('test_response.xml'))
+
+        self.api._sessionId = 'test'
+        self.api._request = request
+
+        columns = {'EMAIL': 'a@b.com'}
+        self.api.add_recipient(1, 2, columns, update_if_found=True)
+        self.api.opt_out_recipient(1, 'a@b.com')
+
+        expected = self.api._build_add_recipient(
+            1, 2, columns, update_if_found=True)
+        self.assertEqual(sent[0], etree.tostring(expected))
+        self.assertEqual(sent[1].action, 'OptOutRecipient')
+
+        with self.assertRaises(ValueError):
+            self.api.opt_out_recipient(1, mailing_id=2)
+
+
+if __name__ == '__main__':
+    unittest.main()
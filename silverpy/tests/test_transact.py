@@ -0,0 +1,167 @@
+import threading
+import unittest
+
+import sys
+sys.path.append('..')
+
+from lxml import etree
+
+from silverpy.api import API
+from silverpy.tests.helpers import FakeResponse
+from silverpy.transact import (
+    TransactSender, build_xtmailing, parse_xtmailing_response,
+)
+
+
+class FakeTransact(object):
+    """Transport answering XTMAILING requests."""
+    def __init__(self):
+        self.requests = []
+        self.lock = threading.Lock()
+
+    def post(self, url, headers, data):
+        root = etree.fromstring(data)
+
+        with self.lock:
+            self.requests.append(root)
+
+        if root.findtext('CAMPAIGN_ID') == '666':
+            raise IOError('connection reset')
+
+        response = etree.Element('XTMAILING_RESPONSE')
+        etree.SubElement(response, 'STATUS').text = '0'
+
+        for recipient in root.iterfind('RECIPIENT'):
+            email = recipient.findtext('EMAIL')
+            detail = etree.SubElement(response, 'RECIPIENT_DETAIL')
+            etree.SubElement(detail, 'EMAIL').text = email
+
+            if email.startswith('bad'):
+                response.find('STATUS').text = '1'
+                etree.SubElement(detail, 'SEND_STATUS').text = '1'
+                etree.SubElement(detail, 'ERROR_CODE').text = '4'
+                etree.SubElement(detail, 'ERROR_STRING').text = 'Bad email'
+            else:
+                etree.SubElement(detail, 'SEND_STATUS').text = '0'
+                etree.SubElement(detail, 'ERROR_CODE').text = '0'
+
+        return FakeResponse(etree.tostring(response))
+
+    def close(self):
+        pass
+
+
+class TestXTMailing(unittest.TestCase):
+    def test_build(self):
+        root = build_xtmailing(
+            9100, [('a@b.com', {'NAME': 'A'}), ('c@d.com', None)], 'T1')
+
+        self.assertEqual(root.findtext('CAMPAIGN_ID'), '9100')
+        self.assertEqual(root.findtext('TRANSACTION_ID'), 'T1')
+        recipients = root.findall('RECIPIENT')
+        self.assertEqual(len(recipients), 2)
+        self.assertEqual(
+            recipients[0].findtext('PERSONALIZATION/TAG_NAME'), 'NAME')
+        self.assertIsNone(recipients[1].find('PERSONALIZATION'))
+
+    def test_parse_request_error(self):
+        status, error, details = parse_xtmailing_response(
+            b'<XTMAILING_RESPONSE><STATUS>2</STATUS>'
+            b'<ERROR_CODE>1</ERROR_CODE><ERROR_STRING>Invalid campaign'
+            b'</ERROR_STRING></XTMAILING_RESPONSE>')
+
+        self.assertEqual(status, '2')
+        self.assertEqual(error, ('1', 'Invalid campaign'))
+        self.assertEqual(details, [])
+
+
+class TestTransactSender(unittest.TestCase):
+    def setUp(self):
+        self.transport = FakeTransact()
+        self.sender = TransactSender(
+            'testURL', transport=self.transport, batch_size=3, max_delay=60)
+
+    def tearDown(self):
+        self.sender.close()
+
+    def test_full_batches_are_sent(self):
+        results = [self.sender.send(1, 'user%d@example.com' % i, {'N': i})
+                   for i in range(3)]
+
+        for future in results:
+            self.assertEqual(future.result(timeout=5), (True, None))
+
+        self.assertEqual(len(self.transport.requests), 1)
+        self.assertEqual(
+            len(self.transport.requests[0].findall('RECIPIENT')), 3)
+
+    def test_per_recipient_results(self):
+        good = self.sender.send(1, 'good@example.com')
+        bad = self.sender.send(1, 'bad@example.com')
+        other = self.sender.send(2, 'other@example.com')
+        self.sender.flush()
+
+        self.assertEqual(good.result(timeout=5), (True, None))
+        self.assertEqual(bad.result(timeout=5), (False, ('4', 'Bad email')))
+        self.assertTrue(other.result(timeout=5)[0])
+        # One request per campaign
+        self.assertEqual(len(self.transport.requests), 2)
+
+    def test_string_backend(self):
+        sender = TransactSender('testURL', transport=self.transport,
+                                batch_size=2, xml_backend='string')
+        good = sender.send(1, 'good@example.com', {'N': 1})
+        bad = sender.send(1, 'bad@example.com')
+
+        try:
+            self.assertEqual(good.result(timeout=5), (True, None))
+            self.assertEqual(
+                bad.result(timeout=5), (False, ('4', 'Bad email')))
+        finally:
+            sender.close()
+
+    def test_partial_batches_sent_after_delay(self):
+        sender = TransactSender(
+            'testURL', transport=self.transport, max_delay=0.01)
+
+        self.assertEqual(
+            sender.send(1, 'a@b.com').result(timeout=5), (True, None))
+        sender.close()
+
+    def test_transport_errors_reach_every_recipient(self):
+        results = [self.sender.send(666, 'user%d@example.com' % i)
+                   for i in range(2)]
+        self.sender.flush()
+
+        for future in results:
+            with self.assertRaises(IOError):
+                future.result(timeout=5)
+
+    def test_send_all(self):
+        recipients = [(1, 'user%d@example.com' % i, {'N': i})
+                      for i in range(10)]
+        recipients[4] = (1, 'bad@example.com', None)
+
+        items = list(self.sender.send_all(recipients))
+
+        self.assertEqual([item.index for item in items], list(range(10)))
+        self.assertFalse(items[4].success)
+        self.assertEqual(items[4].error, ('4', 'Bad email'))
+        self.assertEqual(sum(item.success for item in items), 9)
+        self.assertEqual(len(self.transport.requests), 4)
+
+        unordered = list(self.sender.send_all(
+            recipients, max_in_flight=3, ordered=False))
+        self.assertEqual(
+            sorted(item.index for item in unordered), list(range(10)))
+
+    def test_api_shares_its_transport(self):
+        api = API('test', 'test', 'testURL', transport=self.transport)
+        sender = api.transact_sender('testURL', max_delay=0.01)
+
+        self.assertTrue(sender.send(1, 'a@b.com').result(timeout=5)[0])
+        sender.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
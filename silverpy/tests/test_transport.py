@@ -0,0 +1,100 @@
+import threading
+import unittest
+
+import sys
+sys.path.append('..')
+
+from silverpy.api import API
+from silverpy.standin import StandIn
+from silverpy.tests.helpers import FakeResponse, fixture
+from silverpy.transport import HTTPTransport
+
+
+class RecordingTransport(object):
+    def __init__(self):
+        self.posts = []
+        self.closed = False
+
+    def post(self, url, headers, data):
+        self.posts.append((url, headers, data))
+        return FakeResponse(fixture('test_login_response.xml'))
+
+    def close(self):
+        self.closed = True
+
+
+class TestHTTPTransport(unittest.TestCase):
+    def test_session_per_thread(self):
+        transport = HTTPTransport()
+        sessions = []
+        thread = threading.Thread(
+            target=lambda: sessions.append(transport.session))
+        thread.start()
+        thread.join()
+
+        self.assertIs(transport.session, transport.session)
+        self.assertIsNot(transport.session, sessions[0])
+        self.assertIs(sessions[0].get_adapter('https://engage.example'),
+                      transport.session.get_adapter('https://engage.example'))
+
+    def test_session_options(self):
+        transport = HTTPTransport(
+            pool_maxsize=32, keep_alive=False, max_retries=2)
+        adapter = transport.session.get_adapter('https://engage.example')
+
+        self.assertEqual(adapter._pool_maxsize, 32)
+        self.assertEqual(adapter.max_retries.total, 2)
+        self.assertEqual(transport.session.headers['Connection'], 'close')
+
+    def test_close(self):
+        transport = HTTPTransport()
+        session = transport.session
+        transport.close()
+
+        self.assertIsNot(transport.session, session)
+
+
+class TestApiTransport(unittest.TestCase):
+    def test_custom_transport(self):
+        transport = RecordingTransport()
+        api = API('test', 'test', 'testURL', transport=transport)
+
+        self.assertTrue(api.login())
+        api.close()
+
+        url, headers, data = transport.posts[0]
+        self.assertEqual(url, 'testURL')
+        self.assertEqual(headers['Content-Type'], 'text/xml;charset=UTF-8')
+        self.assertIn(b'<Login>', data)
+        self.assertTrue(transport.closed)
+
+    def test_connections_outlive_bulk_threads(self):
+        recipients = [
+            {'list_id': 1, 'created_from': 1, 'columns': {'EMAIL': str(i)}}
+            for i in range(64)]
+
+        with StandIn() as engage:
+            api = API('test', 'test', engage.url, pool_maxsize=8)
+            api.login()
+
+            for _ in range(3):
+                list(api.bulk_add_recipients(recipients, workers=8))
+            api.close()
+
+        # A run doesn't necessarily open all 8, so the next may add some,
+        # but never more than the pool keeps alive
+        self.assertLessEqual(engage.connections, 8)
+
+    def test_transport_options(self):
+        api = API('test', 'test', 'testURL', timeout=(1, 5), pool_maxsize=4)
+
+        self.assertEqual(api._transport.timeout, (1, 5))
+        self.assertEqual(api._transport.pool_maxsize, 4)
+
+        with self.assertRaises(TypeError):
+            API('test', 'test', 'testURL', transport=RecordingTransport(),
+                timeout=5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import threading
+import unittest
+
+import sys
+sys.path.append('..')
+
+from silverpy.writebehind import WriteBehindQueue
+
+
+class FakeAPI(object):
+    """Records calls instead of sending them."""
+    def __init__(self):
+        self.calls = []
+        self.lock = threading.Lock()
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def _record(self, *call):
+        self.gate.wait()
+        with self.lock:
+            self.calls.append(call)
+
+    def add_recipient(self, list_id, created_from, columns=None, **kwargs):
+        self._record('add', list_id, columns, kwargs)
+        return (True, 'R%d' % len(self.calls), None)
+
+    def opt_out_recipient(self, list_id, email='', columns=None, **kwargs):
+        self._record('opt_out', list_id, email)
+        return (True, None)
+
+    def remove_recipient(self, list_id, email, columns=None):
+        if email == 'boom@example.com':
+            raise IOError('connection reset')
+
+        self._record('remove', list_id, email)
+        return (True, None)
+
+
+class TestWriteBehindQueue(unittest.TestCase):
+    def setUp(self):
+        self.api = FakeAPI()
+        self.queue = WriteBehindQueue(self.api, max_delay=60)
+
+    def tearDown(self):
+        self.queue.close()
+
+    def test_adds_are_coalesced(self):
+        first = self.queue.add_recipient(
+            1, 1, {'EMAIL': 'a@b.com', 'Name': 'A'}, update_if_found=True)
+        second = self.queue.add_recipient(
+            1, 1, {'Email': 'A@B.com', 'City': 'X'},
+            update_if_found=True)
+        other = self.queue.add_recipient(2, 1, {'EMAIL': 'a@b.com'})
+
+        self.assertEqual(len(self.queue), 2)
+        self.queue.close()
+
+        self.assertEqual(len(self.api.calls), 2)
+        action, list_id, columns, kwargs = self.api.calls[0]
+        self.assertEqual(columns, {
+            'EMAIL': 'a@b.com', 'Email': 'A@B.com', 'Name': 'A', 'City': 'X'})
+        self.assertEqual(kwargs, {'update_if_found': True})
+        self.assertEqual(first.result(), second.result())
+        self.assertTrue(other.result()[0])
+        self.assertEqual(self.queue.coalesced, 1)
+
+    def test_opt_out_is_not_overtaken(self):
+        self.queue.add_recipient(1, 1, {'EMAIL': 'a@b.com'})
+        self.queue.opt_out_recipient(1, 'a@b.com')
+        self.queue.add_recipient(1, 1, {'EMAIL': 'a@b.com', 'Name': 'A'})
+        self.queue.close()
+
+        self.assertEqual(
+            [call[0] for call in self.api.calls], ['add', 'opt_out', 'add'])
+
+    def test_batches_of_a_contact_run_in_order(self):
+        self.api.gate.clear()
+        self.queue.remove_recipient(1, 'a@b.com')
+        self.queue.flush()
+        self.queue.add_recipient(1, 1, {'EMAIL': 'a@b.com'})
+        self.queue.flush()
+        self.api.gate.set()
+        self.queue.close()
+
+        self.assertEqual(
+            [call[0] for call in self.api.calls], ['remove', 'add'])
+
+    def test_flush_on_size(self):
+        queue = WriteBehindQueue(self.api, max_pending=2, max_delay=60)
+
+        futures = [queue.remove_recipient(1, 'user%d@example.com' % i)
+                   for i in range(2)]
+
+        self.assertEqual(len(queue), 0)
+        for future in futures:
+            self.assertEqual(future.result(timeout=5), (True, None))
+
+        queue.close()
+
+    def test_flush_on_delay(self):
+        queue = WriteBehindQueue(self.api, max_delay=0.01)
+
+        future = queue.opt_out_recipient(1, 'a@b.com')
+
+        self.assertEqual(future.result(timeout=5), (True, None))
+        queue.close()
+
+    def test_exceptions_reach_the_future(self):
+        future = self.queue.remove_recipient(1, 'boom@example.com')
+        self.queue.flush()
+
+        with self.assertRaises(IOError):
+            future.result(timeout=5)
+
+    def test_closed_queue_rejects_calls(self):
+        self.queue.close()
+
+        with self.assertRaises(RuntimeError):
+            self.queue.remove_recipient(1, 'a@b.com')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,340 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: transact
+    :synopsis: Batched transactional mailings through Engage Transact.
+
+The Transact XTMAILING endpoint sends one mailing to several RECIPIENT
+blocks per request, each with its own personalization. TransactSender
+gathers individual sends into such batches, posts them concurrently and
+resolves the future of every caller with its own recipient's outcome.
+"""
+
+import collections
+import logging
+import threading
+import time
+import uuid
+from concurrent import futures
+
+from . import backends
+from .api import BulkItem, SilverpopError
+from .transport import HTTPTransport
+
+log = logging.getLogger(__name__)
+
+# Recipients Transact accepts in a single XTMAILING request.
+MAX_BATCH_SIZE = 10
+
+# XTMAILING_RESPONSE STATUS values.
+STATUS_SUCCESS = '0'
+STATUS_SOME_ERRORS = '1'
+STATUS_ERROR = '2'
+
+SEND_STATUS_SUCCESS = '0'
+
+
+def build_xtmailing(campaign_id, recipients, transaction_id=None,
+                    save_columns=None, backend=None):
+    """Generates an XTMAILING request.
+
+    :params campaign_id: The Transact group of automated messages.
+    :params recipients: List of (email, columns) tuples, columns being a
+                        dict of personalization tags and values, as the
+                        columns param of API.send_mailing.
+    :params transaction_id: Identifies the request in Engage reports.
+    :params save_columns: Personalization tags to be saved in Engage.
+    :params backend: The silverpy.backends backend building the tree.
+                     Defaults to the default backend.
+    :returns: The XTMAILING root element.
+    """
+    xml = backend or backends.get_backend()
+    root = xml.Element('XTMAILING')
+    xml.SubElement(root, 'CAMPAIGN_ID').text = str(campaign_id)
+
+    if transaction_id:
+        xml.SubElement(root, 'TRANSACTION_ID').text = transaction_id
+
+    xml.SubElement(root, 'SHOW_ALL_SEND_DETAIL').text = 'true'
+    xml.SubElement(root, 'SEND_AS_BATCH').text = 'false'
+    xml.SubElement(root, 'NO_RETRY_ON_FAILURE').text = 'false'
+
+    if save_columns:
+        save = xml.SubElement(root, 'SAVE_COLUMNS')
+        for name in save_columns:
+            xml.SubElement(save, 'COLUMN_NAME').text = name
+
+    for email, columns in recipients:
+        recipient = xml.SubElement(root, 'RECIPIENT')
+        xml.SubElement(recipient, 'EMAIL').text = email
+        xml.SubElement(recipient, 'BODY_TYPE').text = 'HTML'
+
+        for name, value in (columns or {}).items():
+            personalization = xml.SubElement(recipient, 'PERSONALIZATION')
+            xml.SubElement(personalization, 'TAG_NAME').text = name
+            xml.SubElement(personalization, 'VALUE').text = str(value)
+
+    return root
+
+
+def parse_xtmailing_response(content, backend=None):
+    """Decodes an XTMAILING_RESPONSE.
+
+    :params backend: The silverpy.backends backend parsing it.
+    :returns: Tuple (status, error_tuple, details). details holds a
+              tuple (email, bool_success, error_tuple) per
+              RECIPIENT_DETAIL, in request order.
+    """
+    root = (backend or backends.get_backend()).fromstring(content)
+    status = root.findtext('STATUS')
+
+    if status is None:
+        raise ValueError(
+            'Response malformed, no STATUS in XTMAILING_RESPONSE')
+
+    error = None
+    if status != STATUS_SUCCESS:
+        error = (root.findtext('ERROR_CODE'), root.findtext('ERROR_STRING'))
+
+    details = []
+    for detail in root:
+        if detail.tag != 'RECIPIENT_DETAIL':
+            continue
+
+        success = detail.findtext('SEND_STATUS') == SEND_STATUS_SUCCESS
+        details.append((
+            detail.findtext('EMAIL'),
+            success,
+            None if success else (detail.findtext('ERROR_CODE'),
+                                  detail.findtext('ERROR_STRING')),
+        ))
+
+    return (status, error, details)
+
+
+class _Pending(object):
+    __slots__ = ('email', 'columns', 'future')
+
+    def __init__(self, email, columns, future):
+        self.email = email
+        self.columns = columns
+        self.future = future
+
+
+class TransactSender(object):
+    """Sends transactional mailings in batches of up to batch_size
+    recipients per XTMAILING request.
+
+    Sends to the same campaign are held until a batch is full or the
+    oldest has waited max_delay seconds, then posted from a pool of
+    threads.
+
+    Usage:
+    sender = TransactSender('https://transact5.silverpop.com/XTMail')
+    future = sender.send(9100, 'a@b.com', {'RESET_LINK': link})
+    success, error = future.result()
+    sender.close()
+
+    :params url: The Transact endpoint of your Engage pod.
+    :params access_token: OAuth access token, if the org requires one.
+    :params transport: Transport to post with, see
+                       silverpy.transport. Defaults to an HTTPTransport.
+    :params save_columns: Personalization tags Engage should save.
+    :params xml_backend: Name of the silverpy.backends backend building
+                         requests and parsing responses.
+    """
+    def __init__(self, url, access_token=None, transport=None,
+                 batch_size=MAX_BATCH_SIZE, max_delay=0.05, workers=4,
+                 save_columns=None, clock=time.time, xml_backend=None):
+        if not 1 <= batch_size <= MAX_BATCH_SIZE:
+            raise ValueError(
+                'batch_size must be between 1 and %d.' % MAX_BATCH_SIZE)
+
+        self.url = url
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.save_columns = save_columns
+        self._clock = clock
+        self._xml_backend = xml_backend
+        self._owns_transport = transport is None
+        self._transport = transport or HTTPTransport()
+
+        self._headers = {'Content-Type': 'text/xml;charset=UTF-8'}
+        if access_token:
+            self._headers['Authorization'] = 'Bearer %s' % access_token
+
+        self._executor = futures.ThreadPoolExecutor(max_workers=workers)
+        self._cond = threading.Condition()
+        # campaign_id -> (time of the oldest send, [_Pending])
+        self._pending = collections.OrderedDict()
+        self._closed = False
+
+        self._thread = threading.Thread(
+            target=self._run, name='silverpy-transact')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def send(self, campaign_id, email, columns=None):
+        """Queues a transactional mailing to one recipient.
+
+        :params campaign_id: The Transact campaign to send.
+        :params email: The recipient email.
+        :params columns: Optional dict of personalization tags and values.
+        :returns: A concurrent.futures.Future of (bool_success, error_tuple)
+        """
+        if columns is not None and not isinstance(columns, dict):
+            raise TypeError('dict_columns must be a dictionary.')
+
+        future = futures.Future()
+
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('TransactSender is closed.')
+
+            entry = self._pending.get(campaign_id)
+            if entry is None:
+                entry = self._pending[campaign_id] = (self._clock(), [])
+                self._cond.notify()
+
+            entry[1].append(_Pending(email, columns, future))
+
+            if len(entry[1]) >= self.batch_size:
+                del self._pending[campaign_id]
+                self._submit(campaign_id, entry[1])
+
+        return future
+
+    def send_all(self, recipients, max_in_flight=1000, ordered=True):
+        """Sends every (campaign_id, email, columns) tuple of an iterable.
+
+        :params max_in_flight: Recipients read ahead of the consumer.
+        :params ordered: Yield in input order (True) or as completed.
+        :returns: Generator of BulkItem objects, value being the
+                  (bool_success, error_tuple) of the recipient.
+        """
+        pending = collections.deque()
+        # Futures of unordered sends, mapped to (index, spec)
+        waiting = {}
+
+        def item(index, spec, future):
+            try:
+                value = future.result()
+            except Exception as e:
+                return BulkItem(index, spec, False, error=e)
+
+            return BulkItem(index, spec, value[0], value, value[1])
+
+        def drain(block_until_empty):
+            if block_until_empty:
+                self.flush()
+
+            while pending or waiting:
+                if ordered:
+                    index, spec, future = pending.popleft()
+                    yield item(index, spec, future)
+                else:
+                    done, _ = futures.wait(
+                        waiting, return_when=futures.FIRST_COMPLETED)
+                    for future in done:
+                        index, spec = waiting.pop(future)
+                        yield item(index, spec, future)
+
+                if not block_until_empty \
+                        and len(pending) + len(waiting) < max_in_flight:
+                    return
+
+        for index, spec in enumerate(recipients):
+            if len(pending) + len(waiting) >= max_in_flight:
+                for result in drain(False):
+                    yield result
+
+            future = self.send(*spec)
+            if ordered:
+                pending.append((index, spec, future))
+            else:
+                waiting[future] = (index, spec)
+
+        for result in drain(True):
+            yield result
+
+    def flush(self):
+        """Posts every partial batch now."""
+        with self._cond:
+            self._flush()
+
+    def _flush(self):
+        pending, self._pending = self._pending, collections.OrderedDict()
+
+        for campaign_id, (_, batch) in pending.items():
+            self._submit(campaign_id, batch)
+
+    def _submit(self, campaign_id, batch):
+        self._executor.submit(self._post, campaign_id, batch)
+
+    def _run(self):
+        with self._cond:
+            while not self._closed:
+                if not self._pending:
+                    self._cond.wait()
+                    continue
+
+                oldest = min(entry[0] for entry in self._pending.values())
+                delay = oldest + self.max_delay - self._clock()
+
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+
+                for campaign_id, (since, batch) in list(
+                        self._pending.items()):
+                    if since + self.max_delay <= self._clock():
+                        del self._pending[campaign_id]
+                        self._submit(campaign_id, batch)
+
+    def _post(self, campaign_id, batch):
+        try:
+            xml = backends.get_backend(self._xml_backend)
+            root = build_xtmailing(
+                campaign_id, [(p.email, p.columns) for p in batch],
+                uuid.uuid4().hex, self.save_columns, xml)
+            response = self._transport.post(
+                self.url, self._headers, xml.tostring(root))
+            status, error, details = parse_xtmailing_response(
+                response.content, xml)
+        except Exception as e:
+            log.error('XTMAILING of %d recipients failed: %s', len(batch), e)
+            for pending in batch:
+                pending.future.set_exception(e)
+            return
+
+        if status == STATUS_ERROR and not details:
+            for pending in batch:
+                pending.future.set_result((False, error))
+            return
+
+        if [detail[0] for detail in details] != [p.email for p in batch]:
+            # Not in request order, match by email instead
+            by_email = dict((detail[0], detail) for detail in details)
+            details = [by_email.get(p.email) for p in batch]
+
+        for pending, detail in zip(batch, details):
+            if detail is None:
+                pending.future.set_exception(SilverpopError(
+                    'No RECIPIENT_DETAIL for %s.' % pending.email))
+            else:
+                pending.future.set_result(detail[1:])
+
+    def close(self):
+        """Posts the pending sends and waits for every batch."""
+        with self._cond:
+            if self._closed:
+                return
+
+            self._flush()
+            self._closed = True
+            self._cond.notify()
+
+        self._thread.join()
+        self._executor.shutdown(wait=True)
+
+        if self._owns_transport:
+            self._transport.close()
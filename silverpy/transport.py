@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: transport
+    :synopsis: HTTP transports used by API to post envelopes.
+
+A transport is any object with a post(url, headers, data) method that
+returns a response exposing the body as bytes in .content and raises on
+HTTP errors, plus a close() method.
+"""
+
+import logging
+import threading
+import weakref
+
+log = logging.getLogger(__name__)
+
+
+class HTTPTransport(object):
+    """Posts envelopes through requests, with one session per thread as
+    requests sessions are not safe to share between threads.
+
+    The sessions share a single adapter, and so a single pool of kept
+    alive connections: connections outlive the threads that opened them,
+    e.g. the worker threads of a bulk run, and are reused by the next.
+
+    :params pool_connections: Number of hosts to keep connection pools for.
+    :params pool_maxsize: Connections kept alive per host, by the whole
+                          transport. Requests from more threads than that
+                          at once open extra connections, closed after
+                          use.
+    :params timeout: Seconds to wait, either a single number or a tuple
+                     (connect_timeout, read_timeout). None waits forever.
+    :params keep_alive: If False, connections are closed after every
+                        request.
+    :params max_retries: Retries on failed connections. Requests that
+                         reached Engage are never retried.
+    """
+    def __init__(self, pool_connections=10, pool_maxsize=10,
+                 timeout=(10, 60), keep_alive=True, max_retries=0):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.timeout = timeout
+        self.keep_alive = keep_alive
+        self.max_retries = max_retries
+
+        self._local = threading.local()
+        # Sessions die with their thread, this only tracks them for close()
+        self._sessions = weakref.WeakSet()
+        self._adapter = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        """The requests session of the calling thread."""
+        session = getattr(self._local, 'session', None)
+
+        if session is None:
+            session = self._local.session = self._create_session()
+
+            with self._lock:
+                self._sessions.add(session)
+
+        return session
+
+    @property
+    def adapter(self):
+        """The HTTPAdapter, and connection pool, of every session."""
+        adapter = self._adapter
+
+        if adapter is None:
+            # Imported with the first session, requests takes long to load
+            from requests.adapters import HTTPAdapter
+
+            with self._lock:
+                adapter = self._adapter
+                if adapter is None:
+                    adapter = self._adapter = HTTPAdapter(
+                        pool_connections=self.pool_connections,
+                        pool_maxsize=self.pool_maxsize,
+                        max_retries=self.max_retries,
+                    )
+
+        return adapter
+
+    def _create_session(self):
+        import requests
+
+        session = requests.session()
+        adapter = self.adapter
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+
+        if not self.keep_alive:
+            session.headers['Connection'] = 'close'
+
+        return session
+
+    def post(self, url, headers, data):
+        """Posts data to url.
+
+        :returns: requests.Response object.
+        """
+        response = self.session.post(
+            url, headers=headers, data=data, timeout=self.timeout)
+        response.raise_for_status()
+
+        return response
+
+    def close(self):
+        """Closes the sessions of every thread and their connections."""
+        with self._lock:
+            sessions = list(self._sessions)
+            self._sessions.clear()
+            adapter, self._adapter = self._adapter, None
+
+        for session in sessions:
+            session.close()
+
+        if adapter is not None:
+            adapter.close()
+
+        self._local = threading.local()
@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+"""
+.. module:: writebehind
+    :synopsis: Background queue coalescing recipient updates.
+
+WriteBehindQueue takes add, opt-out and remove calls, holds them for a
+short while and sends them from a thread pool. Pending adds of the same
+contact are merged into a single AddRecipient, and the calls for one
+contact are always sent in the order they were made.
+"""
+
+import collections
+import itertools
+import logging
+import threading
+import time
+from concurrent import futures
+
+from .cache import column_email
+
+log = logging.getLogger(__name__)
+
+ADD = 'add_recipient'
+OPT_OUT = 'opt_out_recipient'
+REMOVE = 'remove_recipient'
+
+
+class _Operation(object):
+    """A pending API call and the futures of every caller it stands for."""
+    def __init__(self, method, args, columns, kwargs, future):
+        self.method = method
+        self.args = args
+        self.columns = columns
+        self.kwargs = kwargs
+        self.futures = [future]
+
+    def merge(self, other):
+        """Takes over a later call, which is dropped.
+
+        :returns: False if the calls can't be merged.
+        """
+        if self.method != other.method or self.args != other.args:
+            return False
+
+        if self.method == ADD:
+            columns = dict(self.columns or {})
+            columns.update(other.columns or {})
+            self.columns = columns
+            self.kwargs.update(other.kwargs)
+        elif self.columns != other.columns or self.kwargs != other.kwargs:
+            return False
+
+        self.futures.extend(other.futures)
+
+        return True
+
+    def call(self, api):
+        method = getattr(api, self.method)
+
+        try:
+            value = method(*self.args, columns=self.columns, **self.kwargs)
+        except Exception as e:
+            for future in self.futures:
+                future.set_exception(e)
+        else:
+            for future in self.futures:
+                future.set_result(value)
+
+
+class WriteBehindQueue(object):
+    """Sends recipient updates in the background, coalescing redundant
+    ones.
+
+    Calls are held until max_pending are waiting or the oldest has
+    waited for max_delay seconds. Every method returns a
+    concurrent.futures.Future resolving to what the API method returns.
+
+    While an add_recipient for a contact (list and email) is pending, a
+    later add_recipient for it is merged in: columns and options of the
+    later call win, and both futures resolve to the same result. Any
+    other call ends the merging, so e.g. an opt-out is never overtaken
+    by an older add.
+
+    Usage:
+    queue = WriteBehindQueue(api)
+    future = queue.add_recipient(123, 1, {'EMAIL': 'a@b.com'},
+                                 update_if_found=True)
+    ...
+    queue.close()
+
+    :params api: A logged-in API instance.
+    :params max_pending: Calls waiting before a flush is forced.
+    :params max_delay: Seconds a call waits at most before being sent.
+    :params workers: Number of concurrent requests.
+    """
+    def __init__(self, api, max_pending=500, max_delay=1.0, workers=4,
+                 clock=time.time):
+        if max_pending < 1 or workers < 1:
+            raise ValueError('max_pending and workers must be positive.')
+
+        self._api = api
+        self.max_pending = max_pending
+        self.max_delay = max_delay
+        self._clock = clock
+
+        self._executor = futures.ThreadPoolExecutor(max_workers=workers)
+        self._cond = threading.Condition()
+        self._pending = collections.OrderedDict()
+        self._size = 0
+        self._oldest = None
+        # Last batch sent for each contact, later ones wait for it
+        self._chains = {}
+        self._keys = itertools.count()
+        self._closed = False
+
+        self.submitted = 0
+        self.coalesced = 0
+
+        self._thread = threading.Thread(
+            target=self._run, name='silverpy-write-behind')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __len__(self):
+        """Number of calls waiting to be sent."""
+        return self._size
+
+    def add_recipient(self, list_id, created_from, columns=None, **kwargs):
+        """Queued API.add_recipient.
+
+        :returns: Future of (bool_success, recipient_id, error_tuple).
+        """
+        email = column_email(columns) \
+            or column_email(kwargs.get('sync_fields'))
+
+        return self._submit(list_id, email, _Operation(
+            ADD, (list_id, created_from), columns, kwargs, futures.Future()))
+
+    def opt_out_recipient(self, list_id, email='', columns=None, **kwargs):
+        """Queued API.opt_out_recipient.
+
+        :returns: Future of (bool_success, error_tuple).
+        """
+        return self._submit(list_id, email and email.lower(), _Operation(
+            OPT_OUT, (list_id, email), columns, kwargs, futures.Future()))
+
+    def remove_recipient(self, list_id, email, columns=None):
+        """Queued API.remove_recipient.
+
+        :returns: Future of (bool_success, error_tuple).
+        """
+        return self._submit(list_id, email.lower(), _Operation(
+            REMOVE, (list_id, email), columns, {}, futures.Future()))
+
+    def _submit(self, list_id, email, operation):
+        future = operation.futures[0]
+
+        if email:
+            key = (str(list_id), email)
+        else:
+            # Nothing to coalesce or order against
+            key = next(self._keys)
+
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('WriteBehindQueue is closed.')
+
+            self.submitted += 1
+            operations = self._pending.get(key)
+
+            if operations is None:
+                self._pending[key] = [operation]
+            elif operations[-1].merge(operation):
+                self.coalesced += 1
+                return future
+            else:
+                operations.append(operation)
+
+            self._size += 1
+            if self._oldest is None:
+                self._oldest = self._clock()
+                self._cond.notify()
+
+            if self._size >= self.max_pending:
+                self._flush()
+
+        return future
+
+    def flush(self):
+        """Sends every pending call now, without waiting for them."""
+        with self._cond:
+            self._flush()
+
+    def _flush(self):
+        pending, self._pending = self._pending, collections.OrderedDict()
+        self._size = 0
+        self._oldest = None
+
+        for key, operations in pending.items():
+            previous = self._chains.get(key)
+            chain = self._executor.submit(self._send, previous, operations)
+            self._chains[key] = chain
+            chain.add_done_callback(
+                lambda f, key=key: self._chain_done(key, f))
+
+        if pending:
+            log.debug('Flushed %d contacts.', len(pending))
+
+    def _send(self, previous, operations):
+        if previous is not None:
+            # Submitted earlier, so already running or ahead in the queue
+            futures.wait([previous])
+
+        for operation in operations:
+            operation.call(self._api)
+
+    def _chain_done(self, key, chain):
+        with self._cond:
+            if self._chains.get(key) is chain:
+                del self._chains[key]
+
+    def _run(self):
+        with self._cond:
+            while not self._closed:
+                if self._oldest is None:
+                    self._cond.wait()
+                    continue
+
+                delay = self._oldest + self.max_delay - self._clock()
+                if delay <= 0:
+                    self._flush()
+                else:
+                    self._cond.wait(delay)
+
+    def close(self):
+        """Sends the pending calls and waits for every call to finish."""
+        with self._cond:
+            if self._closed:
+                return
+
+            self._flush()
+            self._closed = True
+            self._cond.notify()
+
+        self._thread.join()
+        self._executor.shutdown(wait=True)
+
+        log.debug('Write-behind queue closed, %d of %d calls coalesced.',
+                  self.coalesced, self.submitted)